@@ -0,0 +1,139 @@
+"""
+Concurrent Update Processing Load Test
+
+Sends a burst of button clicks from many chats through the real application (all handlers of `main.py`, a temporary
+database) against the local fake Bot API server (`devtools/fake_bot_api.py`), which answers every call after a
+simulated network latency. Every chat clicks through the same menu path, starting with the language selection.
+
+Compared modes:
+
+- sequential: the default of `python-telegram-bot`, one update after another.
+- unordered:  `concurrent_updates(N)` without any ordering, updates of the same chat may overlap.
+- per-chat:   `ChatOrderedUpdateProcessor(N)`, chats in parallel, the updates of one chat in order.
+
+For every mode the total time, the latency of the clicks (from the arrival of the burst until the update was
+handled), handler errors and ordering violations (an update of a chat started before the previous one had finished)
+are reported.
+
+Usage: python benchmarks/concurrent_updates.py [--chats 50] [--latency-ms 30] [--concurrency 16]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import datetime
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The database of the bot is created in the working directory, the media files are read relative to it.
+WORK_DIR = tempfile.mkdtemp()
+os.symlink(os.path.join(ROOT, 'bot_app'), os.path.join(WORK_DIR, 'bot_app'))
+os.chdir(WORK_DIR)
+
+from telegram import Update, Message, Chat, User, CallbackQuery, PhotoSize  # noqa: E402
+from telegram.ext import TypeHandler, SimpleUpdateProcessor, ApplicationHandlerStop  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+
+import main as bot_main  # noqa: E402
+from bot_app.message_ledger import LedgerBot  # noqa: E402
+from bot_app.update_processor import ChatOrderedUpdateProcessor  # noqa: E402
+from devtools.fake_bot_api import FakeBotApi  # noqa: E402
+
+CLICKS = ['lang:ENG', 'fn:voucher', 'fn:e_voucher', 'fn:price_more', 'fn:faq', 'fn:kontakt', 'fn:all_commands',
+          'fn:user_vouchers', 'fn:start']
+
+
+def click(update_id, chat_id, data):
+    user = User(chat_id, 'User', False)
+    chat = Chat(chat_id, 'private')
+    screen = Message(update_id, datetime.datetime.now(), chat, from_user=user,
+                     photo=[PhotoSize(f'photo-{update_id}', f'photo-{update_id}', 10, 10)])
+    return Update(update_id, callback_query=CallbackQuery(str(update_id), user, 'chat', message=screen, data=data))
+
+
+async def run_mode(server, name, processor, chats):
+    bot = LedgerBot('123:TEST', base_url=server.base_url, base_file_url=server.base_file_url,
+                    request=HTTPXRequest(connection_pool_size=bot_main.CONNECTION_POOL_SIZE))
+    application = bot_main.build_application(bot=bot, concurrent_updates=processor)
+
+    running = {}
+    violations = []
+    latencies = []
+    errors = []
+    done = asyncio.Event()
+    expected = chats * len(CLICKS)
+
+    async def started(update, context):
+        chat_id = update.effective_chat.id
+        if running.get(chat_id):
+            violations.append(chat_id)
+        running[chat_id] = True
+
+    async def finished(update, context):
+        running[update.effective_chat.id] = False
+        latencies.append(time.perf_counter() - burst_started)
+        if len(latencies) == expected:
+            done.set()
+        raise ApplicationHandlerStop
+
+    async def on_error(update, context):
+        errors.append(repr(context.error))
+
+    application.add_handler(TypeHandler(Update, started), group=-1)
+    application.add_handler(TypeHandler(Update, finished), group=1)
+    application.add_error_handler(on_error)
+
+    await application.initialize()
+    await application.start()
+
+    # The clicks of one chat arrive right after each other, like fast repeated clicks of one user.
+    updates = [click(chat * len(CLICKS) + index + 1, 1000 + chat, data)
+               for chat in range(chats) for index, data in enumerate(CLICKS)]
+    burst_started = time.perf_counter()
+    for update in updates:
+        await application.update_queue.put(update)
+    await asyncio.wait_for(done.wait(), 600)
+    total = time.perf_counter() - burst_started
+
+    await application.stop()
+    await application.shutdown()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f'{name:10} {total:7.2f} s {expected / total:8.1f} upd/s   p50 {statistics.median(latencies) * 1000:7.0f} ms'
+          f'   p95 {p95 * 1000:7.0f} ms   errors {len(errors):4}   order violations {len(violations):4}')
+
+
+async def run(args):
+    logging.getLogger('telegram').setLevel(logging.WARNING)
+    logging.getLogger('apscheduler').setLevel(logging.WARNING)
+    bot_main.db_manager.migrate()
+    bot_main.keyboards.build_all()
+    server = await FakeBotApi(latency=args.latency_ms / 1000).start()
+
+    print(f'{args.chats} chats x {len(CLICKS)} clicks, Bot API latency {args.latency_ms:.0f} ms, '
+          f'concurrency {args.concurrency}')
+    await run_mode(server, 'sequential', None, args.chats)
+    await run_mode(server, 'unordered', SimpleUpdateProcessor(args.concurrency), args.chats)
+    await run_mode(server, 'per-chat', ChatOrderedUpdateProcessor(args.concurrency), args.chats)
+
+    await server.stop()
+    bot_main.async_db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=16)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
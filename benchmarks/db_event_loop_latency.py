@@ -0,0 +1,127 @@
+"""
+Event Loop Latency Benchmark
+
+Simulates many chats clicking inline buttons at the same time and measures the latency of every callback, from the
+moment the update arrives until the handler finished. Every callback reads the user state, saves the click and
+awaits a (simulated) Telegram API request. Every `--payment-every`-th callback also stores a paid voucher, and that
+write is slowed down by `--stall-ms` to simulate a slow fsync of the database file.
+
+The same load runs twice:
+
+- sync:  `DBManager` is called directly in the handlers, like the bot did before `AsyncDBManager` existed.
+- async: the handlers await `AsyncDBManager`, so the queries run in the dedicated DB thread.
+
+The difference depends on the stall. Measured p99 latencies (they vary between machines):
+
+- `--stall-ms 100` (the default): sync 650-800 ms, async 240-250 ms on one machine, sync 593 ms and async 425 ms on
+  another.
+- `--stall-ms 40`: no p99 gain, sync 74-85 ms and async 74-91 ms.
+
+The async run is not free of the stall either: the writes are serialized in the one DB thread, so every write
+(and its callback) queued behind a stalled commit still waits for it. Only the reads and the event loop do not.
+
+Usage: python benchmarks/db_event_loop_latency.py [--callbacks 2000] [--rate 500] [--stall-ms 100]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_app.db_manager import DBManager  # noqa: E402
+from bot_app.async_db import AsyncDBManager  # noqa: E402
+
+
+class StallingDBManager(DBManager):
+    def __init__(self, db_file, stall):
+        super().__init__(db_file)
+        self.stall = stall
+
+    def add_voucher_by_payment(self, chat_id, voucher_code, voucher_value):
+        added = super().add_voucher_by_payment(chat_id, voucher_code, voucher_value)
+        time.sleep(self.stall)
+        return added
+
+
+def seed_users(db, chats):
+    conn = db.create_connection()
+    conn.executemany("INSERT OR IGNORE INTO users (chat_id, selected_lang, prev_func) VALUES (?, 'ENG', 'start')",
+                     [(chat_id,) for chat_id in range(chats)])
+    conn.commit()
+
+
+async def sync_callback(db, number, chat_id, args):
+    db.get_user_state(chat_id)
+    db.save_user_sessions([(chat_id, None, None, None, 'ENG', 'ENG', None)])
+    if number % args.payment_every == 0:
+        db.add_voucher_by_payment(chat_id, f'SYNC{number}', '300')
+    await asyncio.sleep(args.api_ms / 1000)
+
+
+async def async_callback(db, number, chat_id, args):
+    await db.get_user_state(chat_id)
+    await db.save_user_sessions([(chat_id, None, None, None, 'ENG', 'ENG', None)])
+    if number % args.payment_every == 0:
+        await db.add_voucher_by_payment(chat_id, f'ASYNC{number}', '300')
+    await asyncio.sleep(args.api_ms / 1000)
+
+
+async def run_load(callback, db, args):
+    latencies = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def handle(number):
+        arrival = start + number / args.rate
+        await callback(db, number, number % args.chats, args)
+        latencies.append((loop.time() - arrival) * 1000)
+
+    tasks = []
+    for number in range(args.callbacks):
+        delay = start + number / args.rate - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(handle(number)))
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def report(name, latencies):
+    print(f'{name:<6} p50 {percentile(latencies, 50):8.1f} ms   p95 {percentile(latencies, 95):8.1f} ms   '
+          f'p99 {percentile(latencies, 99):8.1f} ms   mean {statistics.mean(latencies):8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='p99 callback latency with sync and async database access')
+    parser.add_argument('--callbacks', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=500, help='arriving callbacks per second')
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--payment-every', type=int, default=50)
+    parser.add_argument('--stall-ms', type=float, default=100)
+    parser.add_argument('--api-ms', type=float, default=30, help='simulated Telegram API round trip')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = StallingDBManager(os.path.join(directory, 'benchmark.db'), args.stall_ms / 1000)
+        db.migrate()
+        seed_users(db, args.chats)
+
+        report('sync', asyncio.run(run_load(sync_callback, db, args)))
+
+        async_db = AsyncDBManager(db)
+        report('async', asyncio.run(run_load(async_callback, async_db, args)))
+        async_db.close()
+
+
+if __name__ == '__main__':
+    main()
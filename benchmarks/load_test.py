@@ -0,0 +1,219 @@
+"""
+End-to-End Load Test
+
+Runs the whole bot (all handlers of `main.py`, polling, a temporary database, the PDF workers) against the local fake
+Bot API server (`devtools/fake_bot_api.py`), so it can be load-tested on a plain Linux box without Telegram. Every
+simulated chat goes through the purchase journey of a user, one step after the other, and clicks the buttons of the
+screen the bot has actually shown it:
+
+    /start -> lang:ENG -> fn:voucher -> fn:e_voucher -> price:300 -> (payment webhook) -> fn:check
+    -> fn:user_vouchers -> fn:user_active_vouchers -> uv:<voucher> -> fn:get_in_chat
+
+The payment itself is simulated like the Stripe webhook does it (`save_payment` with the DarkSoulCode of the chat).
+The latency of a step is measured from the moment its update is added to the fake server (a waiting `getUpdates`
+returns it at once) until the bot has finished handling it.
+
+Reported: updates/s, latency percentiles of all steps and per screen (`metrics`), Bot API calls per update (total,
+per method and per screen), SQL statements per update, handler errors, clicks on buttons the screen did not show
+and completed journeys (the voucher PDF was sent).
+
+Usage: python benchmarks/load_test.py [--chats 50] [--latency-ms 30] [--ramp-s 1] [--think-ms 0] [--rate-limit]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The database of the bot is created in the working directory, the media files are read relative to it.
+WORK_DIR = tempfile.mkdtemp()
+os.symlink(os.path.join(ROOT, 'bot_app'), os.path.join(WORK_DIR, 'bot_app'))
+os.chdir(WORK_DIR)
+os.environ['VOUCHER_CACHE_DIR'] = os.path.join(WORK_DIR, 'vouchers')
+
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+
+import main as bot_main  # noqa: E402
+from bot_app.message_ledger import LedgerBot  # noqa: E402
+from bot_app.metrics import metrics  # noqa: E402
+from bot_app.outbound_scheduler import outbound  # noqa: E402
+from bot_app.session_store import sessions  # noqa: E402
+from devtools.fake_bot_api import FakeBotApi  # noqa: E402
+
+PAYMENT = 'payment'
+JOURNEY = ['/start', 'lang:ENG', 'fn:voucher', 'fn:e_voucher', 'price:300', PAYMENT, 'fn:check', 'fn:user_vouchers',
+           'fn:user_active_vouchers', 'uv:', 'fn:get_in_chat']
+NOT_API_CALLS = ('getUpdates', 'getMe', 'deleteWebhook')
+
+
+class LoadTest:
+    def __init__(self, server, application, think_time):
+        self.server = server
+        self.application = application
+        self.think_time = think_time
+        self.latencies = []
+        self.errors = []
+        self.missing_buttons = Counter()
+        self.completed = 0
+        self._update_id = 0
+        self._pending = {}
+
+        application.add_handler(TypeHandler(Update, self.finished), group=1)
+        application.add_error_handler(self.failed)
+
+    async def finished(self, update, context):
+        self._done(update.update_id)
+
+    async def failed(self, update, context):
+        self.errors.append(repr(context.error))
+        self._done(getattr(update, 'update_id', None))
+
+    def _done(self, update_id):
+        future = self._pending.pop(update_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def send(self, update):
+        self._update_id += 1
+        update['update_id'] = self._update_id
+        future = self._pending[self._update_id] = asyncio.get_running_loop().create_future()
+        sent = time.perf_counter()
+        self.server.add_update(update)
+        self.latencies.append(await asyncio.wait_for(future, 120) - sent)
+
+    async def journey(self, chat_id, delay):
+        await asyncio.sleep(delay)
+        user = {'id': chat_id, 'is_bot': False, 'first_name': f'User{chat_id}'}
+        chat = {'id': chat_id, 'type': 'private'}
+        for step in JOURNEY:
+            if step == PAYMENT:
+                await self.pay(chat_id)
+                continue
+            if step.startswith('/'):
+                message_id = self.server.next_message_id(chat_id)
+                await self.send({'message': {'message_id': message_id, 'date': int(time.time()), 'chat': chat,
+                                             'from': user, 'text': step,
+                                             'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(step)}]}})
+            else:
+                screen = self.server.screens.get(chat_id)
+                data = self.button(screen, step)
+                if data is None:
+                    self.missing_buttons[step] += 1
+                    data = step
+                await self.send({'callback_query': {'id': str(self._update_id), 'from': user, 'chat_instance': 'chat',
+                                                    'message': screen, 'data': data}})
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+
+        if self.server.documents[chat_id]:
+            self.completed += 1
+
+    @staticmethod
+    def button(screen, step):
+        keyboard = (screen or {}).get('reply_markup', {}).get('inline_keyboard', [])
+        for row in keyboard:
+            for button in row:
+                data = button.get('callback_data')
+                if data is not None and (data == step or step.endswith(':') and data.startswith(step)):
+                    return data
+        return None
+
+    @staticmethod
+    async def pay(chat_id):
+        user_state = await sessions.get(chat_id)
+        await bot_main.async_db.save_payment(f'cs_{chat_id}', f'evt_{chat_id}', user_state.dark_soul_code, 30000,
+                                             f'user{chat_id}@example.com', 'paid', int(time.time()))
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def run(args):
+    logging.getLogger('telegram').setLevel(logging.WARNING)
+    logging.getLogger('apscheduler').setLevel(logging.WARNING)
+    bot_main.db_manager.migrate()
+    bot_main.keyboards.build_all()
+    bot_main.db_manager.pool.set_trace_callback(metrics.count_db_statement)
+    server = await FakeBotApi(latency=args.latency_ms / 1000).start()
+
+    bot = LedgerBot('123:TEST', base_url=server.base_url, base_file_url=server.base_file_url,
+                    request=HTTPXRequest(connection_pool_size=bot_main.CONNECTION_POOL_SIZE),
+                    get_updates_request=HTTPXRequest(), rate_limiter=outbound if args.rate_limit else None)
+    application = bot_main.build_application(bot=bot, concurrent_updates=args.concurrency)
+    test = LoadTest(server, application, args.think_ms / 1000)
+
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(test.journey(1000 + chat, args.ramp_s * chat / args.chats) for chat in range(args.chats)))
+    total = time.perf_counter() - started
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await sessions.stop()
+    await server.stop()
+    bot_main.pdf_renderer.close()
+    bot_main.async_db.close()
+
+    report(args, test, server, total)
+
+
+def report(args, test, server, total):
+    updates = len(test.latencies)
+    latencies = sorted(test.latencies)
+    api_calls = Counter({method: count for method, count in server.calls.items() if method not in NOT_API_CALLS})
+
+    print(f'{args.chats} chats x {len(JOURNEY) - 1} steps, Bot API latency {args.latency_ms:.0f} ms, '
+          f'concurrency {args.concurrency}, ramp {args.ramp_s:.1f} s, rate limit {"on" if args.rate_limit else "off"}')
+    print(f'{updates} updates in {total:.2f} s: {updates / total:.1f} updates/s   latency p50 '
+          f'{percentile(latencies, 0.5) * 1000:.0f} ms  p95 {percentile(latencies, 0.95) * 1000:.0f} ms  p99 '
+          f'{percentile(latencies, 0.99) * 1000:.0f} ms  max {latencies[-1] * 1000:.0f} ms')
+    print(f'errors {len(test.errors)}   missing buttons {sum(test.missing_buttons.values())} '
+          f'{dict(test.missing_buttons) or ""}  completed journeys {test.completed}/{args.chats}')
+    for error, count in Counter(test.errors).most_common(3):
+        print(f'  {count} x {error}')
+
+    print(f'\nBot API calls per update: {sum(api_calls.values()) / updates:.2f}')
+    for method, count in api_calls.most_common():
+        print(f'  {method:24} {count / updates:6.2f}')
+
+    print(f'\n{"screen":26} {"count":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"api/upd":>8} {"sql/upd":>8}')
+    for name, histogram in sorted(metrics.latency.items(), key=lambda item: -item[1].quantile(0.95)):
+        api = metrics.api_calls.get(name)
+        sql = metrics.db_statements.get(name)
+        print(f'{name:26} {histogram.count:6} {histogram.quantile(0.5) * 1000:8.1f} '
+              f'{histogram.quantile(0.95) * 1000:8.1f} {histogram.quantile(0.99) * 1000:8.1f} '
+              f'{average(api):>8} {average(sql):>8}')
+
+
+def average(histogram):
+    # The counts of an update belong to its innermost handler (the screen), the dispatcher has none.
+    return f'{histogram.sum / histogram.count:.2f}' if histogram else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=bot_main.CONCURRENT_UPDATES)
+    parser.add_argument('--ramp-s', type=float, default=1.0, help='start the chats evenly over this time')
+    parser.add_argument('--think-ms', type=float, default=0, help='pause of a user between two steps')
+    parser.add_argument('--rate-limit', action='store_true', help='apply the Bot API limits (outbound scheduler)')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
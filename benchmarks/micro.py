@@ -0,0 +1,257 @@
+"""
+Micro-Benchmarks of the Hot Paths
+
+Times the hot paths of the bot in isolation and compares them with a stored JSON baseline, so an optimisation can be
+measured and a regression is noticed:
+
+- button_click_faq:            `button_click` + `data_controller` + `faq_command` for a fake `fn:faq` click
+- button_click_user_vouchers:  the same for `fn:user_active_vouchers` (keyboard of 30 vouchers, one query)
+- keyboard_faq_build:          building the FAQ keyboard (`faq_keyboard`)
+- keyboard_faq_cached:         taking it from the keyboard cache (`keyboards.get`)
+- pdf_render:                  rendering an e-voucher PDF (`render_voucher_pdf`, formerly `e_voucher_generator_pdf`)
+- email_mime:                  MIME assembly of the voucher e-mail with its PDF (`build_message`, formerly in
+                               `send_email_with_attachment`)
+- statistics_100k:             `get_statistics` on a database with 100k vouchers (formerly
+                               `get_statistics_of_vouchers`)
+
+The handlers run against an in-process fake Bot API (`InProcessBotApiRequest`), in a temporary working directory
+with its own database. Every benchmark is repeated (`--repeat`) with enough calls per repeat for at least
+`--min-time` seconds; the median time per call is compared with the baseline. A benchmark slower than the baseline
+by more than `--threshold` (default 25%) is a regression, and the exit code is 1.
+
+The baseline is machine-specific: record it on the machine which compares against it.
+
+Usage:
+
+- python benchmarks/micro.py --save           run and store the results as the baseline
+- python benchmarks/micro.py                  run and compare with the baseline
+- python benchmarks/micro.py --only button    run the benchmarks whose name contains 'button'
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import datetime
+import argparse
+import platform
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'micro.json')
+
+# The database of the bot is created in the working directory, the media files are read relative to it.
+WORK_DIR = tempfile.mkdtemp()
+os.symlink(os.path.join(ROOT, 'bot_app'), os.path.join(WORK_DIR, 'bot_app'))
+os.chdir(WORK_DIR)
+os.environ['VOUCHER_CACHE_DIR'] = os.path.join(WORK_DIR, 'vouchers')
+
+from telegram import Update  # noqa: E402
+from telegram.ext import CallbackContext  # noqa: E402
+
+import main as bot_main  # noqa: E402
+from bot_app.db_manager import DBManager  # noqa: E402
+from bot_app.data_handler import button_click  # noqa: E402
+from bot_app.email_outbox import build_message  # noqa: E402
+from bot_app.keyboards import keyboards, faq_keyboard  # noqa: E402
+from bot_app.message_ledger import LedgerBot  # noqa: E402
+from bot_app.pdf_voucher_generator import render_voucher_pdf  # noqa: E402
+from devtools.fake_bot_api import InProcessBotApiRequest  # noqa: E402
+
+CHAT_ID = 42
+USER_VOUCHERS = 30
+STATISTICS_VOUCHERS = 100_000
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class Environment:
+    """The application with the in-process fake Bot API, created once for all benchmarks."""
+
+    def __init__(self):
+        self.application = None
+
+    async def start(self):
+        bot_main.db_manager.migrate()
+        keyboards.build_all()
+        bot = LedgerBot('123:TEST', request=InProcessBotApiRequest())
+        self.application = bot_main.build_application(bot=bot, concurrent_updates=0)
+        await self.application.initialize()
+        # The chat of the clicks is a known user with a selected language.
+        await self.click('lang:ENG')()
+
+    async def stop(self):
+        await self.application.shutdown()
+
+    def click(self, data):
+        user = {'id': CHAT_ID, 'is_bot': False, 'first_name': 'User'}
+        screen = {'message_id': 1, 'date': 0, 'chat': {'id': CHAT_ID, 'type': 'private'},
+                  'photo': [{'file_id': 'photo', 'file_unique_id': 'photo', 'width': 10, 'height': 10}]}
+        update = Update.de_json({'update_id': 1, 'callback_query': {'id': '1', 'from': user, 'chat_instance': 'chat',
+                                                                    'message': screen, 'data': data}},
+                                self.application.bot)
+        context = CallbackContext.from_update(update, self.application)
+
+        async def run():
+            await button_click(update, context)
+        return run
+
+
+@benchmark('button_click_faq')
+async def button_click_faq(env):
+    return env.click('fn:faq')
+
+
+@benchmark('button_click_user_vouchers')
+async def button_click_user_vouchers(env):
+    for number in range(USER_VOUCHERS):
+        bot_main.db_manager.add_voucher_to_db(CHAT_ID, f'UV{number:04}', '300')
+    return env.click('fn:user_active_vouchers')
+
+
+@benchmark('keyboard_faq_build')
+async def keyboard_faq_build(env):
+    return lambda: faq_keyboard('ENG')
+
+
+@benchmark('keyboard_faq_cached')
+async def keyboard_faq_cached(env):
+    return lambda: keyboards.get('faq', 'ENG')
+
+
+@benchmark('pdf_render')
+async def pdf_render(env):
+    return lambda: render_voucher_pdf('AbCdE12345', '2024-05-01', 300)
+
+
+@benchmark('email_mime')
+async def email_mime(env):
+    pdf = render_voucher_pdf('AbCdE12345', '2024-05-01', 300)
+    return lambda: build_message('bot@example.com', 'user@example.com', 'Your voucher', 'Thank you!', pdf,
+                                 'e_voucher_AbCdE12345.pdf')
+
+
+@benchmark('statistics_100k')
+async def statistics_100k(env):
+    db = DBManager(os.path.join(WORK_DIR, 'statistics.db'))
+    db.migrate()
+    conn = db.create_connection()
+    first_day = datetime.date.today() - datetime.timedelta(days=365)
+    rows = [(number % 5000, f'S{number:06}', first_day + datetime.timedelta(days=random.randrange(366)),
+             random.choice((300, 600, 800, 1000)), number % 3 == 0) for number in range(STATISTICS_VOUCHERS)]
+    conn.executemany('''INSERT INTO vouchers (chat_id, voucher_id, date, value_of_voucher, is_active)
+                        VALUES (?, ?, ?, ?, ?)''', rows)
+    conn.commit()
+    return db.get_statistics
+
+
+async def measure(func, min_time, repeat):
+    is_async = asyncio.iscoroutinefunction(func)
+
+    async def run(loops):
+        started = time.perf_counter()
+        for _ in range(loops):
+            if is_async:
+                await func()
+            else:
+                func()
+        return time.perf_counter() - started
+
+    loops = 1
+    while (elapsed := await run(loops)) < min_time:
+        loops = max(loops * 2, int(loops * min_time / elapsed * 1.2) if elapsed > 0 else loops * 10)
+    times = [await run(loops) / loops for _ in range(repeat)]
+    return {'median': statistics.median(times), 'min': min(times), 'loops': loops}
+
+
+def machine():
+    return {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+
+
+def format_time(seconds):
+    for unit, factor in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * factor >= 1:
+            return f'{seconds * factor:8.2f} {unit}'
+    return f'{seconds * 1e9:8.0f} ns'
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f'{"benchmark":28} {"median":>11} {"baseline":>11} {"change":>8}')
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f'{name:28} {format_time(result["median"])} {"-":>11} {"new":>8}')
+            continue
+        change = result['median'] / base['median'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:28} {format_time(result["median"])} {format_time(base["median"])} {change:+8.1%}{flag}')
+    return regressions
+
+
+async def run(args):
+    env = Environment()
+    await env.start()
+    results = {}
+    try:
+        for name, setup in BENCHMARKS.items():
+            if args.only and args.only not in name:
+                continue
+            func = await setup(env)
+            results[name] = await measure(func, args.min_time, args.repeat)
+    finally:
+        await env.stop()
+        bot_main.pdf_renderer.close()
+        bot_main.async_db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown (0.25 = 25%%)')
+    parser.add_argument('--only', help='run only the benchmarks whose name contains this text')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum time of one repeat in seconds')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('machine') != machine():
+            print(f'Note: the baseline was recorded on another machine ({baseline.get("machine")})')
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save:
+        baseline_results = dict(baseline.get('results', {}), **results) if args.only else results
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({'machine': machine(), 'recorded': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'results': baseline_results}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f'Baseline saved to {args.baseline}')
+    elif regressions:
+        print(f'{len(regressions)} regression(s) over {args.threshold:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Outbound Scheduler Benchmark
+
+Simulates a burst of screen changes from many chats at once: every click sends one user-visible message and one
+cleanup `deleteMessages` request. The requests go through the `OutboundScheduler` with the Telegram limits, the Bot
+API itself is replaced by a callback which only records the time of the request.
+
+Reports the total time, the highest number of requests seen in any one-second window (globally and per chat) and
+the wait times per priority, which show that the user-visible requests are served before the cleanup. The times are
+taken when the callback runs; requests granted exactly one window apart can therefore be counted in the same window.
+
+Usage: python benchmarks/outbound_scheduler.py [--chats 30] [--clicks 3]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_app.outbound_scheduler import OutboundScheduler, PRIORITY_USER, PRIORITY_CLEANUP  # noqa: E402
+
+
+def max_rate(times):
+    times = sorted(times)
+    start, best = 0, 0
+    for end, moment in enumerate(times):
+        while moment - times[start] >= 1:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+async def run(args):
+    scheduler = OutboundScheduler()
+    await scheduler.initialize()
+    sent = []
+
+    async def bot_api(endpoint, chat_id):
+        sent.append((time.monotonic(), chat_id))
+        return True
+
+    requests = []
+    for chat_id in range(1, args.chats + 1):
+        for _ in range(args.clicks):
+            for endpoint in ('sendPhoto', 'deleteMessages'):
+                requests.append(scheduler.process_request(bot_api, (endpoint, chat_id), {}, endpoint,
+                                                          {'chat_id': chat_id}, None))
+
+    started = time.monotonic()
+    await asyncio.gather(*requests)
+    total = time.monotonic() - started
+    metrics = scheduler.metrics()
+    await scheduler.shutdown()
+
+    per_chat = Counter()
+    for chat_id in range(1, args.chats + 1):
+        per_chat[chat_id] = max_rate([moment for moment, chat in sent if chat == chat_id])
+
+    print(f'{len(sent)} requests from {args.chats} chats in {total:.2f} s')
+    print(f'max requests per second: global {max_rate([moment for moment, _ in sent])}, '
+          f'per chat {max(per_chat.values())}')
+    for name, priority in (('user', PRIORITY_USER), ('cleanup', PRIORITY_CLEANUP)):
+        waits = metrics['wait_seconds'][priority]
+        print(f'{name:8} wait avg {waits["avg"] * 1000:7.0f} ms   max {waits["max"] * 1000:7.0f} ms')
+    print(f'max queue depth {metrics["max_queue_depth"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=30)
+    parser.add_argument('--clicks', type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
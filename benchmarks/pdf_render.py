@@ -0,0 +1,70 @@
+"""
+PDF Voucher Rendering Benchmark
+
+Measures how many e-vouchers per second can be rendered:
+
+- before: the old implementation, which wrote the reportlab overlay to disk, read it back, parsed the template
+  from scratch and wrote the merged PDF to disk again for every voucher.
+- after:  `render_voucher_pdf`, which renders into memory onto the cached, already parsed template.
+
+Usage: python benchmarks/pdf_render.py [--vouchers 50]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfgen import canvas  # noqa: E402
+from PyPDF2 import PdfReader, PdfWriter  # noqa: E402
+
+from bot_app.pdf_voucher_generator import TEMPLATE_PATH, render_voucher_pdf  # noqa: E402
+
+
+def render_voucher_pdf_on_disk(directory, serial_number, date_of_buy, value):
+    output_pdf_path = os.path.join(directory, f"e_voucher_{serial_number}.pdf")
+
+    c = canvas.Canvas(output_pdf_path)
+    c.drawString(100, 395, f"{value} PLN")
+    c.drawString(100, 335, date_of_buy)
+    c.drawString(204, 335, serial_number)
+    c.save()
+
+    reader = PdfReader(TEMPLATE_PATH)
+    writer = PdfWriter()
+    page = reader.pages[0]
+    page.merge_page(PdfReader(output_pdf_path).pages[0])
+    writer.add_page(page)
+    with open(output_pdf_path, 'wb') as output_file:
+        writer.write(output_file)
+
+    with open(output_pdf_path, 'rb') as output_file:
+        return output_file.read()
+
+
+def measure(name, render, vouchers):
+    render(0)
+    start = time.perf_counter()
+    for number in range(vouchers):
+        render(number)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<7} {vouchers / elapsed:8.1f} vouchers/s   {elapsed / vouchers * 1000:8.2f} ms/voucher')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='e-voucher PDF rendering throughput')
+    parser.add_argument('--vouchers', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        measure('before', lambda n: render_voucher_pdf_on_disk(directory, f'SN{n:08d}', '2024-01-01', '300'),
+                args.vouchers)
+    measure('after', lambda n: render_voucher_pdf(f'SN{n:08d}', '2024-01-01', '300'), args.vouchers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Start-up Benchmark
+
+Measures the cold start of the bot, which a user feels after every restart of the worker (`Procfile`, Heroku).
+
+- Imports: `python -X importtime -c "import main"` in a fresh interpreter; reports the import time of `main` and its
+  slowest direct imports.
+- Time to first update: starts `python main.py` in polling mode against the local fake Bot API
+  (`devtools/fake_bot_api.py`, via `BOT_API_BASE_URL`) with one pending `/start` update and a new database, and
+  measures the time from the start of the process until the bot polls for updates (ready) and until it sends the
+  answer to `/start` (first update).
+
+Stripe and the SMTP worker are disabled for the child process (empty `STRIPE_API_KEY` / `STRIPE_WEBHOOK_SECRET`).
+
+Usage: python benchmarks/startup.py [--runs 5] [--top 10]
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from devtools.fake_bot_api import FakeBotApi  # noqa: E402
+
+START_UPDATE = {
+    'update_id': 1,
+    'message': {'message_id': 1, 'date': 0, 'chat': {'id': 42, 'type': 'private'},
+                'from': {'id': 42, 'is_bot': False, 'first_name': 'User'}, 'text': '/start',
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]},
+}
+
+
+def import_times():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((level, name.strip(), int(cumulative_us)))
+
+    main_index = max(index for index, entry in enumerate(entries) if entry[:2] == (0, 'main'))
+    children = []
+    for level, name, cumulative in reversed(entries[:main_index]):
+        if level == 0:
+            break
+        if level == 1:
+            children.append((cumulative, name))
+    return entries[main_index][2], sorted(children, reverse=True)
+
+
+async def first_update():
+    server = await FakeBotApi().start()
+    update = dict(START_UPDATE, message=dict(START_UPDATE['message'], date=int(time.time())))
+    server.add_update(update)
+
+    work_dir = tempfile.mkdtemp()
+    os.symlink(os.path.join(ROOT, 'bot_app'), os.path.join(work_dir, 'bot_app'))
+    env = dict(os.environ, TOKEN='123:TEST', BOT_MODE='polling', BOT_API_BASE_URL=server.base_url,
+               BOT_API_BASE_FILE_URL=server.base_file_url, STRIPE_API_KEY='', STRIPE_WEBHOOK_SECRET='')
+
+    started = time.monotonic()
+    process = await asyncio.create_subprocess_exec(sys.executable, os.path.join(ROOT, 'main.py'), cwd=work_dir,
+                                                   env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while not any(method.startswith('send') for method in server.first_calls):
+            if process.returncode is not None or time.monotonic() - started > 60:
+                raise RuntimeError(f'The bot did not answer /start (exit code {process.returncode})')
+            await asyncio.sleep(0.005)
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 30)
+            except asyncio.TimeoutError:
+                process.kill()
+        await server.stop()
+
+    ready = server.first_calls['getUpdates'] - started
+    answered = min(moment for method, moment in server.first_calls.items() if method.startswith('send')) - started
+    return ready, answered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    total, children = import_times()
+    print(f'import main: {total / 1000:7.1f} ms')
+    for cumulative, name in children[:args.top]:
+        print(f'  {name:40} {cumulative / 1000:7.1f} ms')
+
+    results = [asyncio.run(first_update()) for _ in range(args.runs)]
+    ready = statistics.median(result[0] for result in results)
+    answered = statistics.median(result[1] for result in results)
+    print(f'\n{args.runs} cold starts (median): ready {ready * 1000:7.0f} ms   first update answered '
+          f'{answered * 1000:7.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,16 @@
-import os
-from dotenv import load_dotenv
-
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from bot_app.db_manager import DBManager
-from bot_app.conversation_handler import user_answers
-from bot_app.chat_actions import delete_messages
-
-load_dotenv()
-admin_chat_id = os.getenv('ADMIN_ID')
-sub_admin_id = os.getenv('SUB_ADMIN_ID')
+from bot_app.async_db import async_db
+from bot_app.media_registry import media
+from bot_app.screen_navigator import navigator
+from bot_app.keyboards import keyboards
+from bot_app.chat_actions import get_user_state
+from bot_app.db_profiler import profiler
+from bot_app.config import ADMIN_ID as admin_chat_id, SUB_ADMIN_ID as sub_admin_id
 
-db = DBManager('tattoo_bot_telegram.db')
+DB_PROFILE_TOP = 10
+MAX_MESSAGE_LENGTH = 4096
 
 
 class AdminCommands:
@@ -43,7 +41,8 @@ class AdminCommands:
     
     4. `statistics_command(update: Update, context: ContextTypes.DEFAULT_TYPE)` - Displays statistical
     information related to voucher usage and sales. - Provides insights into the number of people who have used the 
-    bot, total vouchers sold, total sales amount, and the latest sale.
+    bot, total vouchers sold, total sales amount, the revenue of today and of the last 7 and 30 days, and the latest
+    sale. - The numbers are read from the `stats` and `daily_sales` tables, which are kept current by triggers.
     
     5. `view_all_active_vouchers(update: Update, context: ContextTypes.DEFAULT_TYPE)`
        - Displays all active vouchers available in the system.
@@ -65,6 +64,10 @@ class AdminCommands:
        - Sends the database file to the chat.
        - Allows the admin to retrieve the database file for external use or backup purposes.
     
+    10. `db_profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE)`
+       - Shows the top methods and statements of the database by total time and the slow-query log with the query
+         plans (`QueryProfiler`, `DB_PROFILE=1`).
+    
     Usage: - These static methods can be called within the context of a Telegram bot application to perform various
     administrative tasks such as managing vouchers, viewing statistics, and accessing the database. Each method provides 
     specific functionalities to streamline the administration process and enhance user experience.
@@ -77,109 +80,92 @@ class AdminCommands:
         chat_id = update.effective_chat.id
         admin = [int(admin_chat_id), int(sub_admin_id)]
 
-        await delete_messages(update, context)
-
         if chat_id in admin:
-            check_voucher_button = InlineKeyboardButton('🎁 Просмотреть активные ваучеры', callback_data='check_voucher')
-            check_deactivated_voucher_button = InlineKeyboardButton('❌Просмотреть неактивыне ваучеры',
-                                                                    callback_data='activated')
-            add_voucher_button = InlineKeyboardButton('➕ Добавить новый ваучер', callback_data='add_voucher')
-            show_statistics_button = InlineKeyboardButton('📊 Показать статистику', callback_data='statistics')
-            get_db_file_in_chat_btn = InlineKeyboardButton('🗃️ Получить файл с базой данных', callback_data='db_in_chat')
-            all_commands_button = InlineKeyboardButton('🤖Вернуться в главное меню', callback_data='all_commands')
-
-            keyboard = InlineKeyboardMarkup([[check_voucher_button],
-                                             [check_deactivated_voucher_button],
-                                             [add_voucher_button],
-                                             [show_statistics_button],
-                                             [get_db_file_in_chat_btn],
-                                             [all_commands_button]])
-            with open('bot_app/media/admin_image.jpg', 'rb') as image_file:
-                await context.bot.send_photo(chat_id=chat_id, photo=image_file, reply_markup=keyboard)
+            keyboard = keyboards.get('admin')
+            await navigator.show_photo(update, context, 'bot_app/media/admin_image.jpg', reply_markup=keyboard)
         else:
-            back_button = InlineKeyboardButton('⏪ Назад', callback_data='all_commands')
-            keyboard = InlineKeyboardMarkup([[back_button]])
-            with open('bot_app/media/denied.jpg', 'rb') as image_file:
-                await context.bot.send_photo(chat_id=chat_id, photo=image_file,
-                                             caption="Отказано в доступе. Access Denied. Odmowa dostępu.",
-                                             reply_markup=keyboard)
+            keyboard = keyboards.get('denied')
+            await navigator.show_photo(update, context, 'bot_app/media/denied.jpg',
+                                       caption="Отказано в доступе. Access Denied. Odmowa dostępu.",
+                                       reply_markup=keyboard)
 
     @staticmethod
     async def add_voucher(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        chat_id = update.effective_chat.id
-
-        back_button = InlineKeyboardButton('⏪ Назад', callback_data='admin')
-        keyboard = InlineKeyboardMarkup([[back_button]])
+        keyboard = keyboards.get('admin_back')
 
-        await delete_messages(update, context)
-        await context.bot.send_message(chat_id=chat_id,
-                                       text='Команда [/add] запросит данные для нового ваучера.\n'
-                                            'Команда [/cancel] отменит запись нового ваучера.\n\n'
-                                            'После записи данных вы сможете просмотреть и активировать добавленые '
-                                            'вами и '
-                                            'ботом ваучеры в базе.\n '
-                                            'Используя команду /admin', reply_markup=keyboard)
+        await navigator.show_text(update, context,
+                                  text='Команда [/add] запросит данные для нового ваучера.\n'
+                                       'Команда [/cancel] отменит запись нового ваучера.\n\n'
+                                       'После записи данных вы сможете просмотреть и активировать добавленые '
+                                       'вами и '
+                                       'ботом ваучеры в базе.\n '
+                                       'Используя команду /admin', reply_markup=keyboard)
 
     @staticmethod
     async def accept_add_voucher(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
-        selected_voucher = user_answers.get('question_1')
-        vouchers_in_db = db.get_all_active_voucher_code()
-        vouchers_in_db = [item[0] for item in vouchers_in_db]
+        selected_voucher = context.user_data.get('voucher_code')
+        voucher_value = context.user_data.get('voucher_value')
         admin = [int(admin_chat_id), int(sub_admin_id)]
 
-        back_btn = InlineKeyboardButton('⏪ BACK', callback_data='all_commands')
+        back_btn = InlineKeyboardButton('⏪ BACK', callback_data='fn:all_commands')
         keyboard = InlineKeyboardMarkup([[back_btn]])
 
         if chat_id not in admin:
-            await context.bot.send_photo(chat_id=chat_id, photo='media/denied.jpg',
-                                         caption="Отказано в доступе. Access Denied. Odmowa dostępu.",
-                                         reply_markup=keyboard)
+            await media.send_photo(context.bot, chat_id, 'bot_app/media/denied.jpg',
+                                   caption="Отказано в доступе. Access Denied. Odmowa dostępu.",
+                                   reply_markup=keyboard)
+        elif selected_voucher is None or voucher_value is None:
+            # The answers are gone after /cancel or a second click on "Сохранить" (they were used already).
+            await context.bot.send_message(chat_id=chat_id, text="Данные ваучера не найдены, начните заново: /add")
+        elif not voucher_value.strip().isdigit():
+            await context.bot.send_message(chat_id=chat_id,
+                                           text=f"Сумма ваучера должна быть числом, а не {voucher_value!r}. "
+                                                f"Начните заново: /add")
+            context.user_data.pop('voucher_code', None)
+            context.user_data.pop('voucher_value', None)
         else:
-            if selected_voucher in vouchers_in_db:
+            # The insert itself decides whether the code is new, so the message is only sent for what was stored.
+            added = await async_db.add_voucher_to_db(chat_id, selected_voucher, voucher_value.strip())
+            if added:
                 await context.bot.send_message(chat_id=chat_id,
-                                               text="Такой код уже существует, попробуйте еще раз! /add")
+                                               text=f"Ваучер с кодом  {selected_voucher}  успешно добавлен в базу")
             else:
                 await context.bot.send_message(chat_id=chat_id,
-                                               text=f"Ваучер с кодом  {selected_voucher}  успешно добавлен в базу")
-                return db.add_voucher_to_db(chat_id)
-            return db.delete_data_from_db(chat_id)
+                                               text="Такой код уже существует, попробуйте еще раз! /add")
+            context.user_data.pop('voucher_code', None)
+            context.user_data.pop('voucher_value', None)
 
     @staticmethod
     async def statistics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        chat_id = update.effective_chat.id
-        stat_info = db.get_statistics_of_vouchers(chat_id)
-
-        people = stat_info[0] if stat_info is not None else '0'
-        sold_vouchers = stat_info[1] if stat_info is not None else '0'
-        amount_sales = stat_info[2] if stat_info is not None else '0'
-        last_sold_voucher = stat_info[3] if stat_info is not None else 'Продаж не было '
-
-        back_button = InlineKeyboardButton('⏪ Назад', callback_data='admin')
-
-        keyboard = InlineKeyboardMarkup([[back_button]])
-
-        await delete_messages(update, context)
-        with open('bot_app/media/statistic_img.jpg', 'rb') as image_file:
-            await context.bot.send_photo(chat_id=chat_id,
-                                         photo=image_file,
-                                         caption=f"🧍 Людей посетило TattooBotAssistant:\n"
-                                             f"-------->  {people} человек\n"
-                                             f"🔥 Ваучеров было проданно вообщем:\n"
-                                             f"-------->  {sold_vouchers} ваучеров\n"
-                                             f"💰 Сумма общей продажи от ваучеров:\n"
-                                             f"-------->  {amount_sales} PLN\n"
-                                             f"📆 Была совершена последняя покупка:\n"
-                                             f"-------->  {last_sold_voucher}",
-                                         reply_markup=keyboard)
+        people, sold_vouchers, active_vouchers, amount_sales, last_sold_voucher, revenue_today, revenue_week, \
+            revenue_month = await async_db.get_statistics()
+        last_sold_voucher = last_sold_voucher or 'Продаж не было'
+
+        keyboard = keyboards.get('admin_back')
+
+        await navigator.show_photo(update, context, 'bot_app/media/statistic_img.jpg',
+                                   caption=f"🧍 Людей посетило TattooBotAssistant:\n"
+                                       f"-------->  {people} человек\n"
+                                       f"🔥 Ваучеров было проданно вообщем:\n"
+                                       f"-------->  {sold_vouchers} ваучеров\n"
+                                       f"💰 Сумма общей продажи от ваучеров:\n"
+                                       f"-------->  {format_amount(amount_sales)} PLN\n"
+                                       f"📈 Продажи за сегодня / 7 дней / 30 дней:\n"
+                                       f"-------->  {format_amount(revenue_today)} / {format_amount(revenue_week)} / "
+                                       f"{format_amount(revenue_month)} PLN\n"
+                                       f"🎟 Активных ваучеров:\n"
+                                       f"-------->  {active_vouchers}\n"
+                                       f"📆 Была совершена последняя покупка:\n"
+                                       f"-------->  {last_sold_voucher}",
+                                   reply_markup=keyboard)
 
     @staticmethod
     async def view_all_active_vouchers(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        chat_id = update.effective_chat.id
-        active_vouchers = db.get_all_active_voucher_code()
+        active_vouchers = await async_db.get_all_active_voucher_code()
 
-        buttons = {item[0]: item[0] for item in active_vouchers}
-        buttons["⏪ Назад"] = "admin"
+        buttons = {item[0]: f"v:{item[0]}" for item in active_vouchers}
+        buttons["⏪ Назад"] = "fn:admin"
         buttons_per_row = 3
 
         keyboard_buttons = [
@@ -193,72 +179,59 @@ class AdminCommands:
 
         keyboard_markup = InlineKeyboardMarkup(keyboard_buttons)
 
-        await delete_messages(update, context)
-
         if not active_vouchers:
-            with open('bot_app/media/empty_data.jpg', 'rb') as image_file:
-                await context.bot.send_photo(chat_id=chat_id, photo=image_file,
-                                             caption="Пока купленных ваучеров нет.", reply_markup=keyboard_markup)
+            await navigator.show_photo(update, context, 'bot_app/media/empty_data.jpg',
+                                       caption="Пока купленных ваучеров нет.", reply_markup=keyboard_markup)
         else:
-            with open('bot_app/media/active_voucher.jpg', 'rb') as image_file:
-                await context.bot.send_photo(chat_id=chat_id, photo=image_file,
-                                             caption='✅ Все активные ваучеры (еще не использованые).',
-                                             reply_markup=keyboard_markup)
+            await navigator.show_photo(update, context, 'bot_app/media/active_voucher.jpg',
+                                       caption='✅ Все активные ваучеры (еще не использованые).',
+                                       reply_markup=keyboard_markup)
 
     @staticmethod
     async def view_selected_active_voucher(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
-        selected_voucher = db.get_selected_voucher(chat_id)
-        price_of_selected_voucher = db.get_price_voucher(chat_id, selected_voucher)
-
-        activate_button = InlineKeyboardButton('ACTIVATE', callback_data='activate')
-        back_button = InlineKeyboardButton('⏪ Назад', callback_data='check_voucher')
-
-        keyboard = InlineKeyboardMarkup([[activate_button], [back_button]])
-
-        await delete_messages(update, context)
-        await context.bot.send_message(chat_id=chat_id,
-                                       text=f"Вы выбрали ваучер:\n\n"
-                                            f"ID:  {selected_voucher}\n"
-                                            f"Цена: {price_of_selected_voucher} PLN\n\n"
-                                            f"Выберите [ACTIVATE] для активации ваучера.\n"
-                                            f"❗ВАЖНО - После активации ваучер станет не пригодным\n"
-                                            f"и будет находиться в базе как использованый ваучер!\n"
-                                            f"В /admin панели есть функция 'Просмотреть использованые ваучеры'",
-                                       reply_markup=keyboard)
+        user_state = await get_user_state(update, context)
+        selected_voucher = user_state.selected_voucher
+        price_of_selected_voucher = await async_db.get_price_voucher(chat_id, selected_voucher)
+
+        keyboard = keyboards.get('selected_voucher')
+
+        await navigator.show_text(update, context,
+                                  text=f"Вы выбрали ваучер:\n\n"
+                                       f"ID:  {selected_voucher}\n"
+                                       f"Цена: {price_of_selected_voucher} PLN\n\n"
+                                       f"Выберите [ACTIVATE] для активации ваучера.\n"
+                                       f"❗ВАЖНО - После активации ваучер станет не пригодным\n"
+                                       f"и будет находиться в базе как использованый ваучер!\n"
+                                       f"В /admin панели есть функция 'Просмотреть использованые ваучеры'",
+                                  reply_markup=keyboard)
 
     @staticmethod
     async def view_selected_deactivate_voucher(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
-        selected_deactivate_voucher = db.get_deactivate_voucher(chat_id)
+        selected_deactivate_voucher = await async_db.get_deactivate_voucher(chat_id)
 
-        back_button = InlineKeyboardButton('⏪ Назад', callback_data='admin')
-        keyboard = InlineKeyboardMarkup([[back_button]])
+        keyboard = keyboards.get('admin_back')
 
         voucher_message = 'Вот все использованые ваучеры:\n'
 
-        await delete_messages(update, context)
-
         if not selected_deactivate_voucher:
-            with open('bot_app/media/empty_data.jpg', 'rb') as image_file:
-                await context.bot.send_photo(chat_id=chat_id,
-                                             photo=image_file,
-                                             caption='Пока активированых ваучеров нет!',
-                                             reply_markup=keyboard)
+            await navigator.show_photo(update, context, 'bot_app/media/empty_data.jpg',
+                                       caption='Пока активированых ваучеров нет!',
+                                       reply_markup=keyboard)
         else:
             for voucher_data in selected_deactivate_voucher:
                 voucher_message += f'❌\nID: {voucher_data[0]}\nValue: {voucher_data[1]}\nDate: {voucher_data[2]}\n'
-            with open('bot_app/media/active_voucher.jpg', 'rb') as image_file:
-                await context.bot.send_photo(chat_id=chat_id,
-                                             photo=image_file,
-                                             caption=voucher_message,
-                                             reply_markup=keyboard)
+            await navigator.show_photo(update, context, 'bot_app/media/active_voucher.jpg', caption=voucher_message,
+                                       reply_markup=keyboard)
 
     @staticmethod
     async def activate_voucher(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
-        selected_voucher = db.get_selected_voucher(chat_id)
-        activate = db.activate_voucher(chat_id)
+        user_state = await get_user_state(update, context)
+        selected_voucher = user_state.selected_voucher
+        activate = await async_db.activate_voucher(selected_voucher)
+        user_state.selected_voucher = None
         await context.bot.send_message(chat_id=chat_id, text=f"Ваучер:  {selected_voucher}  был активирован!")
         return activate
 
@@ -268,3 +241,23 @@ class AdminCommands:
         db_file = '/tattoo_bot_telegram.db'
 
         await context.bot.send_document(chat_id=chat_id, document=db_file)
+
+    @staticmethod
+    async def db_profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        admin = [int(admin_chat_id), int(sub_admin_id)]
+
+        if chat_id not in admin:
+            await navigator.show_photo(update, context, 'bot_app/media/denied.jpg',
+                                       caption="Отказано в доступе. Access Denied. Odmowa dostępu.",
+                                       reply_markup=keyboards.get('denied'))
+            return
+
+        report = profiler.report(DB_PROFILE_TOP)
+        if len(report) > MAX_MESSAGE_LENGTH:
+            report = report[:MAX_MESSAGE_LENGTH - 3] + '...'
+        await navigator.show_text(update, context, text=report, reply_markup=keyboards.get('admin_back'))
+
+
+def format_amount(amount):
+    return f'{amount:.0f}' if float(amount).is_integer() else f'{amount:.2f}'
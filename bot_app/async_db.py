@@ -0,0 +1,71 @@
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from bot_app.db_manager import db
+
+READER_THREADS = 2
+
+
+class AsyncDBManager:
+    """
+    AsyncDBManager Class Description
+
+    The `AsyncDBManager` class is the non-blocking face of `DBManager` for the async handlers of the bot. SQLite
+    calls are blocking, and running them directly in a handler stops the whole event loop (and with it every other
+    chat) while a query or a slow fsync is in progress.
+
+    Functionality:
+
+    - Dedicated DB Thread: All writes are executed by one dedicated database thread. Its executor queue is the
+    request queue, so writes are processed one after another on a single long-lived connection of the
+    `ConnectionPool`, while the event loop keeps serving other updates.
+    - Reader Threads: The read-only `get_*` methods run in a small pool of reader threads with their own connections.
+    In WAL mode readers are not blocked by the writer, so a slow commit does not delay the queries of other chats.
+    - Awaitable Methods: Every method of the wrapped `DBManager` is available as an awaitable with the same name and
+    arguments: `lang = await async_db.get_selected_lang(chat_id)`.
+    - Custom Work: `run(func, *args)` executes any other blocking database function (for example a transaction made
+    of several statements) in the DB thread.
+
+    Note: Writes stay serialized. A stalled commit (a slow fsync) still delays every write queued behind it, and the
+    handlers awaiting those writes; what no longer waits for it is the event loop, the reads and the chats which do
+    not write at that moment (see `benchmarks/db_event_loop_latency.py`). The wrapped `DBManager` can still be used
+    synchronously outside of the event loop, e.g. for the migrations at start-up.
+    """
+
+    def __init__(self, db_manager, readers=READER_THREADS):
+        self.db = db_manager
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            if name.startswith('get_'):
+                return await self._submit(self._readers, method, *args, **kwargs)
+            return await self.run(method, *args, **kwargs)
+
+        call.__name__ = name
+        setattr(self, name, call)
+        return call
+
+    async def run(self, func, *args, **kwargs):
+        return await self._submit(self._executor, func, *args, **kwargs)
+
+    @staticmethod
+    async def _submit(executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+    def close(self):
+        self._readers.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        self.db.close()
+
+
+async_db = AsyncDBManager(db)
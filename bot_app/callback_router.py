@@ -0,0 +1,70 @@
+from bot_app.metrics import metrics
+
+FUNCTION = 'fn'
+VOUCHER = 'v'
+USER_VOUCHER = 'uv'
+PRICE = 'price'
+LANGUAGE = 'lang'
+
+CALLBACK_KINDS = (FUNCTION, VOUCHER, USER_VOUCHER, PRICE, LANGUAGE)
+
+LANGUAGES = ('RU', 'ENG', 'PL')
+PRICES = ('300', '600', '800', '1000')
+
+
+def parse_callback_data(data):
+    """
+    Parse Callback Data Function
+
+    Splits the `callback_data` of an inline button into its kind and its value. Every button of the bot uses a typed
+    `<kind>:<value>` scheme:
+
+    - `fn:<name>` - open a screen / run a function (`fn:voucher`, `fn:all_commands`, ...)
+    - `v:<voucher_id>` - the admin selected a voucher
+    - `uv:<voucher_id>` - the user selected one of his own vouchers
+    - `price:<value>` - the user selected the value of a new voucher
+    - `lang:<code>` - the user selected a language
+
+    Buttons of messages sent before the typed scheme was introduced have no prefix. Language codes and prices are
+    recognised by their value, everything else is treated as a function name.
+    """
+    kind, separator, value = data.partition(':')
+    if separator and kind in CALLBACK_KINDS:
+        return kind, value
+
+    if data in LANGUAGES:
+        return LANGUAGE, data
+    if data in PRICES:
+        return PRICE, data
+    return FUNCTION, data
+
+
+class CallbackRouter:
+    """
+    CallbackRouter Class Description
+
+    The `CallbackRouter` class maps the `fn:` callbacks of the inline buttons to the handlers which show the
+    requested screen. The branch for all other kinds of callbacks is decided by `parse_callback_data`, so
+    `button_click` no longer has to compare the clicked data with lists of every language, price and voucher code.
+
+    Usage:
+
+    - Register the handlers once: `router.register_functions({'faq': main_commands.faq_command, ...})`.
+    - Look the handler of a clicked function up in O(1): `router.function('faq')`. Unknown names return `None`.
+
+    Note: The registered handlers are instrumented (`metrics.instrument`), so every screen has its own latency
+    histogram under its function name.
+    """
+
+    def __init__(self):
+        self._functions = {}
+
+    def register(self, name, handler):
+        self._functions[name] = metrics.instrument(name, handler)
+
+    def register_functions(self, handlers):
+        for name, handler in handlers.items():
+            self.register(name, handler)
+
+    def function(self, name):
+        return self._functions.get(name)
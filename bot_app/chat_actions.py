@@ -1,62 +1,51 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from bot_app.db_manager import DBManager
-
-db = DBManager('tattoo_bot_telegram.db')
+from bot_app.session_store import sessions
+from bot_app.message_ledger import ledger
 
 
 async def delete_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Delete Messages Function
 
-    The `delete_messages` function is an asynchronous function designed to delete specific messages in a Telegram
-    chat. It takes two parameters: `update` and `context`, which are objects containing information about the
-    incoming update and the bot's context, respectively.
+    The `delete_messages` function is an asynchronous function designed to remove the previous screen of the bot
+    from a Telegram chat before the next screen is sent. It takes two parameters: `update` and `context`, which are
+    objects containing information about the incoming update and the bot's context, respectively.
 
     Parameters: - `update`: An object containing information about the incoming update, such as the chat ID and
     message ID. - `context`: An object providing the context for the bot's execution, including access to the
     Telegram Bot API methods.
 
     Functionality: 1. Retrieves the `chat_id` and `message_id` from the `update` object, representing the ID of
-    the chat and the ID of the message to be deleted, respectively. 2. Retrieves the `first_message_id` from the
-    database for the given `chat_id`, which indicates the ID of the first message in the chat. 3. Iterates over a
-    range from 1 to 10 to delete messages around the `message_id`. 4. Attempts to delete messages preceding and
-    succeeding the `message_id` by a certain offset (up to 10 messages in both directions). 5. Checks if the message
-    to be deleted is not the first message in the chat (`message_id != first_message_id`) before attempting deletion.
-    6. If an exception occurs during deletion, it is caught and returned.
-
-    Usage: - This function can be used within a Telegram bot application to delete specific messages in a chat,
-    typically used for cleaning up previous bot interactions or managing message clutter. - It can be integrated into
-    administrative commands or message processing logic to provide a streamlined user experience and maintain chat
-    cleanliness.
+    the chat and the ID of the message which triggered the update. 2. Retrieves the `first_message_id` of the chat
+    from the user state, this message is never deleted. 3. Deletes the current message together with every message
+    recorded in the `MessageLedger` of the chat (all messages the bot sent since the last cleanup) with one batched
+    `deleteMessages` call. 4. If an exception occurs during deletion, it is caught and returned.
+
+    Usage: - This function can be used within a Telegram bot application to delete the messages of the previous
+    screen, typically used for cleaning up previous bot interactions or managing message clutter.
 
     Note: Ensure that the bot has the necessary permissions to delete messages in the chat where it operates.
 
     """
     chat_id = update.effective_chat.id
     message_id = update.effective_message.message_id
-    first_message_id = db.get_message_id(chat_id)
-
-    for i in range(1, 10):
-        try:
-            if message_id - i != first_message_id:
-                await context.bot.deleteMessage(chat_id=chat_id, message_id=message_id)
-                await context.bot.delete_message(chat_id=chat_id, message_id=message_id - i)
-            else:
-                break
-        except Exception as e:
-            return e
-
-    for i in range(1, 10):
-        try:
-            if message_id + i != first_message_id:
-                await context.bot.deleteMessage(chat_id=chat_id, message_id=message_id)
-                await context.bot.delete_message(chat_id=chat_id, message_id=message_id + i)
-            else:
-                break
-        except Exception as e:
-            return e
+    user_state = await get_user_state(update, context)
+    first_message_id = user_state.message_id
+
+    return await ledger.delete_messages(context.bot, chat_id, message_id, keep=(first_message_id,))
+
+
+async def get_user_state(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Get User State Function
+
+    Returns the `UserState` of the current chat from the in-memory `SessionStore`. Every handler of the chat gets the
+    same object, so the `users` table is only queried when the chat was not active recently. For chats which are not
+    in the database yet, an empty state is returned.
+    """
+    return await sessions.get(update.effective_chat.id)
 
 
 main_messages = {
@@ -127,6 +116,11 @@ voucher_messages = {
                            "пожалуйста, напишите нам на адрес электронной почты: dark.soul.assistant@gmail.com\n\n"
                            "Мы свяжемся с вами как можно скорее!",
 
+        'voucher_busy': "Сейчас ваучеры запрашивают очень многие 🎁\n"
+                        "Пожалуйста, попробуйте ещё раз через минуту.",
+
+        'voucher_not_selected': "⚠️ Выбранный ваучер не найден, пожалуйста, выберите его ещё раз.\n\n",
+
         'user_vouchers': 'В [ACTIVE VOUCHERS] храняться ваши активные ваучеры\n\n'
                          'Ваучер можно:\n\n'
                          '📥 - Скачать\n'
@@ -215,6 +209,11 @@ voucher_messages = {
                            "please email us at: dark.soul.assistant@gmail.com\n\n"
                            "We will contact you as soon as possible",
 
+        'voucher_busy': "A lot of vouchers are being requested right now 🎁\n"
+                        "Please try again in a minute.",
+
+        'voucher_not_selected': "⚠️ The selected voucher was not found, please choose it again.\n\n",
+
         'user_vouchers': "Voucher options:\n\n"
                          "📥 - Download\n"
                          "📭 - Receive via email\n"
@@ -302,6 +301,9 @@ voucher_messages = {
                            "Jeśli dokonałeś płatności i nie otrzymałeś vouchera,"
                            "prosimy o kontakt mailowy pod adresem: dark.soul.assistant@gmail.com\n\n"
                            "Skontaktujemy się z Tobą tak szybko, jak to możliwe!",
+        'voucher_busy': "W tej chwili bardzo wiele osób pobiera vouchery 🎁\n"
+                        "Spróbuj ponownie za minutę.",
+        'voucher_not_selected': "⚠️ Nie znaleziono wybranego vouchera, wybierz go ponownie.\n\n",
         'user_vouchers': "[ACTIVE VOUCHERS] przechowuje twoje aktywne vouchery.\n\n"
                          "Możesz:\n\n"
                          "📥 - Pobrać\n"
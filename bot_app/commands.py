@@ -1,16 +1,10 @@
-import os
-
-from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ContextTypes
 
-from bot_app.db_manager import DBManager
-from bot_app.chat_actions import main_messages, delete_messages
-
-load_dotenv()
-admin_chat_id = os.getenv('admin_id')
-sub_admin_id = os.getenv('sub_admin_id')
-db = DBManager('tattoo_bot_telegram.db')
+from bot_app.media_registry import media
+from bot_app.screen_navigator import navigator
+from bot_app.keyboards import keyboards
+from bot_app.chat_actions import main_messages, delete_messages, get_user_state
 
 
 class MainMenuCommands:
@@ -58,95 +52,41 @@ class MainMenuCommands:
         chat_id = update.effective_chat.id
         message_text = update.effective_message.text
 
-        russian_button = InlineKeyboardButton('🔘 RU ', callback_data='RU')
-        english_button = InlineKeyboardButton('🔘 ENG ', callback_data="ENG")
-        polish_button = InlineKeyboardButton('🔘 PL ', callback_data='PL')
-
-        keyboard = InlineKeyboardMarkup([[russian_button, english_button, polish_button]])
-        try:
-            if message_text != '/start':
-                await delete_messages(update, context)
-        except Exception as e:
-            return e
-        with open('bot_app/media/start_img.PNG', 'rb') as image_file:
-            await context.bot.send_photo(chat_id=chat_id, photo=image_file, reply_markup=keyboard)
+        keyboard = keyboards.get('start')
+        if message_text == '/start':
+            await media.send_photo(context.bot, chat_id, 'bot_app/media/start_img.PNG', reply_markup=keyboard)
+        else:
+            await navigator.show_photo(update, context, 'bot_app/media/start_img.PNG', reply_markup=keyboard)
 
     @staticmethod
     async def kontakt_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        chat_id = update.effective_chat.id
-        message_id = update.effective_message.message_id
-        lang = db.get_selected_lang(chat_id)
+        user_state = await get_user_state(update, context)
+        lang = user_state.selected_lang
 
-        instagram_button = InlineKeyboardButton("Instagram", url='https://www.instagram.com/alexsun_darksoul/')
-        facebook_button = InlineKeyboardButton('Facebook', url='https://www.facebook.com/profile.php?id=100089965814206')
-        back_button = InlineKeyboardButton(main_messages[lang]['back_btn'], callback_data='all_commands')
+        keyboard = keyboards.get('kontakt', lang)
 
-        keyboard = InlineKeyboardMarkup([[facebook_button, instagram_button], [back_button]])
-
-        await context.bot.deleteMessage(chat_id=chat_id, message_id=message_id)
-        with open('bot_app/media/instagram.PNG', 'rb') as image_file:
-            await context.bot.send_photo(chat_id=chat_id, photo=image_file,
-                                         caption=main_messages[lang]['kontakt'],
-                                         reply_markup=keyboard)
+        await navigator.show_photo(update, context, 'bot_app/media/instagram.PNG',
+                                   caption=main_messages[lang]['kontakt'],
+                                   reply_markup=keyboard)
 
     @staticmethod
     async def faq_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        chat_id = update.effective_chat.id
-        message_id = update.effective_message.message_id
-        lang = db.get_selected_lang(chat_id)
-
-        language_buttons = {
-            'RU': [
-                ('♻️ Подготовка к сеансу', 'https://telegra.ph/Podgotovka-k-seansu-11-05'),
-                ('✅ Правильный уход за тату', 'https://telegra.ph/Uhod-za-tatuirovkoj-11-04'),
-                ('💸 Формирование цены', 'https://telegra.ph/Cenoobrazovanie-tatuirovok-10-29'),
-                ('🧾 Для чего нужна консультация', 'https://telegra.ph/Konsultaciya-11-15-2'),
-                (main_messages[lang]['back_btn'], 'all_commands')
-            ],
-            'ENG': [
-                ('♻️ Tattoo Session Prep Guide', 'https://telegra.ph/Preparing-for-the-Session-11-26-6'),
-                ('✅ Tattoo Aftercare Guide', 'https://telegra.ph/Tattoo-Aftercare-Guide-11-26-2'),
-                ('💸 Tattoo Pricing Guide', 'https://telegra.ph/Tattoo-Pricing-Guide-11-26-6'),
-                ('🧾 Tattoo Consultation Overview', 'https://telegra.ph/Tattoo-Consultation-Overview-11-26'),
-                (main_messages[lang]['back_btn'], 'all_commands')
-            ],
-            'PL': [
-                ('♻️ Przygotowanie do sesji tatuażu', 'https://telegra.ph/Przygotowanie-przed-sesją-11-28-6'),
-                ('✅ Pielęgnacja Tatuażu', 'https://telegra.ph/Pielęgnacja-tatuażu-12-01-2'),
-                ('💸 Formowanie ceny na tatuaże', 'https://telegra.ph/Formowanie-ceny-na-tatuaże-12-01-5'),
-                ('🧾 Cel i Zakres Konsultacji', 'https://telegra.ph/Cel-i-Zakres-Konsultacji-12-01-3'),
-                (main_messages[lang]['back_btn'], 'all_commands')
-            ]
-        }
-
-        keyboard = {}
-
-        for lang_key, buttons in language_buttons.items():
-            keyboard[lang_key] = InlineKeyboardMarkup([
-                [InlineKeyboardButton(text, url=url if 'http' in url else None,
-                                      callback_data=url if 'http' not in url else None)]
-                for text, url in buttons
-            ])
-
-        selected_keyboard = keyboard.get(lang)
-
-        await context.bot.deleteMessage(chat_id=chat_id, message_id=message_id)
-        await delete_messages(update, context)
-        with open('bot_app/media/FAQ/main_faq.PNG', 'rb') as image_file:
-            await context.bot.send_photo(chat_id=chat_id, photo=image_file,
-                                         reply_markup=selected_keyboard)
+        user_state = await get_user_state(update, context)
+        lang = user_state.selected_lang
+
+        selected_keyboard = keyboards.get('faq', lang)
+
+        await navigator.show_photo(update, context, 'bot_app/media/FAQ/main_faq.PNG', reply_markup=selected_keyboard)
 
     @staticmethod
     async def location_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
-        lang = db.get_selected_lang(chat_id)
+        user_state = await get_user_state(update, context)
+        lang = user_state.selected_lang
 
         latitude, longitude = 52.234496916779186, 21.0165569344955
 
-        back_button = InlineKeyboardButton(main_messages[lang]['back_btn'], callback_data='all_commands')
-        info_btn = InlineKeyboardButton(main_messages[lang]['localization'], callback_data='local')
-
-        keyboard = InlineKeyboardMarkup([[info_btn], [back_button]])
+        keyboard = keyboards.get('local', lang)
 
         await delete_messages(update, context)
         await context.bot.send_location(chat_id=chat_id, latitude=latitude,
@@ -154,57 +94,11 @@ class MainMenuCommands:
 
     @staticmethod
     async def all_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        chat_id = update.effective_chat.id
-        message_id = update.effective_message.message_id
-        lang = db.get_selected_lang(chat_id)
-        message_text = update.effective_message.text
-        delete_prev_func = db.delete_prev_func_from_db(chat_id)
-
-        buttons_info = {
-            'ENG':
-                {'🔄 LANGUAGE': 'start',
-                 '🗃️ F.A.Q': 'faq',
-                 '📱 KONTAKT': 'kontakt',
-                 '📍 LOCALIZATION': 'local',
-                 '🎁 VOUCHER': 'voucher'},
-            'PL':
-                {'JĘZYK 🔄': 'start',
-                 'F.A.Q 🗃️': 'faq',
-                 'KONTAKT 📱': 'kontakt',
-                 'LOKALIZACJA 📍': 'local',
-                 'VOUCHER 🎁': 'voucher'},
-            'RU':
-                {'ЯЗЫК 🔄': 'start',
-                 'F.A.Q 🗃️': 'faq',
-                 'КОНТАКТ 📱': 'kontakt',
-                 'ГЕОЛОКАЦИЯ 📍': 'local',
-                 'ВАУЧЕРЫ 🎁': 'voucher'},
-        }
-
-        buttons_per_row = 2
-
-        keyboard_buttons = [
-            [
-                InlineKeyboardButton(button_text, callback_data=callback_data)
-                for button_text, callback_data in list(buttons_info[lang].items())[i:i + buttons_per_row]
-            ]
-            for i in range(0, len(buttons_info[lang]), buttons_per_row)
-        ]
-
-        keyboard_markup = InlineKeyboardMarkup(keyboard_buttons)
-
-        try:
-            if message_text == '/start':
-                await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-            else:
-                await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-                await delete_messages(update, context)
-        except Exception as e:
-            return e
-        with open('bot_app/media/main_menu_img.PNG', 'rb') as image_file:
-            await context.bot.send_photo(chat_id=chat_id,
-                                         photo=image_file,
-                                         reply_markup=keyboard_markup)
-
-        return delete_prev_func
+        user_state = await get_user_state(update, context)
+        lang = user_state.selected_lang
+        user_state.prev_func = None
+
+        keyboard_markup = keyboards.get('all_commands', lang)
+
+        await navigator.show_photo(update, context, 'bot_app/media/main_menu_img.PNG', reply_markup=keyboard_markup)
 
@@ -0,0 +1,64 @@
+"""
+Bot Configuration
+
+All settings of the bot are read here, once, from the environment. The `.env` file is loaded by this module only, so
+the other modules import their settings from `bot_app.config` instead of calling `load_dotenv()` themselves.
+
+Telegram: `TOKEN`, `BOT_USERNAME`, `BOT_MODE` (`polling` or `webhook`), `WEBHOOK_*`, `BOT_API_BASE_URL` and
+`BOT_API_BASE_FILE_URL` (a local Bot API server or `devtools/fake_bot_api.py`), `CONCURRENT_UPDATES`,
+`BOT_GLOBAL_RATE`.
+Admins: `ADMIN_ID`, `SUB_ADMIN_ID`.
+E-mail: `SMTP_HOST`, `SMTP_PORT`, `SMTP_STARTTLS`, `SMTP_USERNAME`, `SMTP_PASSWORD`, `SMTP_FROM`.
+Stripe: `STRIPE_API_KEY`, `STRIPE_POLL_INTERVAL`, `STRIPE_WEBHOOK_SECRET`, `STRIPE_WEBHOOK_HOST`,
+`STRIPE_WEBHOOK_PORT`.
+Storage: `PERSISTENCE_FLUSH_INTERVAL`, `SESSION_CACHE_SIZE`, `SESSION_FLUSH_INTERVAL`, `VOUCHER_CACHE_DIR`,
+`VOUCHER_CACHE_MAX_MB`.
+Metrics: `METRICS_HOST`, `METRICS_PORT` (the `/metrics` endpoint, `0` disables it), `DB_PROFILE` (`1` enables
+the query profiler), `DB_SLOW_QUERY_MS`.
+"""
+
+import os
+
+import dotenv
+
+dotenv.load_dotenv()
+
+TOKEN = os.getenv('TOKEN')
+BOT_USERNAME = os.getenv('BOT_USERNAME')
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL', 'https://api.telegram.org/bot')
+BOT_API_BASE_FILE_URL = os.getenv('BOT_API_BASE_FILE_URL', 'https://api.telegram.org/file/bot')
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '16'))
+BOT_GLOBAL_RATE = int(os.getenv('BOT_GLOBAL_RATE', '30'))
+
+ADMIN_ID = os.getenv('ADMIN_ID')
+SUB_ADMIN_ID = os.getenv('SUB_ADMIN_ID')
+
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') != '0'
+SMTP_USERNAME = os.getenv('SMTP_USERNAME')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
+SMTP_FROM = os.getenv('SMTP_FROM') or SMTP_USERNAME
+
+STRIPE_API_KEY = os.getenv('STRIPE_API_KEY')
+STRIPE_POLL_INTERVAL = int(os.getenv('STRIPE_POLL_INTERVAL', '60'))
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+STRIPE_WEBHOOK_HOST = os.getenv('STRIPE_WEBHOOK_HOST', '0.0.0.0')
+STRIPE_WEBHOOK_PORT = int(os.getenv('STRIPE_WEBHOOK_PORT', '8081'))
+
+PERSISTENCE_FLUSH_INTERVAL = int(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '10'))
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+SESSION_FLUSH_INTERVAL = int(os.getenv('SESSION_FLUSH_INTERVAL', '5'))
+VOUCHER_CACHE_DIR = os.getenv('VOUCHER_CACHE_DIR', 'bot_app/media/Voucher/sold_out_vouchers')
+VOUCHER_CACHE_MAX_BYTES = int(os.getenv('VOUCHER_CACHE_MAX_MB', '50')) * 1024 * 1024
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9091'))
+DB_PROFILE = os.getenv('DB_PROFILE', '0') == '1'
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '50'))
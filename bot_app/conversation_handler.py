@@ -1,6 +1,8 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
 
+from bot_app.message_ledger import ledger
+
 """
 Voucher Addition Conversation Functions
 
@@ -15,79 +17,69 @@ Replies to the user with the first question.
 Returns the key corresponding to the first question in the questions dictionary.
 Function 2: question_1(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str
 
-Stores the user's answer to the first question in the user_answers dictionary.
+Stores the user's answer to the first question in `context.user_data['voucher_code']`.
 Asks the user the second question about the voucher.
 Replies to the user with the second question.
 Returns the key corresponding to the second question in the questions dictionary.
 Function 3: question_2(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
-Stores the user's answer to the second question in the user_answers dictionary.
+Stores the user's answer to the second question in `context.user_data['voucher_value']`.
 Displays the collected voucher details to the user for confirmation, along with options to save or change the details.
 Ends the conversation flow.
 Returns ConversationHandler.END to signify the end of the conversation.
 Function 4: cancel(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
-Cancels the voucher addition process by clearing the user_answers dictionary. Replies to the user indicating that the 
-survey has been canceled. These functions are designed to be integrated into a conversation handler within the 
+Cancels the voucher addition process by removing the answers from `context.user_data` and ends the conversation. 
+Replies to the user indicating that the survey has been canceled. These functions are designed to be integrated into a conversation handler within the 
 Telegram bot application, allowing for an interactive flow when adding vouchers. Users can provide answers to 
 questions sequentially, and the bot guides them through the process with appropriate responses and options. 
-Additionally, the cancel function provides a way for users to abort the process if needed."""
+Additionally, the cancel function provides a way for users to abort the process if needed.
+
+The answers are kept per user in `context.user_data`, so several admins can add vouchers at the same time. The 
+conversation is persistent (`name='add_voucher'`, see `main.py`): its state and the answers are stored by 
+`SQLitePersistence` and survive a restart of the bot."""
 
 questions = {
     'question_1': 'Напишите id для идентификации ваучера',
     'question_2': 'На какую сумму ваучер',
 }
 
-user_answers = {}
-
 
 async def add_voucher_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    ledger.record(update.effective_chat.id, update.message.message_id)
     await update.message.reply_text(questions['question_1'])
     return 'question_1'
 
 
 async def question_1(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
-    user_answers['question_1'] = update.message.text
+    context.user_data['voucher_code'] = update.message.text
+    ledger.record(update.effective_chat.id, update.message.message_id)
     await update.message.reply_text(questions['question_2'])
     return 'question_2'
 
 
 async def question_2(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user_answers['question_2'] = update.message.text
+    context.user_data['voucher_value'] = update.message.text
 
-    save_button = InlineKeyboardButton('Сохранить', callback_data='save')
-    change_button = InlineKeyboardButton('Изменить', callback_data='change')
-    back_button = InlineKeyboardButton('⏪ Назад', callback_data='admin')
+    save_button = InlineKeyboardButton('Сохранить', callback_data='fn:save')
+    change_button = InlineKeyboardButton('Изменить', callback_data='fn:change')
+    back_button = InlineKeyboardButton('⏪ Назад', callback_data='fn:admin')
 
     keyboard = InlineKeyboardMarkup([[save_button, change_button], [back_button]])
 
     await delete_messages(update, context)
-    await update.message.reply_text(f"ID ваучера: {user_answers.get('question_1')}\n"
-                                    f"Сумма ваучера: {user_answers.get('question_2')}", reply_markup=keyboard)
+    await update.message.reply_text(f"ID ваучера: {context.user_data.get('voucher_code')}\n"
+                                    f"Сумма ваучера: {context.user_data.get('voucher_value')}", reply_markup=keyboard)
 
     return ConversationHandler.END
 
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_answers.clear()
+    context.user_data.pop('voucher_code', None)
+    context.user_data.pop('voucher_value', None)
     await update.message.reply_text("Опрос отменён!")
+    return ConversationHandler.END
 
 
 async def delete_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    message_id = update.effective_message.message_id
-
-    await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-    for i in range(1, 20):
-        try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=message_id - i)
-
-        except Exception as e:
-            return e
-
-    for i in range(1, 20):
-        try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=message_id + i)
-
-        except Exception as e:
-            return e
\ No newline at end of file
+    await ledger.delete_messages(context.bot, update.effective_chat.id, update.effective_message.message_id)
@@ -1,32 +1,30 @@
-import os
-import dotenv
-from datetime import date
-
-import stripe
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from bot_app.admin_commands import AdminCommands
-from bot_app.db_manager import DBManager
+from bot_app.async_db import async_db
+from bot_app.session_store import sessions
 from bot_app.voucher_handler import VoucherCommands
 from bot_app.commands import MainMenuCommands
 
 from bot_app.email_sender import send_email_with_attachment
 from bot_app.conversation_handler import cancel
 from bot_app.chat_actions import delete_messages
-
-
-dotenv.load_dotenv()
-date_today = date.today()
-
-STRIPE_API_KEY = os.getenv('STRIPE_API_KEY')
-stripe.api_key = STRIPE_API_KEY
-
-db = DBManager('tattoo_bot_telegram.db')
+from bot_app.screen_navigator import navigator
+from bot_app.metrics import metrics
+from bot_app.callback_router import CallbackRouter, parse_callback_data, FUNCTION, VOUCHER, USER_VOUCHER, PRICE, \
+    LANGUAGE
 
 admin_commands = AdminCommands()
 main_commands = MainMenuCommands()
 voucher_commands = VoucherCommands()
+router = CallbackRouter()
+
+view_selected_voucher = metrics.instrument('selected_voucher', admin_commands.view_selected_active_voucher)
+view_selected_user_voucher = metrics.instrument('selected_user_voucher',
+                                                voucher_commands.view_selected_user_active_voucher)
+manage_payment_or_price = metrics.instrument('manage_price', voucher_commands.manage_payment_or_price)
+change_language = metrics.instrument('change_language', main_commands.all_commands)
 
 
 async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -40,13 +38,15 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Functionality:
 
     - Retrieves necessary information from the update, such as callback query data, chat ID, message ID,
-    and user details. - Establishes a connection to the database and creates a cursor for executing SQL queries. -
-    Handles different types of button clicks, including FAQ actions, voucher selections, function actions,
-    admin actions, price actions, and language actions. - Updates user data in the database based on the clicked
-    button, such as selected language, function, FAQ option, price selection, and voucher selection. - Handles
-    language changes by resetting previously selected data. - Commits the changes to the database and closes the
-    database connection. - Invokes the `data_controller` function to handle further actions based on the updated user
-    data.
+    and user details. - Parses the typed callback data (`fn:`, `v:`, `uv:`, `price:`, `lang:`) with
+    `parse_callback_data`, so the branch is decided by the prefix alone. - Handles different types of button clicks,
+    including voucher selections, function actions, price actions, and language actions. Vouchers are checked with a
+    single lookup of the clicked voucher only when a voucher button was clicked. - Updates the user state
+    based on the clicked button, such as selected language, function, price selection, and voucher selection. -
+    Handles language changes by resetting previously selected data. - The clicked button is applied to the
+    in-memory `UserState` of the chat by `apply_clicked_button` (`SessionStore`); a click does not write to the
+    `users` table, only a language change is saved later by the write-behind flush. - Invokes the
+    `data_controller` function to handle further actions based on the updated user data.
 
     Usage: - This function is designed to be integrated into a Telegram bot application's inline button handling
     logic. - It allows users to interact with the bot by clicking inline buttons and dynamically updates user data
@@ -59,68 +59,57 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     effectively!"""
 
     query = update.callback_query
-    new_element = query.data
+    kind, value = parse_callback_data(query.data)
     chat_id = update.effective_chat.id
     message_id = update.effective_message.message_id
     user_name = update.effective_user.first_name
-    first_lang = 'LANGUAGE'
-    prev_language = 'PREVLANG'
-    prev_func = 'start'
-
-    conn = db.create_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''INSERT INTO users 
-        (chat_id, message_id, user_name, email, selected_lang, previous_lang,
-         selected_func, prev_func, selected_price, previous_price, selected_voucher, user_selected_voucher, dark_soul_code)
-        SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-        WHERE NOT EXISTS (SELECT 1 FROM users WHERE chat_id = ?)''',
-                   (chat_id, message_id, user_name, None, first_lang, prev_language, None, prev_func, None, None, None, None, None, chat_id))
-
-    unpacked_voucher_codes = cursor.execute("SELECT voucher_id FROM vouchers").fetchall()
-    voucher_codes = [(item[0]) for item in unpacked_voucher_codes]
-    user_voucher_codes = [f'{item[0]}-{chat_id}' for item in unpacked_voucher_codes]
-
-    if new_element in user_voucher_codes:
-        user_selected_voucher = new_element
-        cursor.execute("UPDATE users SET user_selected_voucher = ? WHERE chat_id = ?", (user_selected_voucher, chat_id))
-        cursor.execute("UPDATE users SET selected_voucher =? WHERE chat_id = ? ", (None, chat_id))
-
-    elif new_element in voucher_codes:
-        selected_voucher = new_element
-        cursor.execute("UPDATE users SET selected_price = ? WHERE chat_id = ?", (None, chat_id))
-        cursor.execute("UPDATE users SET selected_voucher = ? WHERE chat_id = ?", (selected_voucher, chat_id))
-
-    elif new_element in actions['function_actions'] or new_element in actions['admin_actions']:
-        selected_func = new_element
-        cursor.execute("UPDATE users SET selected_func = ? Where chat_id = ?", (selected_func, chat_id))
-
-    elif new_element in actions['price_actions']:
-        selected_value = new_element
-        current_price = db.get_selected_value(chat_id)
 
-        if current_price != selected_value:
-            previous_value = current_price
+    user_state = await sessions.get(chat_id, message_id, user_name)
+    await apply_clicked_button(user_state, kind, value)
+    await data_controller(update, context)
 
-            cursor.execute("UPDATE users SET selected_price = ?, previous_price = ?, selected_voucher = ?, "
-                           "user_selected_voucher = ? WHERE chat_id = ?",
-                           (selected_value, previous_value, None, None, chat_id,))
 
-    elif new_element in actions['language_actions']:
-        selected_lang = new_element
-        '''When we change the language we need to remove all data which we choose before'''
+async def apply_clicked_button(user_state, kind, value):
+    """
+    Applies the clicked button to the in-memory `UserState` of the chat. The navigation fields are not written to the
+    database; only a language change is saved (write-behind) by the `SessionStore`.
+    """
+    chat_id = user_state.chat_id
 
-        current_lang = db.get_selected_lang(chat_id)
-        prev_lang = current_lang
+    if kind == USER_VOUCHER:
+        if await async_db.get_price_voucher(chat_id, value) is not None:
+            user_state.user_selected_voucher = value
+            user_state.selected_voucher = None
 
-        cursor.execute('''UPDATE users SET selected_price = ?, selected_voucher = ?,
-                                           selected_lang = ?, previous_lang = ?, user_selected_voucher = ?,
-                                            dark_soul_code = ? WHERE chat_id = ?''',
-                       (None, None, selected_lang, prev_lang, None, None, chat_id))
+    elif kind == VOUCHER:
+        if await async_db.voucher_exists(value):
+            user_state.selected_price = None
+            user_state.selected_voucher = value
 
-    conn.commit()
-    conn.close()
-    await data_controller(update, context)
+    elif kind == FUNCTION:
+        if router.function(value) is not None:
+            user_state.selected_func = value
+
+    elif kind == PRICE:
+        selected_value = value
+        current_price = user_state.selected_price
+
+        if current_price != selected_value:
+            user_state.selected_price = selected_value
+            user_state.previous_price = current_price
+            user_state.selected_voucher = None
+            user_state.user_selected_voucher = None
+
+    elif kind == LANGUAGE:
+        '''When we change the language we need to remove all data which we choose before'''
+
+        user_state.previous_lang = user_state.selected_lang
+        user_state.selected_lang = value
+        user_state.selected_price = None
+        user_state.selected_voucher = None
+        user_state.user_selected_voucher = None
+        user_state.dark_soul_code = None
+        sessions.save(user_state)
 
 
 async def data_controller(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -133,9 +122,10 @@ async def data_controller(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     Functionality:
 
-    - Retrieves essential data from the database, including selected language, FAQ option, selected function,
-    selected voucher, and selected price. - Determines the appropriate action based on the retrieved data,
-    such as displaying FAQ information, executing selected functions, managing voucher-related actions, or handling
+    - Takes the `UserState` of the chat from the in-memory `SessionStore` (selected language, selected function,
+    selected voucher, selected price, ...) and resets `selected_func`; the called handlers share the same object.
+    - Determines the appropriate action based on the
+    retrieved data, such as displaying FAQ information, executing selected functions, managing voucher-related actions, or handling
     language changes. - Generates dynamic responses tailored to user interactions, including sending messages,
     photos, or inline keyboard options. - Utilizes inline keyboards to provide users with interactive options,
     such as navigating back to the main menu or accessing specific functionalities. - Deletes unnecessary data from
@@ -157,44 +147,44 @@ async def data_controller(update: Update, context: ContextTypes.DEFAULT_TYPE):
     application!"""
 
     chat_id = update.effective_chat.id
-    message_id = update.effective_message.message_id
 
-    # GET OR DELETE DATA IN DB
-    lang = db.get_selected_lang(chat_id)
-    prev_lang = db.get_prev_lang(chat_id)
-    price = db.get_selected_value(chat_id)
-    selected_function = db.get_selected_func(chat_id)
-    func = data_to_chat.get(selected_function)
-    selected_voucher = db.get_selected_voucher(chat_id)
-    user_selected_voucher = db.get_user_selected_voucher(chat_id)
-    clear_unnecessary_data = db.clear_unnecessary_data_from_db(chat_id)
-
-    all_commands_button = InlineKeyboardButton(data_to_chat[lang]['main_menu_btn'], callback_data='all_commands')
+    # GET USER STATE AND RESET selected_func
+    user_state = await sessions.get(chat_id)
+    selected_function = user_state.selected_func
+    user_state.selected_func = None
+
+    lang = user_state.selected_lang
+    prev_lang = user_state.previous_lang
+    price = user_state.selected_price
+    func = router.function(selected_function)
+    selected_voucher = user_state.selected_voucher
+    user_selected_voucher = user_state.user_selected_voucher
+
+    all_commands_button = InlineKeyboardButton(data_to_chat[lang]['main_menu_btn'], callback_data='fn:all_commands')
     keyboard = InlineKeyboardMarkup([[all_commands_button]])
 
     if selected_function is not None:
         await func(update, context)
-        return clear_unnecessary_data
+        return
 
     elif selected_voucher is not None:
-        await admin_commands.view_selected_active_voucher(update, context)
-        return clear_unnecessary_data
+        await view_selected_voucher(update, context)
+        return
 
     elif user_selected_voucher is not None:
-        await voucher_commands.view_selected_user_active_voucher(update, context)
-        return clear_unnecessary_data
+        await view_selected_user_voucher(update, context)
+        return
 
     elif price is not None:
-        await voucher_commands.manage_payment_or_price(update, context)
-        return clear_unnecessary_data
+        await manage_payment_or_price(update, context)
+        return
 
     elif prev_lang != lang:
-        await main_commands.all_commands(update, context)
-        return clear_unnecessary_data
+        await change_language(update, context)
+        return
 
     elif prev_lang == lang:
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-        await context.bot.send_message(chat_id=chat_id, text=data_to_chat[lang]['same_lang'], reply_markup=keyboard)
+        await navigator.show_text(update, context, text=data_to_chat[lang]['same_lang'], reply_markup=keyboard)
 
 
 #                   FAQ IMAGE PATH
@@ -260,7 +250,9 @@ data_to_chat = {
     'how_to': how_prepare_image_path,
     'how_much': how_much_image_path,
     'consult': how_much_image_path,
+}
 
+router.register_functions({
     'start': main_commands.start_command,
     'faq': main_commands.faq_command,
     'kontakt': main_commands.kontakt_command,
@@ -276,6 +268,7 @@ data_to_chat = {
     'activated': admin_commands.view_selected_deactivate_voucher,
     'admin': admin_commands.admin_command,
     'db_in_chat': admin_commands.send_db_file_in_chat,
+    'db_profile': admin_commands.db_profile_command,
 
     'voucher': voucher_commands.voucher_command,
     'e_voucher': voucher_commands.price_command,
@@ -291,54 +284,4 @@ data_to_chat = {
 
     'cancel': cancel,
     'get_in_email': send_email_with_attachment,
-}
-
-actions = {
-    'language_actions': {'RU': 'RU',
-                         'ENG': 'ENG',
-                         'PL': 'PL'},
-
-    'faq_actions': {'care': 'care',
-                    'how_to': 'how_to',
-                    'how_much': 'how_much',
-                    'consult': 'consult'},
-
-    'price_actions': {'5': '5',
-                      '300': '300',
-                      '600': '600',
-                      '800': '800',
-                      '1000': '1000'},
-
-    'function_actions': {
-        'start': 'start',
-        'faq': 'faq',
-        'kontakt': 'kontakt',
-        'local': 'local',
-        'voucher': 'voucher',
-        'e_voucher': 'e_voucher',
-        'paper_voucher': 'paper_voucher',
-        'price_more': 'price_more',
-        'check_voucher': 'check_voucher',
-        'all_commands': 'all_commands',
-        'change_price': 'change_price',
-        'save': 'save',
-        'change': 'change',
-        'cancel': 'cancel',
-        'activate': 'activate',
-        'activated': 'activated',
-        'admin': 'admin',
-        'manage_price': 'manage_price',
-        'check': 'check',
-        'get_in_chat': 'get_in_chat',
-        'get_in_email': 'get_in_email',
-        'user_vouchers': 'user_vouchers',
-        'user_active_vouchers': 'user_active_vouchers',
-        'user_inactive_vouchers': 'user_inactive_vouchers',
-        'selected_user_active_voucher': 'selected_user_active_voucher'},
-
-    'admin_actions': {
-        'statistics': 'statistics',
-        'add_voucher': 'add_voucher',
-        'check_voucher': 'check_voucher',
-        'db_in_chat': 'db_in_chat'}
-}
+})
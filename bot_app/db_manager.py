@@ -1,9 +1,37 @@
 import sqlite3
 import datetime
 
-from bot_app.conversation_handler import user_answers
+from bot_app.db_pool import ConnectionPool
+from bot_app.migrations import run_migrations
 
-user_answers = user_answers
+DB_FILE = 'tattoo_bot_telegram.db'
+
+
+class UserState:
+    """
+    UserState Class Description
+
+    The `UserState` class is the compact per-chat record of one row of the `users` table. It is loaded with a single
+    query by `DBManager.get_user_state` and then kept in memory by the `SessionStore`, which shares it between all
+    handlers of the chat.
+
+    Note: Only the durable fields (`message_id`, `user_name`, `email`, `selected_lang`, `previous_lang`,
+    `dark_soul_code`) are written back, by `SessionStore.save`. The navigation fields only live in memory.
+    """
+
+    __slots__ = ('chat_id', 'message_id', 'user_name', 'email', 'selected_lang', 'previous_lang', 'selected_func',
+                 'prev_func', 'selected_price', 'previous_price', 'selected_voucher', 'user_selected_voucher',
+                 'dark_soul_code')
+
+    def __init__(self, chat_id, *values):
+        self.chat_id = chat_id
+        for name, value in zip(self.__slots__[1:], values):
+            setattr(self, name, value)
+        for name in self.__slots__[len(values) + 1:]:
+            setattr(self, name, None)
+
+
+USER_STATE_COLUMNS = ', '.join(UserState.__slots__)
 
 
 class DBManager:
@@ -17,9 +45,13 @@ class DBManager:
     Functionality:
 
     - Initialization: Accepts the path to the SQLite database file as input during object creation.
-    - Connection Management: Provides a method to create a database connection using the specified database file.
-    - Table Management: Includes methods to create tables for storing user data (`users`) and voucher information (
-    `vouchers`) if they do not exist.
+    - Connection Management: Takes the connection of the current thread from the shared `ConnectionPool` of the
+    database file, so all queries reuse long-lived WAL connections and their prepared statements instead of opening
+    a new connection every time.
+    - Table Management: `migrate` creates the tables for storing user data (`users`) and voucher information (
+    `vouchers`) and upgrades older database files to the current schema (see `bot_app.migrations`).
+    - User State: `get_user_state` loads the whole `users` row of a chat in one query into a `UserState` object,
+    `save_user_sessions` writes the durable fields of many sessions in one transaction (see `SessionStore`).
     - Data Retrieval: Offers methods to retrieve various data from the
     database, such as selected language, previous language, selected function, FAQ option, selected price,
     and selected vouchers, among others.
@@ -51,73 +83,64 @@ class DBManager:
     """
     def __init__(self, db_file):
         self.db_file = db_file
+        self.pool = ConnectionPool.for_file(db_file)
 
     def create_connection(self):
         conn = None
         try:
-            conn = sqlite3.connect(self.db_file)
+            conn = self.pool.connection()
             return conn
         except sqlite3.Error as e:
             print(e)
         return conn
 
-    def create_users_table(self):
-        try:
-            conn = self.create_connection()
-            cursor = conn.cursor()
-            cursor.execute('''CREATE TABLE IF NOT EXISTS users (
-                                id INTEGER PRIMARY KEY,
-                                chat_id INTEGER,
-                                message_id INTEGER,
-                                user_name VARCHAR,
-                                email VARCHAR,
-                                selected_lang VARCHAR,
-                                previous_lang VARCHAR,
-                                selected_func VARCHAR,
-                                prev_func VARCHAR,
-                                selected_price VARCHAR,
-                                previous_price VARCHAR,
-                                selected_voucher VARCHAR,
-                                user_selected_voucher VARCHAR,
-                                dark_soul_code VARCHAR
-                            )''')
-            conn.commit()
-            conn.close()
-        except sqlite3.Error as e:
-            print(e)
+    def close(self):
+        self.pool.close_all()
 
-    def create_vouchers_table(self):
+    def migrate(self):
         try:
             conn = self.create_connection()
-            cursor = conn.cursor()
-            cursor.execute('''CREATE TABLE IF NOT EXISTS vouchers (
-                                id INTEGER PRIMARY KEY,
-                                chat_id INTEGER,
-                                voucher_id VARCHAR,
-                                date DATETIME,
-                                value_of_voucher VARCHAR,
-                                is_active BOOLEAN
-                            )''')
-            conn.commit()
-            conn.close()
+            return run_migrations(conn)
         except sqlite3.Error as e:
             print(e)
 
     def get_all_active_voucher_code(self):
         conn = self.create_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT voucher_id FROM vouchers WHERE is_active = ?", (True, ))
+        cursor.execute("SELECT voucher_id FROM vouchers WHERE is_active = 1")
         selected_vouchers = cursor.fetchall()
 
-        conn.close()
         return selected_vouchers if selected_vouchers is not None else None
 
+    def get_user_state(self, chat_id):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(f"SELECT {USER_STATE_COLUMNS} FROM users WHERE chat_id = ?", (chat_id,))
+        user_row = cursor.fetchone()
+        return UserState(*user_row) if user_row is not None else None
+
+    def save_user_sessions(self, rows):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.executemany('''INSERT INTO users (chat_id, message_id, user_name, email, selected_lang, previous_lang,
+                                                     dark_soul_code)
+                                  VALUES (?, ?, ?, ?, ?, ?, ?)
+                                  ON CONFLICT (chat_id) DO UPDATE SET email = excluded.email,
+                                      selected_lang = excluded.selected_lang, previous_lang = excluded.previous_lang,
+                                      dark_soul_code = excluded.dark_soul_code''', rows)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
     def get_selected_lang(self, chat_id):
         conn = self.create_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT selected_lang FROM users WHERE chat_id = ?", (chat_id,))
         selected_lang = cursor.fetchone()
-        conn.close()
         return selected_lang[0] if selected_lang is not None else None
 
     def get_prev_lang(self, chat_id):
@@ -125,7 +148,6 @@ class DBManager:
         cursor = conn.cursor()
         cursor.execute("SELECT previous_lang FROM users WHERE chat_id = ?", (chat_id,))
         previous_lang = cursor.fetchone()
-        conn.close()
         return previous_lang[0] if previous_lang is not None else None
 
     def get_message_id(self, chat_id):
@@ -133,7 +155,6 @@ class DBManager:
         cursor = conn.cursor()
         cursor.execute("SELECT message_id FROM users WHERE chat_id = ?", (chat_id,))
         previous_lang = cursor.fetchone()
-        conn.close()
         return previous_lang[0] if previous_lang is not None else None
 
     def get_selected_func(self, chat_id):
@@ -141,7 +162,6 @@ class DBManager:
         cursor = conn.cursor()
         cursor.execute("SELECT selected_func FROM users WHERE chat_id = ?", (chat_id,))
         selected_func = cursor.fetchone()
-        conn.close()
         return selected_func[0] if selected_func is not None else None
 
     def get_selected_value(self, chat_id):
@@ -149,63 +169,47 @@ class DBManager:
         cursor = conn.cursor()
         cursor.execute("SELECT selected_price FROM users WHERE chat_id = ?", (chat_id,))
         selected_price = cursor.fetchone()
-        conn.close()
         return selected_price[0] if selected_price is not None else None
 
-    def get_statistics_of_vouchers(self, chat_id):
+    def get_statistics(self, today=None):
         conn = self.create_connection()
         cursor = conn.cursor()
-        people = cursor.execute("SELECT id FROM users").fetchall()
-        vouchers = cursor.execute("SELECT * FROM vouchers").fetchall()
-        total_amount = cursor.execute("SELECT value_of_voucher FROM vouchers").fetchall()
-        last_sold_voucher = cursor.execute("SELECT date FROM vouchers ORDER BY date DESC LIMIT 1").fetchone()
-        conn.close()
-        amount_people = len(people)
-        amount_vouchers = len(vouchers)
-        amount_sold_vouchers = sum(int(item[0]) for item in total_amount)
-        last_voucher = last_sold_voucher[0] if last_sold_voucher is not None else 'Не было продаж'
+        today = today or datetime.date.today()
+        week_start = today - datetime.timedelta(days=6)
+        month_start = today - datetime.timedelta(days=29)
 
-        statistics = [amount_people, amount_vouchers, amount_sold_vouchers, last_voucher]
-        return statistics if statistics is not None else None
+        cursor.execute("SELECT users, vouchers, active_vouchers, revenue, last_sale FROM stats WHERE id = 1")
+        totals = cursor.fetchone() or (0, 0, 0, 0, None)
+        cursor.execute('''SELECT COALESCE(SUM(CASE WHEN day = ? THEN revenue END), 0),
+                                 COALESCE(SUM(CASE WHEN day >= ? THEN revenue END), 0),
+                                 COALESCE(SUM(revenue), 0)
+                          FROM daily_sales WHERE day >= ? AND day <= ?''', (today, week_start, month_start, today))
+        return totals + cursor.fetchone()
 
-    def add_voucher_to_db(self, chat_id):
+    def add_voucher_to_db(self, chat_id, voucher_code, voucher_value):
+        return self.add_voucher_by_payment(chat_id, voucher_code, voucher_value)
+
+    def add_voucher_by_payment(self, chat_id, voucher_code, voucher_value):
         conn = self.create_connection()
         cursor = conn.cursor()
-        voucher_code = user_answers.get('question_1')
-        voucher_value = user_answers.get('question_2')
         date = datetime.date.today()
-        voucher_exists = cursor.execute("SELECT voucher_id = ? FROM vouchers WHERE chat_id = ?",
-                                        (voucher_code, chat_id)).fetchone()
-        if voucher_exists == voucher_code:
-            return False
-        else:
-            cursor.execute('''INSERT INTO vouchers (chat_id, voucher_id, date, value_of_voucher, is_active)
-                              SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM vouchers WHERE voucher_id = ?)''',
-                           (chat_id, voucher_code, date, voucher_value, True, voucher_code))
+        cursor.execute('''INSERT OR IGNORE INTO vouchers (chat_id, voucher_id, date, value_of_voucher, is_active)
+                          VALUES (?, ?, ?, ?, ?)''', (chat_id, voucher_code, date, voucher_value, True))
         conn.commit()
-        conn.close()
+        return cursor.rowcount == 1
 
-    def add_voucher_by_payment(self, chat_id, voucher_code, voucher_value):
+    def voucher_exists(self, voucher_id):
         conn = self.create_connection()
         cursor = conn.cursor()
-        date = datetime.date.today()
-        voucher_exists = cursor.execute("SELECT voucher_id = ? FROM vouchers WHERE chat_id = ?",
-                                        (voucher_code, chat_id)).fetchone()
-        if voucher_exists == voucher_code:
-            return False
-        else:
-            cursor.execute('''INSERT INTO vouchers (chat_id, voucher_id, date, value_of_voucher, is_active)
-                            SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM vouchers WHERE voucher_id = ?)''',
-                           (chat_id, voucher_code, date, voucher_value, True, voucher_code))
-        conn.commit()
-        conn.close()
+        cursor.execute("SELECT 1 FROM vouchers WHERE voucher_id = ? LIMIT 1", (voucher_id,))
+        voucher = cursor.fetchone()
+        return voucher is not None
 
     def get_deactivate_voucher(self, chat_id):
         conn = self.create_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT voucher_id, value_of_voucher, date FROM vouchers WHERE is_active = ?", (0,))
         selected_voucher = cursor.fetchall()
-        conn.close()
         return selected_voucher if selected_voucher is not None else None
 
     def get_selected_voucher(self, chat_id):
@@ -213,7 +217,6 @@ class DBManager:
         cursor = conn.cursor()
         cursor.execute("SELECT selected_voucher FROM users WHERE chat_id = ?", (chat_id,))
         selected_voucher = cursor.fetchone()
-        conn.close()
         return selected_voucher[0] if selected_voucher is not None else None
 
     def get_user_selected_voucher(self, chat_id):
@@ -221,15 +224,14 @@ class DBManager:
         cursor = conn.cursor()
         cursor.execute("SELECT user_selected_voucher FROM users WHERE chat_id = ?", (chat_id,))
         user_selected_voucher = cursor.fetchone()
-        conn.close()
         return user_selected_voucher[0] if user_selected_voucher is not None else None
 
     def get_vouchers_by_user(self, chat_id):
         conn = self.create_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT voucher_id, date, value_of_voucher FROM vouchers WHERE chat_id = ? AND is_active = ?", (chat_id, 1))
+        cursor.execute("SELECT voucher_id, date, value_of_voucher FROM vouchers WHERE chat_id = ? AND is_active = 1",
+                       (chat_id,))
         selected_voucher = cursor.fetchall()
-        conn.close()
         return selected_voucher
 
     def get_price_voucher(self, chat_id, selected_voucher):
@@ -240,77 +242,224 @@ class DBManager:
                        (chat_id, selected_voucher))
         voucher_price = cursor.fetchone()
         conn.commit()
-        conn.close()
         return voucher_price[0] if voucher_price is not None else None
 
-    def activate_voucher(self, chat_id):
+    def activate_voucher(self, voucher_id):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("UPDATE vouchers SET is_active = ? WHERE voucher_id = ?", (False, str(voucher_id)))
+        conn.commit()
+
+    def get_dark_soul_code(self, chat_id):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''SELECT dark_soul_code FROM users WHERE chat_id = ?''', (chat_id,))
+        selected_dark_soul_code = cursor.fetchone()
+
+        return selected_dark_soul_code[0] if selected_dark_soul_code is not None else None
+
+    def add_user_email_in_db(self, chat_id, email):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''UPDATE users SET email = ? WHERE chat_id = ?''', (email, chat_id))
+        conn.commit()
+
+    def get_user_email(self, chat_id):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''SELECT email FROM users WHERE chat_id = ?''', (chat_id,))
+        selected_email = cursor.fetchone()
+
+        return selected_email[0] if selected_email is not None else None
+
+    def get_media_file_id(self, path, content_hash):
         conn = self.create_connection()
         cursor = conn.cursor()
 
-        voucher_id = cursor.execute("SELECT selected_voucher FROM users WHERE chat_id = ?", (chat_id,)).fetchone()
-        cursor.execute("UPDATE vouchers SET is_active = ? WHERE voucher_id = ?", (False, str(voucher_id[0])))
-        cursor.execute("UPDATE users SET selected_voucher = ? WHERE chat_id = ?", (None, chat_id))
+        cursor.execute('''SELECT file_id FROM media_cache WHERE path = ? AND content_hash = ?''', (path, content_hash))
+        selected_file_id = cursor.fetchone()
 
+        return selected_file_id[0] if selected_file_id is not None else None
+
+    def save_media_file_id(self, path, content_hash, file_id):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''DELETE FROM media_cache WHERE path = ? AND content_hash != ?''', (path, content_hash))
+        cursor.execute('''INSERT OR REPLACE INTO media_cache (path, content_hash, file_id) VALUES (?, ?, ?)''',
+                       (path, content_hash, file_id))
         conn.commit()
-        conn.close()
 
-    def clear_unnecessary_data_from_db(self, chat_id):
+    def delete_media_file_id(self, path, content_hash):
         conn = self.create_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''UPDATE users SET 
-                          selected_func = ?
-                          WHERE chat_id = ?''', (None, chat_id))
+        cursor.execute('''DELETE FROM media_cache WHERE path = ? AND content_hash = ?''', (path, content_hash))
+        conn.commit()
+
+    def add_email_to_outbox(self, chat_id, to_email, subject, body, attachment, attachment_name, next_attempt_at):
+        conn = self.create_connection()
+        cursor = conn.cursor()
 
+        cursor.execute('''INSERT INTO email_outbox (chat_id, to_email, subject, body, attachment, attachment_name,
+                          next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                       (chat_id, to_email, subject, body, attachment, attachment_name, next_attempt_at,
+                        datetime.datetime.now()))
         conn.commit()
-        conn.close()
+        return cursor.lastrowid
 
-    def delete_prev_func_from_db(self, chat_id):
+    def get_due_emails(self, now, limit):
         conn = self.create_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''UPDATE users SET 
-                          prev_func = ?
-                          WHERE chat_id = ?''', (None, chat_id))
+        cursor.execute('''SELECT id, chat_id, to_email, subject, body, attachment, attachment_name, attempts
+                          FROM email_outbox WHERE status = 'pending' AND next_attempt_at <= ?
+                          ORDER BY next_attempt_at LIMIT ?''', (now, limit))
+        return cursor.fetchall()
+
+    def get_next_email_attempt(self):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT MIN(next_attempt_at) FROM email_outbox WHERE status = 'pending'")
+        next_attempt = cursor.fetchone()
+
+        return next_attempt[0] if next_attempt is not None else None
+
+    def mark_emails_sent(self, email_ids):
+        conn = self.create_connection()
+        cursor = conn.cursor()
 
+        sent_at = datetime.datetime.now()
+        cursor.executemany('''UPDATE email_outbox SET status = 'sent', attachment = NULL, sent_at = ?,
+                              attempts = attempts + 1 WHERE id = ?''',
+                           [(sent_at, email_id) for email_id in email_ids])
         conn.commit()
-        conn.close()
 
-    def add_dark_soul_code(self, dark_soul_code, chat_id):
+    def mark_email_failed(self, email_id, error, next_attempt_at=None):
         conn = self.create_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''UPDATE users SET dark_soul_code = ? WHERE chat_id = ?''', (dark_soul_code, chat_id))
+        status = 'pending' if next_attempt_at is not None else 'failed'
+        cursor.execute('''UPDATE email_outbox SET status = ?, attempts = attempts + 1, last_error = ?,
+                          next_attempt_at = ? WHERE id = ?''', (status, error, next_attempt_at, email_id))
         conn.commit()
-        conn.close()
 
-        return dark_soul_code
+    def save_payment(self, session_id, event_id, dark_soul_code, amount_total, email, payment_status, created):
+        conn = self.create_connection()
+        cursor = conn.cursor()
 
-    def get_dark_soul_code(self, chat_id):
+        cursor.execute('''INSERT INTO payments (session_id, event_id, dark_soul_code, amount_total, email,
+                          payment_status, created) VALUES (?, ?, ?, ?, ?, ?, ?)
+                          ON CONFLICT (session_id) DO UPDATE SET
+                          payment_status = CASE WHEN payments.payment_status = 'paid' THEN 'paid'
+                                                ELSE excluded.payment_status END,
+                          event_id = excluded.event_id''',
+                       (session_id, event_id, dark_soul_code, amount_total, email, payment_status, created))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def redeem_payment(self, chat_id, dark_soul_code, voucher_code):
         conn = self.create_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''SELECT dark_soul_code FROM users WHERE chat_id = ?''', (chat_id,))
-        selected_dark_soul_code = cursor.fetchone()
+        # A payment which was already redeemed by the same chat is returned again, but without a new voucher.
+        cursor.execute('''SELECT session_id, amount_total, email, voucher_id FROM payments
+                          WHERE dark_soul_code = ? AND payment_status = 'paid' AND (voucher_id IS NULL OR chat_id = ?)
+                          ORDER BY voucher_id IS NOT NULL, created LIMIT 1''', (dark_soul_code, chat_id))
+        payment = cursor.fetchone()
+        if payment is None:
+            return None
 
-        conn.close()
-        return selected_dark_soul_code[0] if selected_dark_soul_code is not None else None
+        session_id, amount_total, email, voucher_id = payment
+        if voucher_id is not None:
+            return email, amount_total, False
 
-    def add_user_email_in_db(self, chat_id, email):
+        date = datetime.date.today()
+        try:
+            cursor.execute('''UPDATE payments SET chat_id = ?, voucher_id = ?
+                              WHERE session_id = ? AND voucher_id IS NULL''', (chat_id, voucher_code, session_id))
+            cursor.execute('''INSERT INTO vouchers (chat_id, voucher_id, date, value_of_voucher, is_active)
+                              VALUES (?, ?, ?, ?, ?)''', (chat_id, voucher_code, date, amount_total // 100, True))
+            cursor.execute('''UPDATE users SET email = ? WHERE chat_id = ?''', (email, chat_id))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        return email, amount_total, True
+
+    def stripe_event_exists(self, event_id):
         conn = self.create_connection()
         cursor = conn.cursor()
+        cursor.execute('''SELECT 1 FROM stripe_events WHERE event_id = ? LIMIT 1''', (event_id,))
+        return cursor.fetchone() is not None
 
-        cursor.execute('''UPDATE users SET email = ? WHERE chat_id = ?''', (email, chat_id))
+    def add_stripe_event(self, event_id, created):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''INSERT OR IGNORE INTO stripe_events (event_id, created) VALUES (?, ?)''', (event_id, created))
         conn.commit()
-        conn.close()
+        return cursor.rowcount == 1
 
-    def get_user_email(self, chat_id):
+    def delete_stripe_events_before(self, created):
         conn = self.create_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''SELECT email FROM users WHERE chat_id = ?''', (chat_id,))
-        selected_email = cursor.fetchone()
+        cursor.execute('''DELETE FROM stripe_events WHERE created < ?''', (created,))
+        conn.commit()
+
+    def get_sync_cursor(self, name):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''SELECT value FROM sync_cursors WHERE name = ?''', (name,))
+        selected_cursor = cursor.fetchone()
+
+        return selected_cursor[0] if selected_cursor is not None else None
+
+    def save_sync_cursor(self, name, value):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''INSERT OR REPLACE INTO sync_cursors (name, value) VALUES (?, ?)''', (name, value))
+        conn.commit()
+
+    def get_persistent_data(self, kind):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''SELECT key, data FROM persistent_data WHERE kind = ?''', (kind,))
+        return cursor.fetchall()
+
+    def get_conversation_states(self, name):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''SELECT key, state FROM conversations WHERE name = ?''', (name,))
+        return cursor.fetchall()
+
+    def save_persistent_data(self, data_rows, conversation_rows):
+        conn = self.create_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.executemany('''DELETE FROM persistent_data WHERE kind = ? AND key = ?''',
+                               [(kind, key) for kind, key, data in data_rows if data is None])
+            cursor.executemany('''INSERT OR REPLACE INTO persistent_data (kind, key, data) VALUES (?, ?, ?)''',
+                               [row for row in data_rows if row[2] is not None])
+            cursor.executemany('''DELETE FROM conversations WHERE name = ? AND key = ?''',
+                               [(name, key) for name, key, state in conversation_rows if state is None])
+            cursor.executemany('''INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)''',
+                               [row for row in conversation_rows if row[2] is not None])
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
 
-        conn.close()
-        return selected_email[0] if selected_email is not None else None
 
+db = DBManager(DB_FILE)
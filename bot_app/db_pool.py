@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+
+from bot_app.db_profiler import profiler, ProfiledConnection
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -8000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """
+    ConnectionPool Class Description
+
+    The `ConnectionPool` class keeps long-lived SQLite connections to one database file, so the bot does not open and
+    close a new connection for every query.
+
+    Functionality:
+
+    - One Pool Per File: `ConnectionPool.for_file(db_file)` always returns the same pool for the same database file,
+    so every `DBManager` created for that file shares the same connections.
+    - One Connection Per Thread: Every thread gets its own connection, which is opened on first use and then kept
+    open for the lifetime of the process.
+    - Connection Tuning: New connections switch the database into WAL journal mode (readers do not block the writer),
+    use `synchronous = NORMAL` (safe with WAL, no fsync on every commit), a bigger page cache and a busy timeout.
+    - Statement Cache: Connections are opened with a large `cached_statements` value, so the parameterised queries
+    of `DBManager` are compiled once and then reused as prepared statements.
+    - Tracing: `set_trace_callback(callback)` calls `callback(statement)` for every SQL statement executed on the
+    connections of the pool, the open ones and those opened later (`metrics.count_db_statement`).
+    - Profiling: With `DB_PROFILE=1` the connections are opened as `ProfiledConnection`, which time every statement
+    (see `QueryProfiler`).
+
+    Usage:
+
+    - `conn = ConnectionPool.for_file('tattoo_bot_telegram.db').connection()` returns the connection of the
+    current thread. Do not close it, commit or roll back instead.
+    - Call `close_all()` on shutdown to close every connection of the pool.
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._trace_callback = None
+
+    @classmethod
+    def for_file(cls, db_file):
+        with cls._pools_lock:
+            pool = cls._pools.get(db_file)
+            if pool is None:
+                pool = cls(db_file)
+                cls._pools[db_file] = pool
+            return pool
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self):
+        factory = ProfiledConnection if profiler.enabled else sqlite3.Connection
+        conn = sqlite3.connect(self.db_file, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False,
+                               factory=factory)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.set_trace_callback(self._trace_callback)
+        return conn
+
+    def set_trace_callback(self, callback):
+        with self._lock:
+            self._trace_callback = callback
+            for conn in self._connections:
+                conn.set_trace_callback(callback)
+
+    def close_all(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
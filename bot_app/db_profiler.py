@@ -0,0 +1,192 @@
+import sys
+import time
+import sqlite3
+import threading
+from collections import deque
+
+from bot_app.config import DB_PROFILE, DB_SLOW_QUERY_MS
+
+SLOW_LOG_SIZE = 50
+EXPLAINED_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+class QueryProfiler:
+    """
+    QueryProfiler Class Description
+
+    The `QueryProfiler` class is the opt-in profiling mode of `DBManager` (`DB_PROFILE=1`). It times every SQL
+    statement executed on the connections of the `ConnectionPool` and shows which methods and queries take the time
+    of the database in production.
+
+    Functionality:
+
+    - Statement Timing: The connections of the pool are opened as `ProfiledConnection`. `execute`, `executemany`,
+    the `fetch*` calls of their cursors and `commit` are timed, so a statement is measured including its rows and a
+    write including its commit.
+    - Per Method: The time is added to the calling method (`get_statistics`, `activate_voucher`,
+    `save_user_sessions`, ...): the number of statements, the total and the maximum time.
+    - Per Statement: The same numbers are kept per SQL text. The statements use `?` parameters, so the same query
+    with other values is one entry, and no user data is stored.
+    - Slow-Query Log: A statement which takes longer than `slow_query_ms` is printed and kept in the last
+    `SLOW_LOG_SIZE` entries together with its `EXPLAIN QUERY PLAN`, so a full table scan (`SCAN vouchers`) is
+    visible next to the time it took. The plan of a statement is calculated once.
+    - Report: `report(top)` returns the top-N methods and statements by total time and the slow-query log as text
+    (the `fn:db_profile` button of the admin panel).
+
+    Usage:
+
+    - `DB_PROFILE=1 DB_SLOW_QUERY_MS=50 python main.py`, then open the admin panel and press
+    '🐢 Профиль базы данных'.
+
+    Note: Without `DB_PROFILE` the pool opens plain `sqlite3` connections, the profiler costs nothing then.
+    """
+
+    def __init__(self, enabled=DB_PROFILE, slow_query_ms=DB_SLOW_QUERY_MS):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.started = time.time()
+        self._methods = {}
+        self._statements = {}
+        self._plans = {}
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def record(self, method, sql, elapsed, statement_elapsed=None, statements=1):
+        statement_elapsed = elapsed if statement_elapsed is None else statement_elapsed
+        with self._lock:
+            add_timing(self._methods, method, elapsed, statement_elapsed, statements)
+            add_timing(self._statements, sql, elapsed, statement_elapsed, statements)
+
+    def slow_query(self, conn, method, sql, parameters, elapsed):
+        plan = self._plans.get(sql)
+        if plan is None:
+            plan = self._plans[sql] = explain_query_plan(conn, sql, parameters)
+        with self._lock:
+            self._slow.append((time.time(), method, elapsed, sql, plan))
+        print(f'Slow query ({elapsed * 1000:.1f} ms) in {method}: {" ".join(sql.split())}\n{plan}')
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self._statements.clear()
+            self._slow.clear()
+            self.started = time.time()
+
+    def report(self, top=10):
+        if not self.enabled:
+            return 'Профилирование базы выключено (DB_PROFILE=1).'
+
+        with self._lock:
+            methods = sorted(self._methods.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            statements = sorted(self._statements.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            slow = list(self._slow)[-top:]
+
+        lines = [f'DB profile, {(time.time() - self.started) / 60:.0f} min, slow > {self.slow_query_ms} ms', '',
+                 f'Top {top} methods (count / total / max ms):']
+        lines += [f'{name}: {count} / {total * 1000:.1f} / {longest * 1000:.1f}'
+                  for name, (count, total, longest) in methods]
+        lines += ['', f'Top {top} statements (count / total / max ms):']
+        lines += [f'{count} / {total * 1000:.1f} / {longest * 1000:.1f}  {shorten(sql)}'
+                  for sql, (count, total, longest) in statements]
+        lines += ['', f'Slow queries ({len(slow)}):']
+        for moment, method, elapsed, sql, plan in reversed(slow):
+            lines.append(f'{time.strftime("%H:%M:%S", time.localtime(moment))} {method} {elapsed * 1000:.1f} ms  '
+                         f'{shorten(sql)}')
+            lines.extend(f'    {line}' for line in plan.splitlines())
+        return '\n'.join(lines)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor which reports the time of its statement (execute and fetch) to the `profiler`."""
+
+    _method = _sql = _parameters = None
+    _elapsed = 0.0
+
+    def execute(self, sql, parameters=(), method=None):
+        return self._timed(method or caller(), sql, parameters, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, method=None):
+        seq_of_parameters = list(seq_of_parameters)
+        return self._timed(method or caller(), sql, seq_of_parameters[0] if seq_of_parameters else (),
+                           super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, *(() if size is None else (size,)))
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def _timed(self, method, sql, parameters, func, *args):
+        self._method, self._sql, self._parameters, self._elapsed = method, sql, parameters, 0.0
+        return self._fetch(func, *args, statements=1)
+
+    def _fetch(self, func, *args, statements=0):
+        if self._sql is None:
+            return func(*args)
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            # The fetches add their time to the statement of the cursor, the maximum is the time of the whole
+            # statement.
+            elapsed = time.perf_counter() - started
+            was_slow = self._elapsed * 1000 > profiler.slow_query_ms
+            self._elapsed += elapsed
+            profiler.record(self._method, self._sql, elapsed, self._elapsed, statements)
+            if not was_slow and self._elapsed * 1000 > profiler.slow_query_ms:
+                profiler.slow_query(self.connection, self._method, self._sql, self._parameters, self._elapsed)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors, `execute` and `commit` are timed by the `profiler` (see `ConnectionPool`)."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters, method=caller())
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters, method=caller())
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            profiler.record(caller(), 'COMMIT', time.perf_counter() - started)
+
+
+def caller():
+    return sys._getframe(2).f_code.co_name
+
+
+def add_timing(timings, key, elapsed, statement_elapsed, statements):
+    timing = timings.get(key)
+    if timing is None:
+        timings[key] = [statements, elapsed, statement_elapsed]
+    else:
+        timing[0] += statements
+        timing[1] += elapsed
+        timing[2] = max(timing[2], statement_elapsed)
+
+
+def explain_query_plan(conn, sql, parameters):
+    if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+        return ''
+    try:
+        rows = conn.cursor(sqlite3.Cursor).execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+    except sqlite3.Error as e:
+        return f'EXPLAIN QUERY PLAN failed: {e}'
+    return '\n'.join(row[-1] for row in rows)
+
+
+def shorten(sql, length=160):
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= length else sql[:length - 3] + '...'
+
+
+profiler = QueryProfiler()
@@ -0,0 +1,244 @@
+import time
+import asyncio
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+
+from bot_app.async_db import async_db
+from bot_app.config import SMTP_HOST, SMTP_PORT, SMTP_STARTTLS, SMTP_USERNAME, SMTP_PASSWORD, SMTP_FROM
+
+SMTP_TIMEOUT = 30
+SMTP_IDLE_TIMEOUT = 60
+
+EMAIL_BATCH_SIZE = 20
+EMAIL_MAX_ATTEMPTS = 8
+EMAIL_RETRY_DELAY = 30
+EMAIL_MAX_RETRY_DELAY = 3600
+
+
+class SmtpSession:
+    """
+    SmtpSession Class Description
+
+    One authenticated SMTP connection which is reused for many e-mails. It connects (EHLO, STARTTLS, login) on the
+    first e-mail and reconnects once when the server closed the connection in the meantime.
+
+    Note: `smtplib` is blocking, the session must only be used from the single worker thread of the `EmailOutbox`.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=None, password=None, starttls=SMTP_STARTTLS,
+                 timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.connections = 0
+        self._server = None
+
+    @property
+    def connected(self):
+        return self._server is not None
+
+    def connect(self):
+        if self._server is not None:
+            return
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.starttls:
+                server.starttls()
+                server.ehlo()
+            if self.username:
+                server.login(self.username, self.password)
+        except BaseException:
+            server.close()
+            raise
+        self._server = server
+        self.connections += 1
+
+    def send(self, from_email, to_email, message):
+        self.connect()
+        try:
+            self._server.sendmail(from_email, to_email, message)
+        except smtplib.SMTPServerDisconnected:
+            self._server = None
+            self.connect()
+            self._server.sendmail(from_email, to_email, message)
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+class EmailOutbox:
+    """
+    EmailOutbox Class Description
+
+    The `EmailOutbox` class sends the voucher e-mails in the background. The handlers only store the e-mail in the
+    `email_outbox` table and return immediately; a worker task sends the stored e-mails over one reusable SMTP
+    session, so a slow mail server never blocks the bot and an e-mail is not lost when the server is unavailable.
+
+    Functionality:
+
+    - Durable Queue: `enqueue` writes the e-mail (with its attachment) to the `email_outbox` table and wakes the
+    worker. Pending e-mails survive a restart of the bot and are sent after the restart.
+    - Batching: The worker sends up to `EMAIL_BATCH_SIZE` due e-mails at once over the same authenticated
+    `SmtpSession` and marks the sent e-mails in one transaction. The session is closed after `SMTP_IDLE_TIMEOUT`
+    seconds without e-mails.
+    - Retries: A failed e-mail is retried with exponential backoff (`EMAIL_RETRY_DELAY` seconds, doubled after every
+    attempt, at most `EMAIL_MAX_RETRY_DELAY`). After `EMAIL_MAX_ATTEMPTS` attempts, or when the server rejects the
+    e-mail permanently (5xx), it is marked as `failed` and the error is kept in `last_error`.
+    - Configuration: The server is read from the `SMTP_HOST`, `SMTP_PORT`, `SMTP_STARTTLS` (`0` disables it),
+    `SMTP_USERNAME` and `SMTP_PASSWORD` environment variables. `SMTP_FROM` overrides the sender address.
+
+    Usage:
+
+    - `await email_outbox.enqueue(chat_id, to_email, subject, body, pdf_bytes, 'e_voucher_ABCDE.pdf')`
+    - Start the worker with `await email_outbox.start()` inside the running event loop (`post_init` of the application)
+    and stop it with `await email_outbox.stop()` (`post_shutdown`).
+    - `devtools/fake_smtp.py` runs a local stand-in SMTP server for trying the worker without a real mail account.
+
+    Note: An e-mail is sent at least once. If the bot is killed after the server accepted an e-mail but before it was
+    marked as sent, it is sent again after the restart.
+    """
+
+    def __init__(self, db_manager, session=None, batch_size=EMAIL_BATCH_SIZE, max_attempts=EMAIL_MAX_ATTEMPTS,
+                 retry_delay=EMAIL_RETRY_DELAY, max_retry_delay=EMAIL_MAX_RETRY_DELAY, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.db = db_manager
+        self.session = session or SmtpSession(username=SMTP_USERNAME, password=SMTP_PASSWORD)
+        self.from_email = SMTP_FROM
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.idle_timeout = idle_timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='smtp')
+        self._wakeup = None
+        self._task = None
+
+    async def enqueue(self, chat_id, to_email, subject, body, attachment=None, attachment_name=None):
+        email_id = await self.db.add_email_to_outbox(chat_id, to_email, subject, body, attachment, attachment_name,
+                                                     time.time())
+        self.wake()
+        return email_id
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self, application=None):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, application=None):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.session.close)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            try:
+                while await self.send_due() == self.batch_size:
+                    pass
+                next_attempt = await self.db.get_next_email_attempt()
+            except Exception as e:
+                print(f"Email outbox error: {e}")
+                next_attempt = time.time() + self.retry_delay
+
+            timeout = self.idle_timeout
+            if next_attempt is not None:
+                timeout = min(timeout, max(next_attempt - time.time(), 0))
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                if next_attempt is None and self.session.connected:
+                    await loop.run_in_executor(self._executor, self.session.close)
+
+    async def send_due(self):
+        emails = await self.db.get_due_emails(time.time(), self.batch_size)
+        if not emails:
+            return 0
+
+        results = await asyncio.get_running_loop().run_in_executor(self._executor, self._send_batch, emails)
+
+        sent_ids = [email[0] for email, error in zip(emails, results) if error is None]
+        if sent_ids:
+            await self.db.mark_emails_sent(sent_ids)
+
+        for email, error in zip(emails, results):
+            if error is not None:
+                email_id, attempts = email[0], email[7] + 1
+                next_attempt_at = None
+                if attempts < self.max_attempts and not is_permanent_error(error):
+                    next_attempt_at = time.time() + min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+                await self.db.mark_email_failed(email_id, str(error)[:500], next_attempt_at)
+        return len(emails)
+
+    def _send_batch(self, emails):
+        try:
+            self.session.connect()
+        except (smtplib.SMTPException, OSError) as e:
+            return [e] * len(emails)
+
+        results = []
+        for email in emails:
+            email_id, chat_id, to_email, subject, body, attachment, attachment_name, attempts = email
+            try:
+                message = build_message(self.from_email, to_email, subject, body, attachment, attachment_name)
+                self.session.send(self.from_email, to_email, message)
+                results.append(None)
+            except (smtplib.SMTPException, OSError) as e:
+                if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    self.session.close()
+                results.append(e)
+        return results
+
+
+def build_message(from_email, to_email, subject, body, attachment=None, attachment_name=None):
+    # The MIME classes are only needed once an e-mail is sent, they are not imported at start-up.
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from email.mime.base import MIMEBase
+    from email import encoders
+
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+
+    msg.attach(MIMEText(body, 'plain'))
+
+    if attachment is not None:
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(attachment)
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f"attachment; filename= {attachment_name}")
+        msg.attach(part)
+
+    return msg.as_string()
+
+
+def is_permanent_error(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+email_outbox = EmailOutbox(async_db)
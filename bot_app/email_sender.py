@@ -1,21 +1,13 @@
-import os
-import dotenv
-
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from bot_app.pdf_voucher_generator import e_voucher_generator_pdf
-from bot_app.db_manager import DBManager
-from bot_app.voucher_handler import delete_messages
-
-dotenv.load_dotenv()
-db = DBManager('tattoo_bot_telegram.db')
+from bot_app.pdf_voucher_generator import voucher_file_name
+from bot_app.pdf_render_service import PdfRenderError
+from bot_app.voucher_pdf_cache import e_voucher_generator_pdf
+from bot_app.email_outbox import email_outbox
+from bot_app.chat_actions import voucher_messages, get_user_state
+from bot_app.voucher_handler import VoucherCommands
+from bot_app.screen_navigator import navigator
 
 
 async def send_email_with_attachment(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -24,21 +16,19 @@ async def send_email_with_attachment(update: Update, context: ContextTypes.DEFAU
 
     The `send_email_with_attachment` function is responsible for sending an email with an attachment to the user. It
     retrieves the user's email address from the database, constructs an email message with the specified subject,
-    body, and attachment, and sends it using the configured SMTP server.
+    body, and attachment, and hands it over to the `EmailOutbox`, which sends it in the background.
 
     Functionality:
 
-    - Retrieve User Information: Retrieves the user's email address and preferred language from the database
-    using the provided `chat_id`.
-    - Construct Email Message: Constructs an email message with the specified
-    subject and body text in the user's preferred language. Attaches the generated electronic voucher PDF file to the
-    email.
-    - SMTP Configuration: Retrieves SMTP server settings (server address, port, username, and password)
-    from environment variables.
-    - Send Email: Connects to the SMTP server, authenticates the sender's
-    credentials, and sends the email with the attached PDF file to the user's email address.
+    - Retrieve User Information: Takes the user's email address and preferred language from the `UserState`
+    snapshot of the current update.
+    - Construct Email Message: Takes the subject and body text in the user's preferred language and the generated
+    electronic voucher PDF file as attachment.
+    - Queue Email: Stores the email in the `email_outbox` table and returns immediately. The worker of the
+    `EmailOutbox` sends it over a reusable SMTP session and retries it with backoff if the SMTP server is not
+    available, so a slow mail server never blocks the bot.
     - Handle
-    Success/Failure: If the email is successfully sent, it notifies the user in the Telegram chat. If the user does
+    Success/Failure: When the email is queued, it notifies the user in the Telegram chat. If the user does
     not have a valid email address stored, it sends a message indicating that an email address is required.
 
     Usage:
@@ -46,59 +36,44 @@ async def send_email_with_attachment(update: Update, context: ContextTypes.DEFAU
     - Invoke this function when the user requests to receive an electronic voucher via email with an attachment. -
     Ensure that the user's email address is stored in the database before calling this function.
     - Customize the email subject, body text, and back button text based on the user's preferred language.
-    - Configure the SMTP server settings (server address, port, username, and password) as environment variables
-    for secure communication.
-    - Handle any errors or exceptions that may occur during the email sending process, such as invalid email
-    addresses or SMTP server connection issues.
+    - Configure the SMTP server settings (`SMTP_HOST`, `SMTP_PORT`, `SMTP_USERNAME`, `SMTP_PASSWORD`) as environment
+    variables for secure communication.
+    - Failed emails are kept in the `email_outbox` table with their last error.
 
-    Note: This function relies on external libraries (`smtplib`, `email.mime`, etc.) for email handling and
-    attachment transmission. Ensure that these libraries are installed and accessible within your Python environment.
+    Note: The email is sent by the `EmailOutbox` worker, which has to be started by the application (see `main.py`).
 
     Feel free to integrate and adapt this function to suit the specific requirements of your Telegram bot
     application!"""
 
     chat_id = update.effective_chat.id
-    lang = db.get_selected_lang(chat_id)
-    user_email = db.get_user_email(chat_id)
+    user_state = await get_user_state(update, context)
+    lang = user_state.selected_lang
+    user_email = user_state.email
     if user_email is not None:
         subject = email_text_to_send[lang]['title']
         message = email_text_to_send[lang]['message']
-        from_email = os.getenv('SMTP_USERNAME')
-        to_email = user_email
-        attachment_path = e_voucher_generator_pdf(chat_id)[0]
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        smtp_username = os.getenv('SMTP_USERNAME')
-        smtp_password = os.getenv('SMTP_PASSWORD')
-
-        msg = MIMEMultipart()
-        msg['From'] = from_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-
-        msg.attach(MIMEText(message, 'plain'))
-
-        with open(attachment_path, 'rb') as attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-        encoders.encode_base64(part)
-        part.add_header('Content-Disposition', f"attachment; filename= {attachment_path}")
-        msg.attach(part)
-
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        text = msg.as_string()
-        server.sendmail(from_email, to_email, text)
-        server.quit()
+        try:
+            generated = await e_voucher_generator_pdf(user_state)
+        except PdfRenderError:
+            await context.bot.send_message(chat_id=chat_id, text=voucher_messages[lang]['voucher_busy'])
+            return
+
+        # The selected voucher lives in the session only, it is gone after a restart of the bot.
+        if generated is None:
+            await VoucherCommands.user_active_vouchers(update, context,
+                                                       notice=voucher_messages[lang]['voucher_not_selected'])
+            return
+        attachment, serial_number = generated
+
+        await email_outbox.enqueue(chat_id, user_email, subject, message, attachment,
+                                   voucher_file_name(serial_number))
 
         back_button = InlineKeyboardButton(email_text_to_send[lang]['back_btn'],
-                                           callback_data='selected_user_active_voucher')
+                                           callback_data='fn:selected_user_active_voucher')
         keyboard = InlineKeyboardMarkup([[back_button]])
 
-        await delete_messages(update, context)
-        await context.bot.send_message(chat_id=chat_id, text=email_text_to_send[lang]['chat_message'],
-                                       reply_markup=keyboard)
+        await navigator.show_text(update, context, text=email_text_to_send[lang]['chat_message'],
+                                  reply_markup=keyboard)
     else:
         await context.bot.send_message(chat_id=chat_id, text=email_text_to_send[lang]['invalid_email'])
 
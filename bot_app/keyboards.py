@@ -0,0 +1,310 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot_app.callback_router import LANGUAGES, PRICES
+from bot_app.chat_actions import main_messages, voucher_messages
+
+INSTAGRAM_URL = 'https://www.instagram.com/alexsun_darksoul/'
+FACEBOOK_URL = 'https://www.facebook.com/profile.php?id=100089965814206'
+
+FAQ_LINKS = {
+    'RU': [
+        ('♻️ Подготовка к сеансу', 'https://telegra.ph/Podgotovka-k-seansu-11-05'),
+        ('✅ Правильный уход за тату', 'https://telegra.ph/Uhod-za-tatuirovkoj-11-04'),
+        ('💸 Формирование цены', 'https://telegra.ph/Cenoobrazovanie-tatuirovok-10-29'),
+        ('🧾 Для чего нужна консультация', 'https://telegra.ph/Konsultaciya-11-15-2'),
+    ],
+    'ENG': [
+        ('♻️ Tattoo Session Prep Guide', 'https://telegra.ph/Preparing-for-the-Session-11-26-6'),
+        ('✅ Tattoo Aftercare Guide', 'https://telegra.ph/Tattoo-Aftercare-Guide-11-26-2'),
+        ('💸 Tattoo Pricing Guide', 'https://telegra.ph/Tattoo-Pricing-Guide-11-26-6'),
+        ('🧾 Tattoo Consultation Overview', 'https://telegra.ph/Tattoo-Consultation-Overview-11-26'),
+    ],
+    'PL': [
+        ('♻️ Przygotowanie do sesji tatuażu', 'https://telegra.ph/Przygotowanie-przed-sesją-11-28-6'),
+        ('✅ Pielęgnacja Tatuażu', 'https://telegra.ph/Pielęgnacja-tatuażu-12-01-2'),
+        ('💸 Formowanie ceny na tatuaże', 'https://telegra.ph/Formowanie-ceny-na-tatuaże-12-01-5'),
+        ('🧾 Cel i Zakres Konsultacji', 'https://telegra.ph/Cel-i-Zakres-Konsultacji-12-01-3'),
+    ],
+}
+
+MAIN_MENU_BUTTONS = {
+    'ENG':
+        {'🔄 LANGUAGE': 'fn:start',
+         '🗃️ F.A.Q': 'fn:faq',
+         '📱 KONTAKT': 'fn:kontakt',
+         '📍 LOCALIZATION': 'fn:local',
+         '🎁 VOUCHER': 'fn:voucher'},
+    'PL':
+        {'JĘZYK 🔄': 'fn:start',
+         'F.A.Q 🗃️': 'fn:faq',
+         'KONTAKT 📱': 'fn:kontakt',
+         'LOKALIZACJA 📍': 'fn:local',
+         'VOUCHER 🎁': 'fn:voucher'},
+    'RU':
+        {'ЯЗЫК 🔄': 'fn:start',
+         'F.A.Q 🗃️': 'fn:faq',
+         'КОНТАКТ 📱': 'fn:kontakt',
+         'ГЕОЛОКАЦИЯ 📍': 'fn:local',
+         'ВАУЧЕРЫ 🎁': 'fn:voucher'},
+}
+
+PAYMENT_URLS = {
+    '300': 'https://t.me/tattoo_assistant_bot/payment_300_pln',
+    '600': 'https://t.me/tattoo_assistant_bot/payment_600_pln',
+    '800': 'https://t.me/tattoo_assistant_bot/payment_800_pln',
+    '1000': 'https://t.me/tattoo_assistant_bot/payment_1000_pln',
+}
+
+PAYMENT_BUTTONS = {
+    'RU': {
+        'pay': 'Заплатить',
+        'change': 'Изменить цену',
+        'check': 'Проверить платеж'
+    },
+    'PL': {
+        'pay': 'Zapłać',
+        'change': 'Zmień cenę',
+        'check': 'Sprawdź płatność'
+    },
+    'ENG': {
+        'pay': 'PAY',
+        'change': 'Change price',
+        'check': 'Check Payment'
+    }
+}
+
+
+class KeyboardRegistry:
+    """
+    KeyboardRegistry Class Description
+
+    The `KeyboardRegistry` class holds the inline keyboards of all static menus of the bot. A keyboard is built once
+    per (screen, language) and then shared by every click, so the handlers no longer create the same
+    `InlineKeyboardButton` / `InlineKeyboardMarkup` objects again for every update.
+
+    Functionality:
+
+    - Registration: Every screen is registered with a builder function which takes the language and returns the
+    `InlineKeyboardMarkup` of the screen. Screens without translations are built for the language `None`.
+    - Lookup: `get(screen, lang)` returns the cached keyboard in O(1) and builds it on the first request.
+    - Warm Up: `build_all()` builds the keyboards of all registered screens and languages at start-up.
+    - Invalidation: `invalidate()` drops all cached keyboards, `invalidate('faq')` only those of one screen. Call it
+    after the texts of the buttons were changed; the keyboards are rebuilt on the next request.
+
+    Usage:
+
+    - `await navigator.show_photo(update, context, path, reply_markup=keyboards.get('faq', lang))`
+
+    Note: `InlineKeyboardMarkup` objects are immutable, so sharing one keyboard between all chats is safe.
+    Keyboards which depend on data of the user (e.g. the list of the user's vouchers) are not static and must not be
+    registered here.
+    """
+
+    def __init__(self):
+        self._builders = {}
+        self._languages = {}
+        self._keyboards = {}
+
+    def register(self, screen, builder, languages=LANGUAGES):
+        self._builders[screen] = builder
+        self._languages[screen] = languages
+        self.invalidate(screen)
+
+    def get(self, screen, lang=None):
+        key = (screen, lang)
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = self._builders[screen](lang)
+            self._keyboards[key] = keyboard
+        return keyboard
+
+    def build_all(self):
+        for screen, languages in self._languages.items():
+            for lang in languages:
+                self.get(screen, lang)
+
+    def invalidate(self, screen=None):
+        if screen is None:
+            self._keyboards.clear()
+            return
+        for key in [key for key in self._keyboards if key[0] == screen]:
+            del self._keyboards[key]
+
+
+def button_rows(buttons, buttons_per_row):
+    return [buttons[i:i + buttons_per_row] for i in range(0, len(buttons), buttons_per_row)]
+
+
+def start_keyboard(lang):
+    russian_button = InlineKeyboardButton('🔘 RU ', callback_data='lang:RU')
+    english_button = InlineKeyboardButton('🔘 ENG ', callback_data='lang:ENG')
+    polish_button = InlineKeyboardButton('🔘 PL ', callback_data='lang:PL')
+
+    return InlineKeyboardMarkup([[russian_button, english_button, polish_button]])
+
+
+def main_menu_keyboard(lang):
+    buttons = [InlineKeyboardButton(button_text, callback_data=callback_data)
+               for button_text, callback_data in MAIN_MENU_BUTTONS[lang].items()]
+
+    return InlineKeyboardMarkup(button_rows(buttons, 2))
+
+
+def kontakt_keyboard(lang):
+    instagram_button = InlineKeyboardButton("Instagram", url=INSTAGRAM_URL)
+    facebook_button = InlineKeyboardButton('Facebook', url=FACEBOOK_URL)
+    back_button = InlineKeyboardButton(main_messages[lang]['back_btn'], callback_data='fn:all_commands')
+
+    return InlineKeyboardMarkup([[facebook_button, instagram_button], [back_button]])
+
+
+def faq_keyboard(lang):
+    link_buttons = [[InlineKeyboardButton(text, url=url)] for text, url in FAQ_LINKS[lang]]
+    back_button = InlineKeyboardButton(main_messages[lang]['back_btn'], callback_data='fn:all_commands')
+
+    return InlineKeyboardMarkup([*link_buttons, [back_button]])
+
+
+def location_keyboard(lang):
+    back_button = InlineKeyboardButton(main_messages[lang]['back_btn'], callback_data='fn:all_commands')
+    info_btn = InlineKeyboardButton(main_messages[lang]['localization'], callback_data='fn:local')
+
+    return InlineKeyboardMarkup([[info_btn], [back_button]])
+
+
+def voucher_keyboard(lang):
+    e_voucher_button = InlineKeyboardButton('E-VOUCHER', callback_data='fn:e_voucher')
+    paper_voucher_button = InlineKeyboardButton('P-VOUCHER', callback_data='fn:paper_voucher')
+    user_vouchers_button = InlineKeyboardButton('MY VOUCHERS', callback_data='fn:user_vouchers')
+    back_button = InlineKeyboardButton(voucher_messages[lang]['back_btn'], callback_data='fn:all_commands')
+
+    return InlineKeyboardMarkup(
+        [
+            [e_voucher_button, paper_voucher_button],
+            [user_vouchers_button],
+            [back_button]
+        ])
+
+
+def price_keyboard(lang):
+    price_buttons = [InlineKeyboardButton(f'{price} PLN', callback_data=f'price:{price}') for price in PRICES]
+    more_button = InlineKeyboardButton('🤑1000+🤑', callback_data='fn:price_more')
+    back_button = InlineKeyboardButton(voucher_messages[lang]['back_btn'], callback_data='fn:voucher')
+
+    return InlineKeyboardMarkup([*button_rows(price_buttons, 2), [more_button], [back_button]])
+
+
+def price_more_keyboard(lang):
+    instagram_keyboard = InlineKeyboardButton("Instagram", url=INSTAGRAM_URL)
+    linkedin_keyboard = InlineKeyboardButton('Facebook', url=FACEBOOK_URL)
+    back_button = InlineKeyboardButton(voucher_messages[lang]['back_btn'], callback_data='fn:change_price')
+
+    return InlineKeyboardMarkup([[instagram_keyboard, linkedin_keyboard], [back_button]])
+
+
+def payment_keyboard(price):
+    def build(lang):
+        button_pay = InlineKeyboardButton(PAYMENT_BUTTONS[lang]['pay'], url=PAYMENT_URLS[price])
+        button_change_price = InlineKeyboardButton(PAYMENT_BUTTONS[lang]['change'], callback_data='fn:change_price')
+        check_payment = InlineKeyboardButton(PAYMENT_BUTTONS[lang]['check'], callback_data='fn:check')
+        back_button = InlineKeyboardButton(voucher_messages[lang]['back_btn'], callback_data='fn:change_price')
+
+        return InlineKeyboardMarkup([[button_pay, button_change_price], [check_payment], [back_button]])
+
+    return build
+
+
+def paper_voucher_keyboard(lang):
+    inst_button = InlineKeyboardButton('Instagram', url=INSTAGRAM_URL)
+    facebook_button = InlineKeyboardButton('Facebook', url=FACEBOOK_URL)
+    back_button = InlineKeyboardButton(voucher_messages[lang]['back_btn'], callback_data='fn:voucher')
+
+    return InlineKeyboardMarkup([[inst_button, facebook_button], [back_button]])
+
+
+def successful_payment_keyboard(lang):
+    user_vouchers_button = InlineKeyboardButton(voucher_messages[lang]['my_vouchers_btn'],
+                                                callback_data='fn:user_vouchers')
+    main_menu_button = InlineKeyboardButton(voucher_messages[lang]['main_menu_btn'], callback_data='fn:all_commands')
+
+    return InlineKeyboardMarkup([[user_vouchers_button], [main_menu_button]])
+
+
+def voucher_in_chat_keyboard(lang):
+    back_button = InlineKeyboardButton(voucher_messages[lang]['back_btn'],
+                                       callback_data='fn:selected_user_active_voucher')
+    return InlineKeyboardMarkup([[back_button]])
+
+
+def selected_user_voucher_keyboard(lang):
+    get_in_chat_button = InlineKeyboardButton('GET IN CHAT', callback_data='fn:get_in_chat')
+    get_in_email_button = InlineKeyboardButton('GET IN EMAIL', callback_data='fn:get_in_email')
+    back_button = InlineKeyboardButton(voucher_messages[lang]['back_btn'], callback_data='fn:user_vouchers')
+
+    return InlineKeyboardMarkup([[get_in_chat_button, get_in_email_button], [back_button]])
+
+
+def user_vouchers_keyboard(lang):
+    active_vouchers_button = InlineKeyboardButton('ACTIVE VOUCHERS', callback_data='fn:user_active_vouchers')
+    back_button = InlineKeyboardButton(voucher_messages[lang]['back_btn'], callback_data='fn:voucher')
+
+    return InlineKeyboardMarkup([[active_vouchers_button], [back_button]])
+
+
+def admin_keyboard(lang):
+    check_voucher_button = InlineKeyboardButton('🎁 Просмотреть активные ваучеры', callback_data='fn:check_voucher')
+    check_deactivated_voucher_button = InlineKeyboardButton('❌Просмотреть неактивыне ваучеры',
+                                                            callback_data='fn:activated')
+    add_voucher_button = InlineKeyboardButton('➕ Добавить новый ваучер', callback_data='fn:add_voucher')
+    show_statistics_button = InlineKeyboardButton('📊 Показать статистику', callback_data='fn:statistics')
+    get_db_file_in_chat_btn = InlineKeyboardButton('🗃️ Получить файл с базой данных', callback_data='fn:db_in_chat')
+    db_profile_button = InlineKeyboardButton('🐢 Профиль базы данных', callback_data='fn:db_profile')
+    all_commands_button = InlineKeyboardButton('🤖Вернуться в главное меню', callback_data='fn:all_commands')
+
+    return InlineKeyboardMarkup([[check_voucher_button],
+                                 [check_deactivated_voucher_button],
+                                 [add_voucher_button],
+                                 [show_statistics_button],
+                                 [get_db_file_in_chat_btn],
+                                 [db_profile_button],
+                                 [all_commands_button]])
+
+
+def admin_back_keyboard(lang):
+    back_button = InlineKeyboardButton('⏪ Назад', callback_data='fn:admin')
+    return InlineKeyboardMarkup([[back_button]])
+
+
+def selected_voucher_keyboard(lang):
+    activate_button = InlineKeyboardButton('ACTIVATE', callback_data='fn:activate')
+    back_button = InlineKeyboardButton('⏪ Назад', callback_data='fn:check_voucher')
+
+    return InlineKeyboardMarkup([[activate_button], [back_button]])
+
+
+def denied_keyboard(lang):
+    back_button = InlineKeyboardButton('⏪ Назад', callback_data='fn:all_commands')
+    return InlineKeyboardMarkup([[back_button]])
+
+
+keyboards = KeyboardRegistry()
+
+keyboards.register('start', start_keyboard, languages=(None,))
+keyboards.register('all_commands', main_menu_keyboard)
+keyboards.register('kontakt', kontakt_keyboard)
+keyboards.register('faq', faq_keyboard)
+keyboards.register('local', location_keyboard)
+keyboards.register('voucher', voucher_keyboard)
+keyboards.register('price', price_keyboard)
+keyboards.register('price_more', price_more_keyboard)
+for payment_price in PRICES:
+    keyboards.register(f'payment_{payment_price}', payment_keyboard(payment_price))
+keyboards.register('paper_voucher', paper_voucher_keyboard)
+keyboards.register('successful_payment', successful_payment_keyboard)
+keyboards.register('user_vouchers', user_vouchers_keyboard)
+keyboards.register('voucher_in_chat', voucher_in_chat_keyboard)
+keyboards.register('selected_user_voucher', selected_user_voucher_keyboard)
+keyboards.register('admin', admin_keyboard, languages=(None,))
+keyboards.register('admin_back', admin_back_keyboard, languages=(None,))
+keyboards.register('selected_voucher', selected_voucher_keyboard, languages=(None,))
+keyboards.register('denied', denied_keyboard, languages=(None,))
@@ -0,0 +1,153 @@
+import os
+import hashlib
+
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest
+
+from bot_app.async_db import async_db
+
+
+class MediaRegistry:
+    """
+    MediaRegistry Class Description
+
+    The `MediaRegistry` class makes sure that every media file of the bot (menu images, voucher images, etc.) is
+    uploaded to Telegram only once. After the first upload the `file_id` returned by Telegram is stored in the
+    `media_cache` table, keyed by the file path and the SHA-256 hash of its content, and all following sends reuse
+    that `file_id` instead of uploading the whole file again.
+
+    Functionality:
+
+    - Content Hashing: Computes the hash of a media file and keeps it in memory together with the file's `mtime` and
+    size, so the file is only re-read when it was changed on disk.
+    - File ID Lookup: Looks up the `file_id` in an in-memory dictionary first and falls back to the `media_cache`
+    table (through `AsyncDBManager`), so the id survives bot restarts.
+    - Automatic Re-upload: If the file was changed, its hash no longer matches any stored `file_id` and the file is
+    uploaded again. If Telegram rejects a stored `file_id`, the id is forgotten and the file is uploaded again.
+
+    Usage:
+
+    - Use `send_photo` / `send_document` instead of `context.bot.send_photo` / `context.bot.send_document` with an
+    opened file: `await media.send_photo(context.bot, chat_id, 'bot_app/media/money.jpg', reply_markup=keyboard)`.
+    - Use `edit_photo` to replace the photo (and caption) of a message which was already sent. Errors which are not
+    caused by the `file_id` (e.g. the message can not be edited) are raised to the caller.
+    - Use `send_generated_document` for documents which are not files of the bot (e.g. the e-voucher PDFs). They are
+    registered under a key and a content hash chosen by the caller, and the awaitable `generate` which returns the
+    document is only called when no `file_id` is known yet.
+
+    Note: `file_id`s are bound to the bot token, so the `media_cache` table must not be shared between different bots.
+    """
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self._hashes = {}
+        self._file_ids = {}
+
+    def content_hash(self, path):
+        stat = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        with open(path, 'rb') as media_file:
+            digest = hashlib.sha256(media_file.read()).hexdigest()
+        self._hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    async def get_file_id(self, path, content_hash):
+        key = (path, content_hash)
+        if key not in self._file_ids:
+            file_id = await self.db.get_media_file_id(path, content_hash)
+            if file_id is None:
+                return None
+            self._file_ids[key] = file_id
+        return self._file_ids[key]
+
+    async def remember(self, path, content_hash, file_id):
+        self._file_ids[(path, content_hash)] = file_id
+        await self.db.save_media_file_id(path, content_hash, file_id)
+
+    async def forget(self, path, content_hash):
+        self._file_ids.pop((path, content_hash), None)
+        await self.db.delete_media_file_id(path, content_hash)
+
+    async def send_photo(self, bot, chat_id, path, **kwargs):
+        return await self._send(bot.send_photo, 'photo', chat_id, path, **kwargs)
+
+    async def send_document(self, bot, chat_id, path, **kwargs):
+        return await self._send(bot.send_document, 'document', chat_id, path, **kwargs)
+
+    async def edit_photo(self, bot, chat_id, message_id, path, caption=None, **kwargs):
+        content_hash = self.content_hash(path)
+        file_id = await self.get_file_id(path, content_hash)
+
+        if file_id is not None:
+            try:
+                return await bot.edit_message_media(chat_id=chat_id, message_id=message_id,
+                                                    media=InputMediaPhoto(file_id, caption=caption), **kwargs)
+            except BadRequest as e:
+                if not is_file_id_error(e):
+                    raise
+                await self.forget(path, content_hash)
+
+        with open(path, 'rb') as media_file:
+            message = await bot.edit_message_media(chat_id=chat_id, message_id=message_id,
+                                                   media=InputMediaPhoto(media_file, caption=caption), **kwargs)
+
+        new_file_id = uploaded_file_id(message) if not isinstance(message, bool) else None
+        if new_file_id is not None:
+            await self.remember(path, content_hash, new_file_id)
+        return message
+
+    async def send_generated_document(self, bot, chat_id, key, content_hash, generate, **kwargs):
+        file_id = await self.get_file_id(key, content_hash)
+
+        if file_id is not None:
+            try:
+                return await bot.send_document(chat_id=chat_id, document=file_id, **kwargs)
+            except BadRequest as e:
+                if not is_file_id_error(e):
+                    raise
+                await self.forget(key, content_hash)
+
+        message = await bot.send_document(chat_id=chat_id, document=await generate(), **kwargs)
+
+        new_file_id = uploaded_file_id(message)
+        if new_file_id is not None:
+            await self.remember(key, content_hash, new_file_id)
+        return message
+
+    async def _send(self, send_method, media_type, chat_id, path, **kwargs):
+        content_hash = self.content_hash(path)
+        file_id = await self.get_file_id(path, content_hash)
+
+        if file_id is not None:
+            try:
+                return await send_method(chat_id=chat_id, **{media_type: file_id}, **kwargs)
+            except BadRequest as e:
+                if not is_file_id_error(e):
+                    raise
+                await self.forget(path, content_hash)
+
+        with open(path, 'rb') as media_file:
+            message = await send_method(chat_id=chat_id, **{media_type: media_file}, **kwargs)
+
+        new_file_id = uploaded_file_id(message)
+        if new_file_id is not None:
+            await self.remember(path, content_hash, new_file_id)
+        return message
+
+
+def is_file_id_error(error):
+    return 'file identifier' in error.message.lower()
+
+
+def uploaded_file_id(message):
+    if message.photo:
+        return message.photo[-1].file_id
+    if message.document is not None:
+        return message.document.file_id
+    return None
+
+
+media = MediaRegistry(async_db)
@@ -0,0 +1,90 @@
+from telegram import Message
+from telegram.error import TelegramError
+from telegram.ext import ExtBot
+
+from bot_app.metrics import metrics
+
+MAX_MESSAGES_PER_CHAT = 100
+DELETE_BATCH_SIZE = 100
+
+
+class MessageLedger:
+    """
+    MessageLedger Class Description
+
+    The `MessageLedger` class remembers the ids of the messages which are currently visible in a chat, so the old
+    screen can be removed with one `deleteMessages` Bot API call instead of guessing ids around the current message
+    and deleting them one by one.
+
+    Functionality:
+
+    - Recording: `LedgerBot` records the id of every message the bot sends. Messages written by the user (commands,
+    e-mail addresses, answers of the voucher conversation) are recorded by the handlers which receive them.
+    - Bounded Memory: At most `MAX_MESSAGES_PER_CHAT` ids are kept per chat, the oldest ids are dropped first. This is
+    also the maximum number of ids accepted by one `deleteMessages` call.
+    - Batched Cleanup: `delete_messages` takes all recorded ids of a chat and deletes them with as few
+    `deleteMessages` calls as possible (one for a normal screen). Ids passed as `keep` are neither deleted nor
+    forgotten.
+
+    Usage:
+
+    - `await ledger.delete_messages(context.bot, chat_id, update.effective_message.message_id)` deletes the recorded
+    messages of the chat together with the given ids.
+
+    Note: The ledger lives in memory. Messages sent before a restart of the bot are not deleted automatically.
+    """
+
+    def __init__(self):
+        self._messages = {}
+
+    def record(self, chat_id, message_id):
+        message_ids = self._messages.setdefault(chat_id, {})
+        message_ids.pop(message_id, None)
+        message_ids[message_id] = None
+        if len(message_ids) > MAX_MESSAGES_PER_CHAT:
+            del message_ids[next(iter(message_ids))]
+
+    def forget(self, chat_id, message_id):
+        self._messages.get(chat_id, {}).pop(message_id, None)
+
+    def pop(self, chat_id):
+        return list(self._messages.pop(chat_id, {}))
+
+    async def delete_messages(self, bot, chat_id, *message_ids, keep=()):
+        recorded_ids = self.pop(chat_id)
+        for message_id in recorded_ids:
+            if message_id in keep:
+                self.record(chat_id, message_id)
+
+        ids = sorted({message_id for message_id in (*recorded_ids, *message_ids)
+                      if message_id is not None and message_id not in keep})
+
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            try:
+                await bot.delete_messages(chat_id=chat_id, message_ids=ids[start:start + DELETE_BATCH_SIZE])
+            except TelegramError as e:
+                print(f"Could not delete messages of chat {chat_id}: {e}")
+                return e
+
+
+class LedgerBot(ExtBot):
+    """
+    LedgerBot Class Description
+
+    `ExtBot` which records the id of every message it sends (`send_message`, `send_photo`, `send_document`,
+    `send_location`, ...) in the `MessageLedger` of the chat. Use it as the bot of the application:
+    `Application.builder().bot(LedgerBot(TOKEN)).build()`. Every request to the Bot API is also counted by `metrics`.
+    """
+
+    async def _send_message(self, *args, **kwargs):
+        result = await super()._send_message(*args, **kwargs)
+        if isinstance(result, Message):
+            ledger.record(result.chat_id, result.message_id)
+        return result
+
+    async def _do_post(self, endpoint, *args, **kwargs):
+        metrics.count_api_call(endpoint)
+        return await super()._do_post(endpoint, *args, **kwargs)
+
+
+ledger = MessageLedger()
@@ -0,0 +1,227 @@
+import time
+import asyncio
+import functools
+import contextvars
+from collections import Counter, deque
+
+from bot_app.config import METRICS_HOST, METRICS_PORT
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+QUANTILES = (0.5, 0.95, 0.99)
+QUANTILE_WINDOW = 1000
+
+current_update = contextvars.ContextVar('current_update', default=None)
+
+
+class Histogram:
+    """Cumulative buckets plus the last `QUANTILE_WINDOW` observations, from which p50/p95/p99 are calculated."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'recent')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=QUANTILE_WINDOW)
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantile(self, q):
+        recent = sorted(self.recent)
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, int(q * len(recent)))]
+
+
+class UpdateStats:
+    __slots__ = ('screen', 'api_calls', 'db_statements')
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.api_calls = 0
+        self.db_statements = 0
+
+
+class Metrics:
+    """
+    Metrics Class Description
+
+    The `Metrics` class collects the performance numbers of the bot in memory and renders them in the Prometheus text
+    format, so the slow screens can be found before anything is tuned.
+
+    Functionality:
+
+    - Handler Latency: `instrument(name, handler)` wraps a handler. Every call is timed into the histogram of the
+    handler (`bot_handler_duration_seconds`), exceptions are counted (`bot_handler_errors_total`). The p50, p95 and
+    p99 of the last `QUANTILE_WINDOW` calls are exported as `bot_handler_duration_quantile_seconds`.
+    - Per-Update Counts: The outermost instrumented handler of an update counts the Bot API requests
+    (`count_api_call`, called by `LedgerBot`) and the SQL statements (`count_db_statement`, the trace callback of the
+    `ConnectionPool`) of the update. The counts are observed per screen, the screen being the innermost instrumented
+    handler (`bot_update_api_calls`, `bot_update_db_statements`). Database work in the DB threads is attributed to
+    the update because `AsyncDBManager` runs it in a copy of the update's context.
+    - Totals: Bot API requests per endpoint and all SQL statements, also those outside of updates.
+    - Extra Sources: `add_source(function)` adds the lines returned by `function()` to the output (the outbound
+    scheduler is added by `main.py`).
+
+    Usage:
+
+    - `CommandHandler('start', metrics.instrument('start', main_commands.start_command))`
+    - `curl http://127.0.0.1:9091/metrics` while the bot is running (see `MetricsServer`).
+    """
+
+    def __init__(self):
+        self.latency = {}
+        self.errors = Counter()
+        self.api_calls = {}
+        self.db_statements = {}
+        self.api_requests = Counter()
+        self.db_total = 0
+        self._sources = []
+
+    def instrument(self, name, handler):
+        @functools.wraps(handler)
+        async def instrumented(update, context):
+            stats = current_update.get()
+            token = None
+            if stats is None:
+                stats = UpdateStats(name)
+                token = current_update.set(stats)
+            else:
+                stats.screen = name
+
+            started = time.perf_counter()
+            try:
+                return await handler(update, context)
+            except Exception:
+                self.errors[name] += 1
+                raise
+            finally:
+                self._histogram(self.latency, name, LATENCY_BUCKETS).observe(time.perf_counter() - started)
+                if token is not None:
+                    current_update.reset(token)
+                    self._histogram(self.api_calls, stats.screen, COUNT_BUCKETS).observe(stats.api_calls)
+                    self._histogram(self.db_statements, stats.screen, COUNT_BUCKETS).observe(stats.db_statements)
+
+        return instrumented
+
+    @staticmethod
+    def _histogram(histograms, name, buckets):
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram(buckets)
+        return histogram
+
+    def count_api_call(self, endpoint):
+        self.api_requests[endpoint] += 1
+        stats = current_update.get()
+        if stats is not None:
+            stats.api_calls += 1
+
+    def count_db_statement(self, statement):
+        self.db_total += 1
+        stats = current_update.get()
+        if stats is not None:
+            stats.db_statements += 1
+
+    def add_source(self, source):
+        self._sources.append(source)
+
+    def render(self):
+        lines = []
+        histogram_lines(lines, 'bot_handler_duration_seconds', 'handler', self.latency,
+                        'Time spent in a handler.')
+        lines.append('# HELP bot_handler_duration_quantile_seconds Quantiles of the last handler calls.')
+        lines.append('# TYPE bot_handler_duration_quantile_seconds gauge')
+        for name, histogram in sorted(self.latency.items()):
+            for q in QUANTILES:
+                lines.append(f'bot_handler_duration_quantile_seconds{{handler="{name}",quantile="{q}"}} '
+                             f'{histogram.quantile(q):.6f}')
+        counter_lines(lines, 'bot_handler_errors_total', 'handler', self.errors, 'Exceptions raised by a handler.')
+        histogram_lines(lines, 'bot_update_api_calls', 'screen', self.api_calls, 'Bot API requests per update.')
+        histogram_lines(lines, 'bot_update_db_statements', 'screen', self.db_statements, 'SQL statements per update.')
+        counter_lines(lines, 'bot_api_requests_total', 'endpoint', self.api_requests, 'Bot API requests.')
+        lines.append('# HELP bot_db_statements_total SQL statements executed.')
+        lines.append('# TYPE bot_db_statements_total counter')
+        lines.append(f'bot_db_statements_total {self.db_total}')
+        for source in self._sources:
+            lines.extend(source())
+        return '\n'.join(lines) + '\n'
+
+
+def histogram_lines(lines, metric, label, histograms, help_text):
+    lines.append(f'# HELP {metric} {help_text}')
+    lines.append(f'# TYPE {metric} histogram')
+    for name, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.sum:.6f}')
+        lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+
+
+def counter_lines(lines, metric, label, counter, help_text):
+    lines.append(f'# HELP {metric} {help_text}')
+    lines.append(f'# TYPE {metric} counter')
+    for name, count in sorted(counter.items()):
+        lines.append(f'{metric}{{{label}="{name}"}} {count}')
+
+
+class MetricsServer:
+    """
+    MetricsServer Class Description
+
+    Serves `GET /metrics` of a `Metrics` object on `METRICS_HOST:METRICS_PORT` (127.0.0.1:9091 by default,
+    `METRICS_PORT=0` disables it). The server runs in the event loop of the bot, so the metrics are rendered without
+    locks. Start it with `await metrics_server.start()` (`post_init`) and stop it with `await metrics_server.stop()`.
+    """
+
+    def __init__(self, metrics, host=METRICS_HOST, port=METRICS_PORT):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    @property
+    def enabled(self):
+        return bool(self.port)
+
+    async def start(self, application=None):
+        if self.enabled and self._server is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self, application=None):
+        server, self._server = self._server, None
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while await reader.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            path = request_line.split()[1].decode() if len(request_line.split()) > 1 else ''
+            if path.split('?', 1)[0] == '/metrics':
+                status, body = b'200 OK', self.metrics.render().encode()
+            else:
+                status, body = b'404 Not Found', b'Not found\n'
+            writer.write(b'HTTP/1.1 %s\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                         b'Content-Length: %d\r\nConnection: close\r\n\r\n%s' % (status, len(body), body))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+metrics = Metrics()
+metrics_server = MetricsServer(metrics)
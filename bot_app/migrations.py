@@ -0,0 +1,236 @@
+"""
+Database Migrations
+
+The bot's SQLite schema is versioned with `PRAGMA user_version`. Every migration below upgrades the schema by one
+version and is applied exactly once, inside its own transaction, by `run_migrations`. Databases created before the
+versioning was introduced have `user_version = 0`; the first migration only creates the tables that are missing, so
+existing production files are upgraded in place without losing data.
+
+To change the schema, append a new function to `MIGRATIONS`. Never edit or reorder a migration that was already
+released.
+"""
+
+import sqlite3
+
+
+def create_base_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS users (
+                        id INTEGER PRIMARY KEY,
+                        chat_id INTEGER,
+                        message_id INTEGER,
+                        user_name VARCHAR,
+                        email VARCHAR,
+                        selected_lang VARCHAR,
+                        previous_lang VARCHAR,
+                        selected_func VARCHAR,
+                        prev_func VARCHAR,
+                        selected_price VARCHAR,
+                        previous_price VARCHAR,
+                        selected_voucher VARCHAR,
+                        user_selected_voucher VARCHAR,
+                        dark_soul_code VARCHAR
+                    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS vouchers (
+                        id INTEGER PRIMARY KEY,
+                        chat_id INTEGER,
+                        voucher_id VARCHAR,
+                        date DATETIME,
+                        value_of_voucher VARCHAR,
+                        is_active BOOLEAN
+                    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS media_cache (
+                        path VARCHAR,
+                        content_hash VARCHAR,
+                        file_id VARCHAR,
+                        PRIMARY KEY (path, content_hash)
+                    )''')
+
+
+def move_duplicates(cursor, table, column):
+    # Keeps the oldest row of every value and moves the others to `duplicate_<table>`, nothing is deleted for good.
+    duplicates = f'''FROM {table} WHERE {column} IS NOT NULL
+                      AND id NOT IN (SELECT MIN(id) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column})'''
+    rows = cursor.execute(f'SELECT * {duplicates}').fetchall()
+    if not rows:
+        return
+
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS duplicate_{table} AS SELECT * FROM {table} WHERE 0')
+    cursor.execute(f'INSERT INTO duplicate_{table} SELECT * {duplicates}')
+    cursor.execute(f'DELETE {duplicates}')
+    print(f'Moved {len(rows)} duplicate row(s) of {table} (same {column}) to duplicate_{table}, check them:')
+    for row in rows:
+        print(f'  {row}')
+
+
+def add_unique_indexes(cursor):
+    # Old databases may contain duplicates, the unique indexes can only be created without them. They are moved to
+    # side tables and listed, a voucher with the code of another one may still be a paid voucher of its chat.
+    move_duplicates(cursor, 'users', 'chat_id')
+    move_duplicates(cursor, 'vouchers', 'voucher_id')
+
+    cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_users_chat_id ON users (chat_id)''')
+    cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_vouchers_voucher_id ON vouchers (voucher_id)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_vouchers_active_chat_id ON vouchers (chat_id, voucher_id)
+                      WHERE is_active = 1''')
+
+
+def create_email_outbox(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS email_outbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        chat_id INTEGER,
+                        to_email VARCHAR,
+                        subject VARCHAR,
+                        body TEXT,
+                        attachment BLOB,
+                        attachment_name VARCHAR,
+                        status VARCHAR DEFAULT 'pending',
+                        attempts INTEGER DEFAULT 0,
+                        next_attempt_at REAL,
+                        last_error VARCHAR,
+                        created_at DATETIME,
+                        sent_at DATETIME
+                    )''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_email_outbox_pending ON email_outbox (next_attempt_at)
+                      WHERE status = 'pending' ''')
+
+
+def create_payments(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS payments (
+                        session_id VARCHAR PRIMARY KEY,
+                        event_id VARCHAR,
+                        dark_soul_code VARCHAR,
+                        amount_total INTEGER,
+                        email VARCHAR,
+                        payment_status VARCHAR,
+                        created INTEGER,
+                        chat_id INTEGER,
+                        voucher_id VARCHAR
+                    )''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_payments_dark_soul_code ON payments (dark_soul_code, created)''')
+
+
+def create_stripe_sync(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS stripe_events (
+                        event_id VARCHAR PRIMARY KEY,
+                        created INTEGER
+                    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS sync_cursors (
+                        name VARCHAR PRIMARY KEY,
+                        value INTEGER
+                    )''')
+
+
+def create_persistence(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS persistent_data (
+                        kind VARCHAR,
+                        key INTEGER,
+                        data TEXT,
+                        PRIMARY KEY (kind, key)
+                    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS conversations (
+                        name VARCHAR,
+                        key VARCHAR,
+                        state TEXT,
+                        PRIMARY KEY (name, key)
+                    )''')
+
+
+def create_stats(cursor):
+    # The counters are kept current by triggers, so every write path (admin vouchers, Stripe payments, new users of
+    # the session store) updates them in the same transaction as the row itself. A NULL value counts as 0: NULL
+    # revenue would violate NOT NULL, and the OR IGNORE of `INSERT OR IGNORE INTO vouchers` also applies to the
+    # statements of the trigger, so the update would be skipped silently.
+    cursor.execute('''CREATE TABLE IF NOT EXISTS stats (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        users INTEGER NOT NULL DEFAULT 0,
+                        vouchers INTEGER NOT NULL DEFAULT 0,
+                        active_vouchers INTEGER NOT NULL DEFAULT 0,
+                        revenue REAL NOT NULL DEFAULT 0,
+                        last_sale DATE
+                    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS daily_sales (
+                        day DATE PRIMARY KEY,
+                        vouchers INTEGER NOT NULL DEFAULT 0,
+                        revenue REAL NOT NULL DEFAULT 0
+                    )''')
+
+    cursor.execute('''INSERT OR REPLACE INTO stats (id, users, vouchers, active_vouchers, revenue, last_sale)
+                      SELECT 1, (SELECT COUNT(*) FROM users), COUNT(*), COALESCE(SUM(is_active = 1), 0),
+                             COALESCE(SUM(COALESCE(CAST(value_of_voucher AS REAL), 0)), 0), MAX(date)
+                      FROM vouchers''')
+    cursor.execute('''INSERT OR REPLACE INTO daily_sales (day, vouchers, revenue)
+                      SELECT date, COUNT(*), SUM(COALESCE(CAST(value_of_voucher AS REAL), 0)) FROM vouchers
+                      WHERE date IS NOT NULL GROUP BY date''')
+
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS stats_user_added AFTER INSERT ON users BEGIN
+                        UPDATE stats SET users = users + 1 WHERE id = 1;
+                      END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS stats_user_deleted AFTER DELETE ON users BEGIN
+                        UPDATE stats SET users = users - 1 WHERE id = 1;
+                      END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS stats_voucher_added AFTER INSERT ON vouchers BEGIN
+                        UPDATE stats SET vouchers = vouchers + 1,
+                                         active_vouchers = active_vouchers + (NEW.is_active = 1),
+                                         revenue = revenue + COALESCE(CAST(NEW.value_of_voucher AS REAL), 0),
+                                         last_sale = MAX(COALESCE(last_sale, NEW.date), NEW.date)
+                        WHERE id = 1;
+                        INSERT INTO daily_sales (day, vouchers, revenue)
+                        VALUES (NEW.date, 1, COALESCE(CAST(NEW.value_of_voucher AS REAL), 0))
+                        ON CONFLICT (day) DO UPDATE SET vouchers = vouchers + 1, revenue = revenue + excluded.revenue;
+                      END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS stats_voucher_activated AFTER UPDATE OF is_active ON vouchers
+                      BEGIN
+                        UPDATE stats SET active_vouchers = active_vouchers + (NEW.is_active = 1) - (OLD.is_active = 1)
+                        WHERE id = 1;
+                      END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS stats_voucher_deleted AFTER DELETE ON vouchers BEGIN
+                        UPDATE stats SET vouchers = vouchers - 1,
+                                         active_vouchers = active_vouchers - (OLD.is_active = 1),
+                                         revenue = revenue - COALESCE(CAST(OLD.value_of_voucher AS REAL), 0)
+                        WHERE id = 1;
+                        UPDATE daily_sales SET vouchers = vouchers - 1,
+                                               revenue = revenue - COALESCE(CAST(OLD.value_of_voucher AS REAL), 0)
+                        WHERE day = OLD.date;
+                      END''')
+
+
+MIGRATIONS = [
+    create_base_tables,
+    add_unique_indexes,
+    create_email_outbox,
+    create_payments,
+    create_stripe_sync,
+    create_persistence,
+    create_stats,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def run_migrations(conn):
+    """
+    Run Migrations Function
+
+    Applies every migration which is newer than the `user_version` of the database, each one in its own transaction
+    together with the new `user_version`, so a failed migration leaves the database at the last good version.
+    Returns the schema version of the database after the upgrade.
+    """
+    version = get_schema_version(conn)
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        print(f'Database migrated to version {number} ({migration.__name__})')
+
+    return get_schema_version(conn)
@@ -0,0 +1,219 @@
+import time
+import asyncio
+import itertools
+from collections import defaultdict, deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from bot_app.config import BOT_GLOBAL_RATE
+
+GLOBAL_LIMIT = (BOT_GLOBAL_RATE, 1)
+CHAT_LIMIT = (5, 5)
+GROUP_LIMIT = (20, 60)
+MAX_RETRIES = 3
+
+PRIORITY_USER = 0
+PRIORITY_BACKGROUND = 5
+PRIORITY_CLEANUP = 10
+
+CLEANUP_ENDPOINTS = ('deleteMessage', 'deleteMessages')
+
+
+class RateWindow:
+    """At most `limit` requests in every window of `period` seconds (a sliding window, so bursts can not exceed it)."""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.times = deque()
+
+    def delay(self, now):
+        while self.times and self.times[0] <= now - self.period:
+            self.times.popleft()
+        return 0 if len(self.times) < self.limit else self.times[0] + self.period - now
+
+    def take(self, now):
+        self.times.append(now)
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """
+    OutboundScheduler Class Description
+
+    The `OutboundScheduler` class is the rate limiter of the bot (`BaseRateLimiter`), so every Bot API request of
+    every handler goes through it. It keeps the bot below the flood limits of Telegram and queues the requests which
+    would exceed them, instead of letting Telegram reject them.
+
+    Functionality:
+
+    - Rate Limits: Requests to a chat have to fit into the global limit (`GLOBAL_LIMIT`, 30 requests per second) and
+    into the limit of their chat (`CHAT_LIMIT`, 5 requests in 5 seconds for private chats, `GROUP_LIMIT`, 20 per
+    minute for groups). The limits are sliding windows, a burst never exceeds them. Requests without a chat
+    (`answerCallbackQuery`, `getMe`, ...) are not limited.
+    - Priorities: Waiting requests are served by priority, then in order of arrival. Messages the user sees
+    (`PRIORITY_USER`) go before background work (`PRIORITY_BACKGROUND`) and cleanup deletes (`PRIORITY_CLEANUP`,
+    used for `deleteMessage(s)` by default). A request whose chat reached its limit does not block the requests of
+    other chats.
+    - RetryAfter: If Telegram still answers with `RetryAfter`, all requests are paused for the given time and the
+    request is retried, at most `MAX_RETRIES` times.
+    - Metrics: `metrics()` returns the queue depth, the wait times per priority and the number of `RetryAfter`
+    answers.
+
+    Usage:
+
+    - `LedgerBot(TOKEN, rate_limiter=outbound)` (see `main.py`).
+    - Override the priority of a single request: `await bot.send_message(..., rate_limit_args=PRIORITY_BACKGROUND)`.
+    - `metrics()` returns the counters as a dict, `metric_lines()` in the Prometheus text format (`/metrics`).
+
+    Note: The limits are the documented limits of the Bot API; Telegram may apply stricter ones to new bots.
+    """
+
+    def __init__(self, global_limit=GLOBAL_LIMIT, chat_limit=CHAT_LIMIT, group_limit=GROUP_LIMIT,
+                 max_retries=MAX_RETRIES):
+        self.chat_limit = chat_limit
+        self.group_limit = group_limit
+        self.max_retries = max_retries
+        self._global = RateWindow(*global_limit)
+        self._chats = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._paused_until = 0
+        self._wakeup = None
+        self._task = None
+        self._requests = 0
+        self._retry_after = 0
+        self._max_depth = 0
+        self._waits = defaultdict(lambda: [0, 0.0, 0.0])
+
+    async def initialize(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def shutdown(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for *_, future in self._waiters:
+            future.cancel()
+        self._waiters.clear()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        priority = rate_limit_args if rate_limit_args is not None else request_priority(endpoint)
+        self._requests += 1
+
+        for attempt in range(self.max_retries + 1):
+            if chat_id is not None:
+                await self._acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self._retry_after += 1
+                if attempt == self.max_retries:
+                    raise
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after + 0.1)
+                self._wakeup.set()
+
+    async def _acquire(self, chat_id, priority):
+        if self._task is None:
+            await self.initialize()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((priority, next(self._sequence), time.monotonic(), chat_id, future))
+        self._max_depth = max(self._max_depth, len(self._waiters))
+        self._wakeup.set()
+        await future
+
+    def _window(self, chat_id):
+        window = self._chats.get(chat_id)
+        if window is None:
+            window = RateWindow(*(self.group_limit if is_group(chat_id) else self.chat_limit))
+            self._chats[chat_id] = window
+        return window
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            timeout = self._grant()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant(self):
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        timeout = None
+        waiting = []
+        for waiter in sorted(self._waiters):
+            priority, _, enqueued_at, chat_id, future = waiter
+            if future.done():
+                continue
+
+            delay = max(self._global.delay(now), self._window(chat_id).delay(now))
+            if delay > 0:
+                timeout = delay if timeout is None else min(timeout, delay)
+                waiting.append(waiter)
+                continue
+
+            self._global.take(now)
+            self._window(chat_id).take(now)
+            stats = self._waits[priority]
+            stats[0] += 1
+            stats[1] += now - enqueued_at
+            stats[2] = max(stats[2], now - enqueued_at)
+            future.set_result(None)
+
+        self._waiters = waiting
+        self._forget_idle_chats(now)
+        return timeout
+
+    def _forget_idle_chats(self, now):
+        if len(self._chats) < 1000:
+            return
+        for chat_id, window in list(self._chats.items()):
+            window.delay(now)
+            if not window.times:
+                del self._chats[chat_id]
+
+    def metrics(self):
+        return {
+            'requests': self._requests,
+            'queue_depth': len(self._waiters),
+            'max_queue_depth': self._max_depth,
+            'retry_after': self._retry_after,
+            'wait_seconds': {priority: {'count': count, 'avg': total / count if count else 0.0, 'max': longest}
+                             for priority, (count, total, longest) in sorted(self._waits.items())},
+        }
+
+    def metric_lines(self):
+        lines = ['# TYPE bot_outbound_requests_total counter', f'bot_outbound_requests_total {self._requests}',
+                 '# TYPE bot_outbound_retry_after_total counter', f'bot_outbound_retry_after_total {self._retry_after}',
+                 '# TYPE bot_outbound_queue_depth gauge', f'bot_outbound_queue_depth {len(self._waiters)}',
+                 '# TYPE bot_outbound_max_queue_depth gauge', f'bot_outbound_max_queue_depth {self._max_depth}',
+                 '# TYPE bot_outbound_wait_seconds summary']
+        for priority, (count, total, longest) in sorted(self._waits.items()):
+            lines.append(f'bot_outbound_wait_seconds_sum{{priority="{priority}"}} {total:.6f}')
+            lines.append(f'bot_outbound_wait_seconds_count{{priority="{priority}"}} {count}')
+        return lines
+
+
+def request_priority(endpoint):
+    return PRIORITY_CLEANUP if endpoint in CLEANUP_ENDPOINTS else PRIORITY_USER
+
+
+def is_group(chat_id):
+    try:
+        return int(chat_id) < 0
+    except (TypeError, ValueError):
+        return True
+
+
+outbound = OutboundScheduler()
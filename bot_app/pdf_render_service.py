@@ -0,0 +1,128 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from bot_app.pdf_voucher_generator import voucher_template, render_voucher_pdf
+
+PDF_RENDER_WORKERS = 2
+PDF_RENDER_QUEUE_SIZE = 8
+PDF_RENDER_QUEUE_TIMEOUT = 5
+PDF_RENDER_TIMEOUT = 30
+
+
+class PdfRenderError(Exception):
+    pass
+
+
+class RenderQueueFull(PdfRenderError):
+    pass
+
+
+class RenderTimeout(PdfRenderError):
+    pass
+
+
+def warm_up_template():
+    voucher_template.render('WARMUP', '', '')
+
+
+class PdfRenderService:
+    """
+    PdfRenderService Class Description
+
+    The `PdfRenderService` class renders the e-voucher PDFs in a pool of worker processes, so building a PDF never
+    blocks the event loop (or, through the GIL, the other threads of the bot) while other chats are waiting.
+
+    Functionality:
+
+    - Process Pool: The PDFs are rendered by `render_voucher_pdf` in `PDF_RENDER_WORKERS` worker processes. Every
+    worker parses the voucher template once, when it is started, and keeps it in memory.
+    - Bounded Queue: At most `PDF_RENDER_QUEUE_SIZE` vouchers are rendered or waiting for a worker at the same time.
+    A slot is only freed when the worker has really finished, also when the caller gave up waiting.
+    - Backpressure: If all slots are taken, `render` waits up to `PDF_RENDER_QUEUE_TIMEOUT` seconds for a free slot
+    and then raises `RenderQueueFull`, so a peak of requests can not pile up unlimited work.
+    - Timeout: If a voucher is not rendered within `PDF_RENDER_TIMEOUT` seconds, `render` raises `RenderTimeout`.
+    - Recovery: If a worker process dies, the broken pool is shut down and replaced by a new one. A request which
+    can not even be submitted to the broken pool is retried once on the new pool, otherwise `PdfRenderError` is raised.
+
+    Usage:
+
+    - `pdf_bytes = await pdf_renderer.render(serial_number, date_of_buy, value)`
+    - Catch `PdfRenderError` (the base class of both errors) and ask the user to try again later.
+    - Call `close()` on shutdown.
+
+    Note: The workers are started with the `spawn` method, forking the multi-threaded bot process is not safe.
+    """
+
+    def __init__(self, workers=PDF_RENDER_WORKERS, queue_size=PDF_RENDER_QUEUE_SIZE,
+                 queue_timeout=PDF_RENDER_QUEUE_TIMEOUT, render_timeout=PDF_RENDER_TIMEOUT):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.render_timeout = render_timeout
+        self._slots = asyncio.Semaphore(queue_size)
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=warm_up_template)
+        return self._executor
+
+    async def render(self, serial_number, date_of_buy, value):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise RenderQueueFull(f'No free PDF render slot within {self.queue_timeout} s')
+
+        try:
+            executor, future = self._submit(serial_number, date_of_buy, value)
+        except BrokenProcessPool as e:
+            self._slots.release()
+            raise PdfRenderError('PDF render pool is broken') from e
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release_slot)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.render_timeout)
+        except asyncio.TimeoutError:
+            raise RenderTimeout(f'Voucher {serial_number} was not rendered within {self.render_timeout} s')
+        except BrokenProcessPool as e:
+            self._reset(executor)
+            raise PdfRenderError('PDF render worker died') from e
+
+    def _submit(self, serial_number, date_of_buy, value):
+        # `submit` raises BrokenProcessPool at once if a worker died since the last request, the request is then
+        # retried once on a new pool.
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._pool()
+            try:
+                return executor, loop.run_in_executor(executor, render_voucher_pdf, serial_number, date_of_buy, value)
+            except BrokenProcessPool:
+                self._reset(executor)
+                if attempt:
+                    raise
+
+    def _reset(self, executor):
+        # Several requests can notice the same broken pool, only the current one is replaced.
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release_slot(self, future):
+        self._slots.release()
+        if not future.cancelled():
+            future.exception()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pdf_renderer = PdfRenderService()
+
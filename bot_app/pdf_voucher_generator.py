@@ -1,86 +1,102 @@
-import secrets
-import string
+import io
+import threading
 
-from reportlab.pdfgen import canvas
-from PyPDF2 import PdfReader, PdfWriter
+TEMPLATE_PATH = "bot_app/media/Voucher/E-VOUCHER.pdf"
 
-from bot_app.db_manager import DBManager
-
-db = DBManager('tattoo_bot_telegram.db')
 
+class VoucherTemplate:
+    """
+    VoucherTemplate Class Description
 
-characters = string.ascii_letters + string.digits
-voucher_name = ''.join(secrets.choice(characters) for _ in range(5))
+    The `VoucherTemplate` class keeps the parsed PDF template of the e-voucher in memory and renders the vouchers of
+    the users on top of it, without touching the filesystem.
 
+    Functionality:
 
-def e_voucher_generator_pdf(chat_id):
+    - Template Cache: The template file is read and parsed with `PdfReader` only once, on the first render. The
+    decoded content stream of the template page is cached as well.
+    - In-Memory Rendering: The overlay with the value, the date and the serial number is drawn by `reportlab` into a
+    `BytesIO`. Its content stream is appended to the cached template content of a copy of the template page, and its
+    fonts are added to the page resources under the `/Voucher` prefix, so they never clash with the fonts of the
+    template. The result is written into another `BytesIO`; its bytes can be passed directly to `send_document` or
+    attached to an e-mail.
+
+    Note: `PageObject.merge_page` is not used, because it parses the content streams of both pages again for every
+    voucher. The template itself is never modified, every voucher is rendered onto a new copy of its page. The parsed
+    template reads its objects lazily from one shared stream, so renders are serialized by a lock. `reportlab` and
+    `PyPDF2` are imported on the first render (in the render workers), the bot process itself does not need them.
     """
-    e_voucher_generator_pdf Function Description
 
-    The `e_voucher_generator_pdf` function generates an electronic voucher PDF file based on the user's selected
-    voucher information. It retrieves the user's selected voucher details from the database, including the serial
-    number, date of purchase, and voucher value. It then creates a customized PDF voucher by overlaying this
-    information onto a pre-designed template.
+    def __init__(self, path):
+        self.path = path
+        self._page = None
+        self._content = None
+        self._lock = threading.Lock()
 
-    Functionality:
+    def _load(self):
+        from PyPDF2 import PdfReader
 
-    - Retrieve User Voucher Information: Retrieves the user's selected voucher details from the database using
-    the provided `chat_id`. Extracts the serial number, date of purchase, and voucher value from the voucher data.
-    - PDF Generation: Utilizes the `canvas.Canvas` module from the `reportlab` library to draw text elements onto a
-    PDF template. Inserts the voucher value, date of purchase, and serial number into designated positions on the
-    template.
-    - PDF Overlay: Merges the customized voucher template with the pre-designed voucher template using
-    the `merge_page` method from the `PyPDF2` library.
-    - Save PDF: Saves the generated electronic voucher PDF
-    file to the specified output path.
-    - Return Path and Serial Number: Returns the file path of the generated PDF voucher
-    and its corresponding serial number.
-
-    Usage:
-
-    - Invoke this function when generating electronic vouchers for users in response to specific actions or requests.
-    - Ensure that the user's selected voucher information is retrieved from the database before calling this
-    function.
-    - Customize the PDF template layout and design to match the desired appearance of the electronic
-    vouchers.
-    - Update the input and output file paths for the PDF template and generated vouchers based on the file
-    structure of your application. - Handle any errors or exceptions that may occur during the PDF generation
-    process, such as missing voucher data or file I/O issues.
-
-    Note: This function relies on external libraries (`reportlab`, `PyPDF2`) for PDF generation and manipulation.
-    Make sure these libraries are installed and accessible within your Python environment.
-
-    Feel free to integrate and adapt this function to suit the specific requirements of your voucher generation
-    system within your Telegram bot application!"""
-
-    user_voucher = db.get_user_selected_voucher(chat_id)
-    user_selected_voucher = user_voucher.split("-")[0]
-    select_voucher = db.get_selected_voucher(chat_id)
-    user_vouchers = db.get_vouchers_by_user(chat_id)
+        if self._page is None:
+            with open(self.path, 'rb') as template_file:
+                reader = PdfReader(io.BytesIO(template_file.read()))
+            page = reader.pages[0]
+            self._content = page.get_contents().get_data()
+            self._page = page
+
+    def render(self, serial_number, date_of_buy, value):
+        from reportlab.pdfgen import canvas
+        from PyPDF2 import PdfReader, PdfWriter
+        from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+        overlay = io.BytesIO()
+        c = canvas.Canvas(overlay)
+        c.drawString(100, 395, f"{value} PLN")                                 #COST
+        c.drawString(100, 335, date_of_buy)                                     #DATE
+        c.drawString(204, 335, serial_number)                                   #SERIAL_NUMBER
+        c.save()
+        overlay.seek(0)
+        overlay_page = PdfReader(overlay).pages[0]
+        overlay_content = overlay_page['/Contents'].get_object().get_data()
+
+        with self._lock:
+            self._load()
+            writer = PdfWriter()
+            page = writer.add_page(self._page)
 
-    for voucher in user_vouchers:
-        if select_voucher in voucher or user_selected_voucher in voucher:
-            serial_number = voucher[0]
-            date_of_buy = voucher[1]
-            value = voucher[2]
+            resources = page['/Resources'].get_object()
+            fonts = resources.get('/Font')
+            fonts = DictionaryObject() if fonts is None else fonts.get_object()
+            for name, font in overlay_page['/Resources']['/Font'].items():
+                voucher_name = NameObject('/Voucher' + name[1:])
+                fonts[voucher_name] = font.get_object().clone(writer)
+                overlay_content = overlay_content.replace(name.encode() + b' ', voucher_name.encode() + b' ')
+            resources[NameObject('/Font')] = fonts
 
-            input_pdf_path = "bot_app/media/Voucher/E-VOUCHER.pdf"
-            output_pdf_path = f"bot_app/media/Voucher/sold_out_vouchers/e_voucher_{voucher_name}.pdf"
+            content = DecodedStreamObject()
+            content.set_data(b'q\n' + self._content + b'\nQ\n' + overlay_content)
+            page[NameObject('/Contents')] = writer._add_object(content)
 
-            c = canvas.Canvas(output_pdf_path)
+            output = io.BytesIO()
+            writer.write(output)
+        return output.getvalue()
 
-            c.drawString(100, 395, f"{value} PLN")                             #COST
-            c.drawString(100, 335, date_of_buy)                                     #DATE
-            c.drawString(204, 335, serial_number)                                   #SERIAL_NUMBER
-            c.save()
 
-            reader = PdfReader(input_pdf_path)
-            writer = PdfWriter()
-            page = reader.pages[0]
-            page.merge_page(PdfReader(output_pdf_path).pages[0])
-            writer.add_page(page)
-            with open(output_pdf_path, 'wb') as output_file:
-                writer.write(output_file)
-            return output_pdf_path, serial_number
+voucher_template = VoucherTemplate(TEMPLATE_PATH)
+
+
+def render_voucher_pdf(serial_number, date_of_buy, value):
+    return voucher_template.render(serial_number, date_of_buy, value)
+
 
+def voucher_file_name(serial_number):
+    return f"e_voucher_{serial_number}.pdf"
 
+
+def find_user_voucher(user_state, user_vouchers):
+    user_selected_voucher = user_state.user_selected_voucher
+    select_voucher = user_state.selected_voucher
+
+    for voucher in user_vouchers:
+        if select_voucher in voucher or user_selected_voucher in voucher:
+            return voucher
+    return None
@@ -0,0 +1,85 @@
+from telegram import Update, Message
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from bot_app.chat_actions import delete_messages, get_user_state
+from bot_app.media_registry import media
+from bot_app.message_ledger import ledger
+
+
+class ScreenNavigator:
+    """
+    ScreenNavigator Class Description
+
+    The `ScreenNavigator` class shows the menu screens of the bot. Every chat has one "screen" message, the message
+    with the inline keyboard the user just clicked, and moving to the next screen changes that message in place
+    instead of deleting the old messages and sending a new one. A click therefore costs one Bot API call and the
+    chat does not flicker.
+
+    Functionality:
+
+    - Photo Screens: `show_photo` replaces the photo, caption and keyboard of the screen message with one
+    `editMessageMedia` call. The photo is sent by its cached `file_id` (see `MediaRegistry`).
+    - Text Screens: `show_text` replaces the text and keyboard of a text screen with one `editMessageText` call.
+    - Cleanup: Other messages recorded in the `MessageLedger` of the chat (e.g. a sent voucher document) are deleted
+    with one batched `deleteMessages` call, the screen message is kept.
+    - Fallback: If the screen can not be edited (the update is not a button click, a photo screen follows a text
+    screen or vice versa, the message is too old, ...) the old messages are deleted and the screen is sent as a new
+    message, exactly like before.
+
+    Usage:
+
+    - `await navigator.show_photo(update, context, 'bot_app/media/money.jpg', caption=text, reply_markup=keyboard)`
+    - `await navigator.show_text(update, context, text=text, reply_markup=keyboard)`
+    """
+
+    async def show_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE, path, caption=None,
+                         reply_markup=None):
+        message = screen_message(update)
+
+        if message is not None and message.photo:
+            try:
+                await media.edit_photo(context.bot, message.chat_id, message.message_id, path,
+                                       caption=caption, reply_markup=reply_markup)
+                return await self._delete_other_messages(update, context, message)
+            except BadRequest as e:
+                if is_not_modified(e):
+                    return await self._delete_other_messages(update, context, message)
+
+        await delete_messages(update, context)
+        await media.send_photo(context.bot, update.effective_chat.id, path, caption=caption, reply_markup=reply_markup)
+
+    async def show_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text, reply_markup=None):
+        message = screen_message(update)
+
+        if message is not None and message.text is not None:
+            try:
+                await context.bot.edit_message_text(chat_id=message.chat_id, message_id=message.message_id,
+                                                    text=text, reply_markup=reply_markup)
+                return await self._delete_other_messages(update, context, message)
+            except BadRequest as e:
+                if is_not_modified(e):
+                    return await self._delete_other_messages(update, context, message)
+
+        await delete_messages(update, context)
+        await context.bot.send_message(chat_id=update.effective_chat.id, text=text, reply_markup=reply_markup)
+
+    @staticmethod
+    async def _delete_other_messages(update: Update, context: ContextTypes.DEFAULT_TYPE, message):
+        user_state = await get_user_state(update, context)
+        keep = (message.message_id, user_state.message_id)
+        return await ledger.delete_messages(context.bot, message.chat_id, keep=keep)
+
+
+def screen_message(update: Update):
+    query = update.callback_query
+    if query is None or not isinstance(query.message, Message):
+        return None
+    return query.message
+
+
+def is_not_modified(error):
+    return 'message is not modified' in error.message.lower()
+
+
+navigator = ScreenNavigator()
@@ -0,0 +1,129 @@
+import asyncio
+from collections import OrderedDict
+
+from bot_app.db_manager import UserState
+from bot_app.async_db import async_db
+from bot_app.config import SESSION_CACHE_SIZE, SESSION_FLUSH_INTERVAL
+
+FIRST_LANG = 'LANGUAGE'
+PREV_LANG = 'PREVLANG'
+FIRST_FUNC = 'start'
+
+
+class SessionStore:
+    """
+    SessionStore Class Description
+
+    The `SessionStore` class keeps the `UserState` of the recently active chats in memory. The navigation state of a
+    chat (`selected_func`, `prev_func`, `selected_price`, `selected_voucher`, ...) only lives here, so a click on a
+    button does not write to the `users` table at all.
+
+    Functionality:
+
+    - Sessions: `get` returns the `UserState` of a chat. It is loaded from the `users` table on the first access and
+    then kept in memory; all handlers of the chat share and change the same slotted object.
+    - New Users: `get(chat_id, message_id, user_name)` creates the session of a chat which is not in the database yet;
+    its row is inserted with the next flush.
+    - Write-Behind: `save` marks the durable fields of a session (language, e-mail, DarkSoulCode) as changed. The
+    changed sessions are written together in one transaction, at most `flush_interval` seconds later; a session
+    which changes several times in between is written once. The navigation fields are never written.
+    - LRU Eviction: At most `max_sessions` sessions are kept, the least recently used one is dropped first. A dropped
+    session with unsaved changes is kept until it is written, so no change is lost and it is not loaded stale.
+
+    Usage:
+
+    - `user_state = await sessions.get(chat_id)`, change it, then `sessions.save(user_state)` if a durable field
+    changed.
+    - `await sessions.flush()` writes the changes at once (e.g. before a DarkSoulCode is shown to the user).
+    - `await sessions.stop()` in `post_shutdown` writes the remaining changes.
+
+    Note: The navigation state is lost on a restart, like an open menu of the bot; the user starts again from the
+    main menu.
+    """
+
+    def __init__(self, db_manager=async_db, max_sessions=SESSION_CACHE_SIZE, flush_interval=SESSION_FLUSH_INTERVAL):
+        self.db = db_manager
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self._sessions = OrderedDict()
+        self._dirty = {}
+        self._flushing = {}
+        self._flush_task = None
+        self.loads = 0
+        self.flushes = 0
+
+    async def get(self, chat_id, message_id=None, user_name=None):
+        user_state = self._sessions.get(chat_id)
+        if user_state is not None:
+            self._sessions.move_to_end(chat_id)
+            return user_state
+
+        user_state = self._dirty.get(chat_id) or self._flushing.get(chat_id)
+        if user_state is None:
+            user_state = await self.db.get_user_state(chat_id)
+            self.loads += 1
+            # Another update of the chat may have loaded it while this one waited for the database.
+            if chat_id in self._sessions:
+                return await self.get(chat_id, message_id, user_name)
+
+        if user_state is None:
+            if message_id is None:
+                return UserState(chat_id)
+            user_state = new_user_state(chat_id, message_id, user_name)
+            self.save(user_state)
+
+        self._sessions[chat_id] = user_state
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return user_state
+
+    def save(self, user_state):
+        self._dirty[user_state.chat_id] = user_state
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._scheduled_flush())
+
+    async def _scheduled_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        self._flushing.update(dirty)
+        rows = [(state.chat_id, state.message_id, state.user_name, state.email, state.selected_lang,
+                 state.previous_lang, state.dark_soul_code) for state in dirty.values()]
+        try:
+            await self.db.save_user_sessions(rows)
+            self.flushes += 1
+        except Exception as e:
+            print(f'Could not save the user sessions: {e}')
+            for chat_id, user_state in dirty.items():
+                if chat_id not in self._dirty:
+                    self.save(user_state)
+        finally:
+            for chat_id, user_state in dirty.items():
+                if self._flushing.get(chat_id) is user_state:
+                    del self._flushing[chat_id]
+
+    async def stop(self, application=None):
+        task, self._flush_task = self._flush_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+def new_user_state(chat_id, message_id, user_name):
+    user_state = UserState(chat_id, message_id, user_name)
+    user_state.selected_lang = FIRST_LANG
+    user_state.previous_lang = PREV_LANG
+    user_state.prev_func = FIRST_FUNC
+    return user_state
+
+
+sessions = SessionStore()
@@ -0,0 +1,150 @@
+import json
+import asyncio
+from collections import defaultdict
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot_app.async_db import async_db
+from bot_app.config import PERSISTENCE_FLUSH_INTERVAL
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    SQLitePersistence Class Description
+
+    The `SQLitePersistence` class is the persistence of the application (`BasePersistence`). It keeps `user_data`,
+    `chat_data` and the states of the persistent conversations in the database of the bot (`persistent_data` and
+    `conversations` tables), so a running `/add` conversation and its answers survive a restart of the bot.
+
+    Functionality:
+
+    - Loading: `get_user_data`, `get_chat_data` and `get_conversations` read the stored data once, when the
+    application is initialized. Afterwards the application keeps the data in memory.
+    - Write Coalescing: The application reports the changed user data, chat data and conversation states every
+    `flush_interval` seconds instead of after every update. The changes are only marked as dirty; the dirty keys of
+    one round are written together in one transaction. A key which changes several times in between is written once,
+    with its last value.
+    - Serialization: The data is stored as JSON, so it may only contain JSON types (strings, numbers, lists, dicts).
+    - Dropping: `drop_user_data` and `drop_chat_data` delete the stored rows with the next flush.
+
+    Usage:
+
+    - `Application.builder().persistence(SQLitePersistence())` (see `main.py`), together with
+    `ConversationHandler(..., name='add_voucher', persistent=True)`.
+    - `flush()` is called by the application when it stops and writes the remaining dirty keys.
+
+    Note: `bot_data` and `callback_data` are not stored (`store_data` disables them).
+    """
+
+    def __init__(self, db_manager=async_db, flush_interval=PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(store_data=PersistenceInput(bot_data=False, callback_data=False),
+                         update_interval=flush_interval)
+        self.db_manager = db_manager
+        self._dirty_data = {}
+        self._dirty_conversations = {}
+        self._stored = set()
+        self._flush_task = None
+        self.flushes = 0
+
+    async def get_user_data(self):
+        return await self._load_data('user')
+
+    async def get_chat_data(self):
+        return await self._load_data('chat')
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        rows = await self.db_manager.get_conversation_states(name)
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    async def _load_data(self, kind):
+        rows = await self.db_manager.get_persistent_data(kind)
+        self._stored.update((kind, key) for key, data in rows)
+        return defaultdict(dict, {key: json.loads(data) for key, data in rows})
+
+    async def update_user_data(self, user_id, data):
+        self._mark_dirty_data('user', user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._mark_dirty_data('chat', chat_id, data)
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        self._dirty_conversations[(name, json.dumps(list(key)))] = \
+            None if new_state is None else json.dumps(new_state)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._mark_dirty_data('user', user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        self._mark_dirty_data('chat', chat_id, None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    def _mark_dirty_data(self, kind, key, data):
+        # Empty data is deleted instead of stored, so users who only clicked through the menu leave no rows behind
+        # and cause no writes.
+        if not data and (kind, key) not in self._stored and (kind, key) not in self._dirty_data:
+            return
+        self._dirty_data[(kind, key)] = json.dumps(data) if data else None
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        # The application reports all changes of one round at the same time (`asyncio.gather`); the write is
+        # scheduled behind them, so it writes the whole round in one transaction.
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._scheduled_write())
+
+    async def _scheduled_write(self):
+        try:
+            await self._write()
+        finally:
+            self._flush_task = None
+
+    async def flush(self):
+        if self._flush_task is not None:
+            await asyncio.shield(self._flush_task)
+        await self._write()
+
+    async def _write(self):
+        while self._dirty_data or self._dirty_conversations:
+            data_rows = [(kind, key, data) for (kind, key), data in self._dirty_data.items()]
+            conversation_rows = [(name, key, state) for (name, key), state in self._dirty_conversations.items()]
+            self._dirty_data = {}
+            self._dirty_conversations = {}
+            try:
+                await self.db_manager.save_persistent_data(data_rows, conversation_rows)
+                self.flushes += 1
+                for kind, key, data in data_rows:
+                    if data is None:
+                        self._stored.discard((kind, key))
+                    else:
+                        self._stored.add((kind, key))
+            except Exception as e:
+                print(f'Could not save the persistent data: {e}')
+                for kind, key, data in data_rows:
+                    self._dirty_data.setdefault((kind, key), data)
+                for name, key, state in conversation_rows:
+                    self._dirty_conversations.setdefault((name, key), state)
+                return
+
+
+persistence = SQLitePersistence()
@@ -0,0 +1,288 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from bot_app.db_manager import db
+from bot_app.config import STRIPE_API_KEY, STRIPE_POLL_INTERVAL, STRIPE_WEBHOOK_SECRET, STRIPE_WEBHOOK_HOST, \
+    STRIPE_WEBHOOK_PORT
+
+STRIPE_POLL_LOOKBACK = 30 * 24 * 3600
+STRIPE_POLL_OVERLAP = 300
+STRIPE_ON_DEMAND_POLL_INTERVAL = 10
+STRIPE_CURSOR_NAME = 'stripe_events'
+
+STRIPE_WEBHOOK_PATH = '/stripe/webhook'
+MAX_WEBHOOK_BODY_SIZE = 1024 * 1024
+STRIPE_WEBHOOK_TIMEOUT = 10
+
+PAYMENT_EVENT_TYPES = ('checkout.session.completed', 'checkout.session.async_payment_succeeded')
+
+
+def stripe_sdk():
+    # The Stripe SDK takes about a second to import; it is imported on the first payment, not at start-up.
+    import stripe
+
+    if stripe.api_key is None:
+        stripe.api_key = STRIPE_API_KEY
+    return stripe
+
+
+def dark_soul_code_of(session):
+    for field in session.get('custom_fields') or ():
+        value = (field.get('text') or {}).get('value')
+        if value:
+            return value
+    return None
+
+
+def save_checkout_event(db_manager, event):
+    """
+    Store the checkout session of a `checkout.session.*` event in the `payments` table, keyed by the session id, so
+    the same event can be delivered any number of times. Returns `False` for other events and for sessions without a
+    DarkSoulCode.
+    """
+
+    if event['type'] not in PAYMENT_EVENT_TYPES:
+        return False
+
+    session = event['data']['object']
+    dark_soul_code = dark_soul_code_of(session)
+    if dark_soul_code is None:
+        return False
+
+    email = (session.get('customer_details') or {}).get('email')
+    db_manager.save_payment(session['id'], event['id'], dark_soul_code, session.get('amount_total'), email,
+                            session.get('payment_status'), session.get('created', event.get('created')))
+    return True
+
+
+def process_stripe_event(db_manager, event):
+    """
+    Apply a Stripe event exactly once: events whose id is already in the `stripe_events` table are skipped, so an
+    event received by the webhook and listed again by the poller (or delivered twice) is only processed once.
+    Returns `True` if the event was new.
+    """
+
+    if db_manager.stripe_event_exists(event['id']):
+        return False
+    save_checkout_event(db_manager, event)
+    db_manager.add_stripe_event(event['id'], event.get('created'))
+    return True
+
+
+class StripeWebhookHandler(BaseHTTPRequestHandler):
+    # Socket timeout of a request: a client which connects and sends nothing (or less than its Content-Length)
+    # only holds its own thread, and only for this long.
+    timeout = STRIPE_WEBHOOK_TIMEOUT
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0] != STRIPE_WEBHOOK_PATH:
+            return self._reply(404, 'Not found')
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            return self._reply(400, 'Invalid Content-Length')
+        if length < 0:
+            return self._reply(400, 'Invalid Content-Length')
+        if length > MAX_WEBHOOK_BODY_SIZE:
+            return self._reply(413, 'Payload too large')
+
+        try:
+            payload = self.rfile.read(length)
+        except TimeoutError:
+            self.close_connection = True
+            return
+        if len(payload) != length:
+            return self._reply(400, 'Incomplete body')
+        stripe = stripe_sdk()
+        try:
+            event = stripe.Webhook.construct_event(payload, self.headers.get('Stripe-Signature', ''),
+                                                   self.server.secret)
+        except (ValueError, stripe.SignatureVerificationError):
+            return self._reply(400, 'Invalid signature')
+
+        try:
+            # The requests are handled in their own threads, the database is written by one worker thread only
+            # (the pool keeps a connection per thread for the lifetime of the process).
+            self.server.db_writer.submit(process_stripe_event, self.server.db, event).result()
+        except Exception as e:
+            print(f"Stripe webhook error: {e}")
+            return self._reply(500, 'Error')
+        self._reply(200, 'OK')
+
+    def _reply(self, status, text):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StripeWebhookServer:
+    """
+    StripeWebhookServer Class Description
+
+    The `StripeWebhookServer` class receives the Stripe webhooks of the shop, so a payment is known to the bot as soon
+    as it is completed and "Check Payment" does not have to list the events of the Stripe account.
+
+    Functionality:
+
+    - Signature Verification: Every request to `STRIPE_WEBHOOK_PATH` is verified with the signing secret of the
+    endpoint (`STRIPE_WEBHOOK_SECRET`). Requests with a missing or wrong signature are answered with 400.
+    - Payments Index: `checkout.session.completed` (and `checkout.session.async_payment_succeeded`) events are stored
+    in the `payments` table, indexed by the DarkSoulCode custom field. `DBManager.redeem_payment` then finds the
+    payment of a user with one indexed lookup and turns it into a voucher exactly once.
+    - Background Threads: The HTTP server runs in its own thread and handles every request in a thread of its own
+    with a socket timeout of `STRIPE_WEBHOOK_TIMEOUT` seconds, so an idle or slow client can not block the
+    deliveries of Stripe. The events are written by one worker thread with its own database connection, the event
+    loop of the bot is not involved.
+
+    Usage:
+
+    - Set `STRIPE_WEBHOOK_SECRET` (and optionally `STRIPE_WEBHOOK_HOST` / `STRIPE_WEBHOOK_PORT`) and register
+    `https://<host>/stripe/webhook` as an endpoint for the checkout events in the Stripe dashboard.
+    - `await stripe_webhook.start()` / `await stripe_webhook.stop()` (`post_init` / `post_shutdown`). Without a
+    secret the server is not started.
+    - `devtools/fake_stripe.py` sends signed test events to a local server.
+
+    Note: The server speaks plain HTTP. In production it has to run behind a reverse proxy which terminates TLS.
+    """
+
+    def __init__(self, db_manager, secret=STRIPE_WEBHOOK_SECRET, host=STRIPE_WEBHOOK_HOST, port=STRIPE_WEBHOOK_PORT):
+        self.db = db_manager
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self._server = None
+
+    @property
+    def enabled(self):
+        return bool(self.secret)
+
+    async def start(self, application=None):
+        if not self.enabled or self._server is not None:
+            return
+        self._server = ThreadingHTTPServer((self.host, self.port), StripeWebhookHandler)
+        self._server.daemon_threads = True
+        self._server.secret = self.secret
+        self._server.db = self.db
+        self._server.db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stripe-webhook-db')
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='stripe-webhook', daemon=True).start()
+        print(f'Stripe webhook listening on {self.host}:{self.port}{STRIPE_WEBHOOK_PATH}')
+
+    async def stop(self, application=None):
+        server, self._server = self._server, None
+        if server is not None:
+            await asyncio.to_thread(server.shutdown)
+            server.server_close()
+            server.db_writer.shutdown(wait=False)
+
+
+class StripePoller:
+    """
+    StripePoller Class Description
+
+    The `StripePoller` class fills the `payments` table for deployments which can not receive the Stripe webhook,
+    and reconciles events which the webhook missed. It only asks Stripe for the events which are new since the last
+    poll, instead of listing all events of the account on every "Check Payment".
+
+    Functionality:
+
+    - Incremental Cursor: The `created` timestamp of the newest processed event is stored in the `sync_cursors`
+    table. Every poll lists only the checkout events created since then (minus `STRIPE_POLL_OVERLAP` seconds, so
+    events which become visible late in the Stripe API are not skipped). The first poll looks back 30 days, as long
+    as Stripe keeps events.
+    - Idempotency: Every processed event id is stored in `stripe_events` (see `process_stripe_event`), events of the
+    overlap or already received by the webhook are skipped. Old ids are deleted when they can not be listed again.
+    - Background Task: The poller runs every `STRIPE_POLL_INTERVAL` seconds as an asyncio task. The Stripe API is
+    called in a thread, the event loop is never blocked.
+    - On Demand: `poll_if_stale` can be awaited by a handler (e.g. "Check Payment" right after the checkout). It
+    only calls Stripe if no poll (on demand or in the background) was started within the last
+    `STRIPE_ON_DEMAND_POLL_INTERVAL` seconds, so repeated clicks do not each list the events again. Concurrent calls
+    share one poll.
+
+    Usage:
+
+    - `await stripe_poller.start()` / `await stripe_poller.stop()` (`post_init` / `post_shutdown`). Without
+    `STRIPE_API_KEY` the poller is not started.
+    - `await stripe_poller.poll()` to import the newest events now, `await stripe_poller.poll_if_stale()` from a
+    handler.
+    """
+
+    def __init__(self, db_manager, interval=STRIPE_POLL_INTERVAL):
+        self.db = db_manager
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._last_poll = None
+
+    @property
+    def enabled(self):
+        return bool(STRIPE_API_KEY)
+
+    async def start(self, application=None):
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, application=None):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Stripe poller error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def poll(self):
+        if self._lock.locked():
+            async with self._lock:
+                return 0
+        async with self._lock:
+            self._last_poll = time.monotonic()
+            return await asyncio.to_thread(self._poll)
+
+    async def poll_if_stale(self, max_age=STRIPE_ON_DEMAND_POLL_INTERVAL):
+        if self._last_poll is not None and time.monotonic() - self._last_poll < max_age:
+            return 0
+        return await self.poll()
+
+    def _poll(self):
+        cursor = self.db.get_sync_cursor(STRIPE_CURSOR_NAME)
+        if cursor is None:
+            cursor = int(time.time()) - STRIPE_POLL_LOOKBACK
+        since = cursor - STRIPE_POLL_OVERLAP
+
+        processed = 0
+        newest = cursor
+        events = stripe_sdk().Event.list(types=list(PAYMENT_EVENT_TYPES), created={'gte': since}, limit=100)
+        # Stripe lists the newest events first; they are applied in the order they happened (reversed first, so
+        # events of the same second keep their order as well).
+        for event in sorted(reversed(list(events.auto_paging_iter())), key=lambda event: event['created']):
+            if process_stripe_event(self.db, event):
+                processed += 1
+            newest = max(newest, event['created'])
+
+        if newest != cursor:
+            self.db.save_sync_cursor(STRIPE_CURSOR_NAME, newest)
+        self.db.delete_stripe_events_before(since)
+        return processed
+
+
+stripe_webhook = StripeWebhookServer(db)
+stripe_poller = StripePoller(db)
@@ -0,0 +1,87 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from bot_app.config import CONCURRENT_UPDATES
+
+MAX_QUEUED_UPDATES = 256
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    ChatOrderedUpdateProcessor Class Description
+
+    The `ChatOrderedUpdateProcessor` class lets the application process the updates of different chats at the same
+    time, while the updates of one chat are still processed one after another, in the order in which they were
+    received. One slow handler (a Stripe check, a PDF render, ...) therefore only delays its own chat.
+
+    Functionality:
+
+    - Per-Chat Ordering: Every update takes the lock of its chat (of its user, for updates without a chat) before it
+    is processed. All handlers (`button_click`, `/start`, `/admin`, the voucher conversation) run under this lock, so
+    they never see the state of their chat change under their feet, and the `ConversationHandler` sees the messages
+    of a chat in order.
+    - Concurrency Limit: At most `max_concurrent_updates` updates run their handlers at the same time (the
+    `max_running_updates` attribute). Updates which wait for the lock of their chat do not count, so one chat which
+    sends many updates does not take the slots of the other chats.
+    - Waiting Limit: At most `max_queued_updates` updates are inside the processor at the same time, running or
+    waiting for the lock of their chat. This is the semaphore of `BaseUpdateProcessor.process_update`, therefore the
+    `max_concurrent_updates` property of the processor (and `Application.concurrent_updates`) reports this number.
+    Further updates wait in front of the processor, in the order in which they were received.
+    - Cleanup: The lock of a chat is dropped as soon as no update of the chat is processed or waiting.
+
+    Usage:
+
+    - `Application.builder().concurrent_updates(ChatOrderedUpdateProcessor(16)).build()`
+    - `main.py` uses it with `CONCURRENT_UPDATES` (environment variable, 16 by default). `CONCURRENT_UPDATES=0`
+    processes all updates sequentially, like before.
+
+    Note: Updates without a chat and without a user (e.g. poll updates) are processed without a lock. The limits are
+    no backpressure on Telegram: the `Application` starts a task for every fetched update without waiting for the
+    processor, so they bound the work which is done at the same time, not the number of fetched updates in memory.
+    """
+
+    def __init__(self, max_concurrent_updates=CONCURRENT_UPDATES, max_queued_updates=MAX_QUEUED_UPDATES):
+        super().__init__(max(max_queued_updates, max_concurrent_updates))
+        self.max_running_updates = max_concurrent_updates
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        self._chat_locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        key = chat_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        lock, waiting = self._chat_locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._chat_locks[key] = (lock, waiting + 1)
+        try:
+            async with lock:
+                async with self._running:
+                    await coroutine
+        finally:
+            lock, waiting = self._chat_locks[key]
+            if waiting == 1:
+                del self._chat_locks[key]
+            else:
+                self._chat_locks[key] = (lock, waiting - 1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def chat_key(update):
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
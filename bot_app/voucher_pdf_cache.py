@@ -0,0 +1,178 @@
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+from bot_app.async_db import async_db
+from bot_app.media_registry import media
+from bot_app.pdf_voucher_generator import TEMPLATE_PATH, voucher_file_name, find_user_voucher
+from bot_app.pdf_render_service import pdf_renderer
+from bot_app.config import VOUCHER_CACHE_DIR, VOUCHER_CACHE_MAX_BYTES
+
+
+class VoucherPdfCache:
+    """
+    VoucherPdfCache Class Description
+
+    The `VoucherPdfCache` class keeps the generated e-voucher PDFs on disk, so a voucher which was already downloaded
+    is not rendered again. Together with the `file_id` stored by the `MediaRegistry` a repeated download in the chat
+    costs neither rendering nor uploading.
+
+    Functionality:
+
+    - Content Addressing: Every PDF is stored once, under the SHA-256 hash of its serial number, value, date of
+    purchase and the hash of the voucher template. If the template file is replaced, all keys change and the vouchers
+    are rendered again with the new template.
+    - LRU Eviction: The cache keeps at most `max_bytes` (`VOUCHER_CACHE_MAX_MB` megabytes, 50 by default) of PDFs in
+    `VOUCHER_CACHE_DIR`. When the budget is exceeded, the least recently used PDFs are deleted first. The `mtime` of
+    a file is updated on every hit, so the order survives a restart of the bot.
+    - Non-blocking: The files are read and written in a worker thread, the PDFs are rendered by the
+    `PdfRenderService`.
+
+    Usage:
+
+    - `key, pdf_bytes = await voucher_cache.get(serial_number, date_of_buy, value)`
+    - Use `send_voucher_pdf` / `e_voucher_generator_pdf` in the handlers, they look up the voucher of the user.
+
+    Note: The Telegram `file_id` of a voucher is not deleted when its PDF is evicted, so a voucher which was sent
+    once can still be sent again without rendering.
+    """
+
+    def __init__(self, directory=VOUCHER_CACHE_DIR, max_bytes=VOUCHER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def key(self, serial_number, date_of_buy, value):
+        template_hash = media.content_hash(TEMPLATE_PATH)
+        return hashlib.sha256(f'{serial_number}|{value}|{date_of_buy}|{template_hash}'.encode()).hexdigest()
+
+    async def get(self, serial_number, date_of_buy, value):
+        key = self.key(serial_number, date_of_buy, value)
+        pdf_bytes = await asyncio.to_thread(self._read, key)
+        if pdf_bytes is None:
+            pdf_bytes = await pdf_renderer.render(serial_number, date_of_buy, value)
+            await asyncio.to_thread(self._write, key, pdf_bytes)
+        return key, pdf_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def _load_entries(self):
+        if self._entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, entry.name[:-4], stat.st_size))
+
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(files))
+        self._size = sum(self._entries.values())
+
+    def _read(self, key):
+        with self._lock:
+            self._load_entries()
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            with open(self._path(key), 'rb') as pdf_file:
+                pdf_bytes = pdf_file.read()
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+        return pdf_bytes
+
+    def _write(self, key, pdf_bytes):
+        tmp_path = f'{self._path(key)}.{threading.get_ident()}.tmp'
+        with self._lock:
+            self._load_entries()
+            with open(tmp_path, 'wb') as pdf_file:
+                pdf_file.write(pdf_bytes)
+            os.replace(tmp_path, self._path(key))
+
+            self._size += len(pdf_bytes) - self._entries.pop(key, 0)
+            self._entries[key] = len(pdf_bytes)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+voucher_cache = VoucherPdfCache()
+
+
+async def e_voucher_generator_pdf(user_state):
+    """
+    e_voucher_generator_pdf Function Description
+
+    The `e_voucher_generator_pdf` function generates an electronic voucher PDF file based on the user's selected
+    voucher information. It retrieves the user's selected voucher details from the database, including the serial
+    number, date of purchase, and voucher value. It then creates a customized PDF voucher by overlaying this
+    information onto a pre-designed template.
+
+    Functionality:
+
+    - Retrieve User Voucher Information: Takes the user's selected voucher from the provided `UserState` snapshot
+    and retrieves the voucher details from the database through `AsyncDBManager`. Extracts the serial number, date of
+    purchase, and voucher value from the voucher data.
+    - PDF Generation: Returns the PDF from the `VoucherPdfCache`. Only if the voucher is not cached, the voucher
+    value, date of purchase, and serial number are rendered onto the cached e-voucher template in a worker process
+    of the `PdfRenderService`.
+    - Return PDF and Serial Number: Returns the bytes of the generated PDF voucher and its corresponding serial
+    number. Use `voucher_file_name(serial_number)` as the file name when the PDF is sent.
+
+    Usage:
+
+    - Await this function when generating electronic vouchers for users in response to specific actions or requests.
+    - Handle `PdfRenderError`, which is raised when the renderer is overloaded or too slow.
+
+    Note: This function relies on external libraries (`reportlab`, `PyPDF2`) for PDF generation and manipulation.
+    Make sure these libraries are installed and accessible within your Python environment."""
+
+    user_vouchers = await async_db.get_vouchers_by_user(user_state.chat_id)
+    voucher = find_user_voucher(user_state, user_vouchers)
+    if voucher is None:
+        return None
+
+    serial_number, date_of_buy, value = voucher[0], voucher[1], voucher[2]
+    _, pdf_bytes = await voucher_cache.get(serial_number, date_of_buy, value)
+    return pdf_bytes, serial_number
+
+
+async def send_voucher_pdf(bot, chat_id, user_state):
+    """
+    Send the selected e-voucher of the user as a document. A voucher which was sent before is sent by its Telegram
+    `file_id`, otherwise the PDF is taken from the `VoucherPdfCache` (rendered if needed) and uploaded once.
+    Raises `PdfRenderError` like `e_voucher_generator_pdf`.
+    """
+
+    user_vouchers = await async_db.get_vouchers_by_user(user_state.chat_id)
+    voucher = find_user_voucher(user_state, user_vouchers)
+    if voucher is None:
+        return None
+
+    serial_number, date_of_buy, value = voucher[0], voucher[1], voucher[2]
+    key = voucher_cache.key(serial_number, date_of_buy, value)
+
+    async def generate():
+        _, pdf_bytes = await voucher_cache.get(serial_number, date_of_buy, value)
+        return pdf_bytes
+
+    return await media.send_generated_document(bot, chat_id, f'voucher:{serial_number}', key, generate,
+                                               filename=voucher_file_name(serial_number))
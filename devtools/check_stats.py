@@ -0,0 +1,95 @@
+"""
+Statistics Consistency Check
+
+Compares the trigger-maintained `stats` and `daily_sales` tables with a recount of the `users` and `vouchers` rows,
+so a drift of the counters (a trigger which was skipped or calculated NULL) is noticed.
+
+Usage:
+
+- Check a database (e.g. a copy of the production file): `python devtools/check_stats.py --db bot.db`
+- Self test: `python devtools/check_stats.py --self-test` migrates a temporary database and adds vouchers with a
+  NULL, a non-numeric and a numeric value the way the bot does (`INSERT OR IGNORE`, also for a duplicate code), then
+  deletes one and compares the counters with the recount after every step.
+
+The exit code is 1 if the counters do not match the recount.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REVENUE = 'COALESCE(CAST(value_of_voucher AS REAL), 0)'
+
+
+def recount(conn):
+    totals = conn.execute(f'''SELECT (SELECT COUNT(*) FROM users), COUNT(*), COALESCE(SUM(is_active = 1), 0),
+                                     COALESCE(SUM({REVENUE}), 0)
+                              FROM vouchers''').fetchone()
+    days = conn.execute(f'''SELECT date, COUNT(*), SUM({REVENUE}) FROM vouchers
+                            WHERE date IS NOT NULL GROUP BY date ORDER BY date''').fetchall()
+    return totals, days
+
+
+def counters(conn):
+    totals = conn.execute('SELECT users, vouchers, active_vouchers, revenue FROM stats WHERE id = 1').fetchone()
+    days = conn.execute('''SELECT day, vouchers, revenue FROM daily_sales
+                           WHERE vouchers != 0 OR revenue != 0 ORDER BY day''').fetchall()
+    return totals, days
+
+
+def check(conn, step='database'):
+    expected, actual = recount(conn), counters(conn)
+    if expected == actual:
+        print(f'{step:32} OK    {actual[0]}')
+        return True
+    print(f'{step:32} DRIFT stats {actual[0]} != recount {expected[0]}')
+    if expected[1] != actual[1]:
+        print(f'{"":32}       daily_sales {actual[1]} != recount {expected[1]}')
+    return False
+
+
+def self_test():
+    os.chdir(tempfile.mkdtemp())
+
+    from bot_app.db_manager import DBManager
+
+    db_manager = DBManager('stats.db')
+    db_manager.migrate()
+    conn = db_manager.create_connection()
+
+    steps = [
+        ('voucher with value 300', lambda: db_manager.add_voucher_to_db(1, 'V300', '300')),
+        ('voucher with NULL value', lambda: db_manager.add_voucher_to_db(1, 'VNULL', None)),
+        ('voucher with text value', lambda: db_manager.add_voucher_to_db(2, 'VTEXT', 'abc')),
+        ('duplicate code (ignored)', lambda: db_manager.add_voucher_to_db(2, 'V300', '600')),
+        ('delete NULL voucher', lambda: (conn.execute("DELETE FROM vouchers WHERE voucher_id = 'VNULL'"),
+                                         conn.commit())),
+    ]
+    results = [check(conn, 'migrated')]
+    for step, action in steps:
+        action()
+        results.append(check(conn, step))
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='database file to check')
+    parser.add_argument('--self-test', action='store_true')
+    args = parser.parse_args()
+
+    if args.self_test:
+        ok = self_test()
+    elif args.db:
+        import sqlite3
+        ok = check(sqlite3.connect(f'file:{args.db}?mode=ro', uri=True), args.db)
+    else:
+        parser.error('pass --db or --self-test')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
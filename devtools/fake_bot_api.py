@@ -0,0 +1,206 @@
+"""
+Fake Telegram Bot API Server
+
+A small local stand-in for `https://api.telegram.org`, for load tests of the bot without a real bot token. It answers
+the Bot API methods used by the bot (`getMe`, `sendMessage`, `sendPhoto`, `sendDocument`, `sendLocation`,
+`editMessageMedia`, `editMessageText`, `deleteMessages`, `answerCallbackQuery`, ...) with well-formed results after
+a configurable delay, which simulates the round trip to the Telegram servers. Every call is counted per method and
+the time of the first call of every method is kept. Updates added with `add_update` are served by `getUpdates`; a
+waiting long poll returns as soon as an update is added. The last message with an inline keyboard of every chat is
+kept in `screens`, so a simulated user can click the buttons the bot actually shows; `documents` counts the
+documents sent to every chat.
+
+Usage:
+
+- `python devtools/fake_bot_api.py --port 8088 --latency-ms 50` and point the bot to it with
+  `LedgerBot(token, base_url='http://127.0.0.1:8088/bot', base_file_url='http://127.0.0.1:8088/file/bot')`.
+- In a script: `server = await FakeBotApi(latency=0.05).start()`, then `server.base_url`.
+- Without a socket: `LedgerBot(token, request=InProcessBotApiRequest())` answers every call in-process with the same
+  results (micro-benchmarks).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from urllib.parse import parse_qs
+
+from telegram.request import BaseRequest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot', 'can_join_groups': False,
+            'can_read_all_group_messages': False, 'supports_inline_queries': False}
+
+MULTIPART_FIELD = re.compile(rb'name="([^"]+)"\r\n\r\n(.*?)\r\n--', re.S)
+
+
+class FakeBotApi:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls = Counter()
+        self.first_calls = {}
+        self.updates = []
+        self.screens = {}
+        self.documents = Counter()
+        self._message_ids = Counter()
+        self._update_added = asyncio.Event()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}/bot'
+
+    @property
+    def base_file_url(self):
+        return f'http://{self.host}:{self.port}/file/bot'
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b''):
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                method = request_line.split()[1].decode().rsplit('/', 1)[-1]
+                params = parse_params(headers.get('content-type', ''), body)
+                self.calls[method] += 1
+                self.first_calls.setdefault(method, time.monotonic())
+                if method == 'getUpdates' and not self.pending_updates(params):
+                    # Long polling: without updates the request is held until an update is added, at most for a
+                    # moment, like the real Bot API does.
+                    try:
+                        await asyncio.wait_for(self._update_added.wait(), min(float(params.get('timeout') or 0), 0.5))
+                    except asyncio.TimeoutError:
+                        pass
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                response = json.dumps({'ok': True, 'result': self.result(method, params)}).encode()
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: %d\r\n\r\n%s' % (len(response), response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def result(self, method, params):
+        chat_id = int(params.get('chat_id', 0) or 0)
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getUpdates':
+            return self.pending_updates(params)
+        if method.startswith('send'):
+            return self.message(chat_id, self.next_message_id(chat_id), method, params)
+        if method in ('editMessageMedia', 'editMessageText', 'editMessageCaption'):
+            return self.message(chat_id, int(params.get('message_id', 0)), method, params)
+        return True
+
+    def next_message_id(self, chat_id):
+        self._message_ids[chat_id] += 1
+        return self._message_ids[chat_id]
+
+    def add_update(self, update):
+        self.updates.append(update)
+        # Every waiting long poll holds the old event, setting it wakes all of them up.
+        self._update_added.set()
+        self._update_added = asyncio.Event()
+
+    def pending_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        # Updates below the offset were confirmed by the bot and are never served again.
+        self.updates = [update for update in self.updates if update['update_id'] >= offset]
+        return self.updates
+
+    def message(self, chat_id, message_id, method, params):
+        message = {'message_id': message_id, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'}}
+        if method in ('sendPhoto', 'editMessageMedia'):
+            file_id = f'photo-{chat_id}-{message_id}'
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 10, 'height': 10}]
+        elif method == 'sendDocument':
+            self.documents[chat_id] += 1
+            file_id = f'document-{chat_id}-{message_id}'
+            message['document'] = {'file_id': file_id, 'file_unique_id': file_id}
+        elif method == 'sendLocation':
+            message['location'] = {'latitude': 0.0, 'longitude': 0.0}
+        else:
+            message['text'] = 'text'
+        if params.get('reply_markup'):
+            reply_markup = params['reply_markup']
+            message['reply_markup'] = json.loads(reply_markup) if isinstance(reply_markup, str) else reply_markup
+            self.screens[chat_id] = message
+        return message
+
+
+class InProcessBotApiRequest(BaseRequest):
+    """`BaseRequest` which answers the requests of a bot with a `FakeBotApi` in-process, without HTTP."""
+
+    def __init__(self, api=None):
+        self.api = api or FakeBotApi()
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.json_parameters if request_data is not None else {}
+        self.api.calls[endpoint] += 1
+        return 200, json.dumps({'ok': True, 'result': self.api.result(endpoint, params)}).encode()
+
+
+def parse_params(content_type, body):
+    if content_type.startswith('multipart/form-data'):
+        return {name.decode(): value.decode(errors='replace') for name, value in MULTIPART_FIELD.findall(body)
+                if len(value) < 4096}
+    if content_type.startswith('application/json'):
+        return json.loads(body or b'{}')
+    return {name: values[0] for name, values in parse_qs(body.decode()).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8088)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    async def serve():
+        server = await FakeBotApi(port=args.port, latency=args.latency_ms / 1000).start()
+        print(f'Fake Bot API listening on {server.base_url}')
+        while True:
+            await asyncio.sleep(10)
+            print(dict(server.calls))
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
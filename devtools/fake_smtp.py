@@ -0,0 +1,180 @@
+"""
+Fake SMTP Server
+
+A small stand-in for a real SMTP server (in the style of `aiosmtpd`, without the dependency), for running the
+`EmailOutbox` worker locally. It accepts EHLO/HELO, AUTH (any credentials), MAIL, RCPT, DATA, RSET, NOOP and QUIT,
+does not offer STARTTLS, and keeps every received message in memory. Failures can be injected:
+
+- `fail_next=N`: the next N messages are rejected with `451` (temporary, the outbox retries them).
+- `reject=True`: every message is rejected with `550` (permanent, the outbox marks them as failed).
+- `drop_after=N`: the connection is closed after every N accepted messages.
+
+Usage:
+
+- Server only: `python devtools/fake_smtp.py --port 8025` and start the bot with `SMTP_HOST=127.0.0.1`,
+  `SMTP_PORT=8025`, `SMTP_STARTTLS=0`.
+- Self test: `python devtools/fake_smtp.py --emails 50 --fail-next 3 --drop-after 20` sends the e-mails through the
+  outbox worker (with a temporary database) and prints how many were delivered over how many connections.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeSmtpServer:
+    def __init__(self, host='127.0.0.1', port=0, fail_next=0, reject=False, drop_after=0):
+        self.host = host
+        self.port = port
+        self.fail_next = fail_next
+        self.reject = reject
+        self.drop_after = drop_after
+        self.messages = []
+        self.connections = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        accepted = 0
+        envelope = {'from': None, 'to': []}
+
+        async def reply(line):
+            writer.write(f'{line}\r\n'.encode())
+            await writer.drain()
+
+        await reply('220 fake-smtp ready')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors='replace').strip()
+                verb = command.split(' ', 1)[0].upper()
+
+                if verb == 'EHLO':
+                    await reply('250-fake-smtp')
+                    await reply('250 AUTH PLAIN LOGIN')
+                elif verb == 'HELO':
+                    await reply('250 fake-smtp')
+                elif verb == 'AUTH':
+                    await reply('235 2.7.0 Authentication successful')
+                elif verb == 'MAIL':
+                    envelope = {'from': command[10:].strip(' <>'), 'to': []}
+                    await reply('250 OK')
+                elif verb == 'RCPT':
+                    envelope['to'].append(command[8:].strip(' <>'))
+                    await reply('250 OK')
+                elif verb == 'DATA':
+                    await reply('354 End data with <CR><LF>.<CR><LF>')
+                    data = []
+                    while (data_line := await reader.readline()) not in (b'.\r\n', b''):
+                        data.append(data_line)
+                    if self.reject:
+                        await reply('550 5.7.1 Message rejected')
+                    elif self.fail_next > 0:
+                        self.fail_next -= 1
+                        await reply('451 4.3.0 Try again later')
+                    else:
+                        self.messages.append((envelope['from'], envelope['to'], b''.join(data)))
+                        accepted += 1
+                        await reply('250 OK queued')
+                        if self.drop_after and accepted % self.drop_after == 0:
+                            break
+                elif verb in ('RSET', 'NOOP'):
+                    await reply('250 OK')
+                elif verb == 'QUIT':
+                    await reply('221 Bye')
+                    break
+                else:
+                    await reply('502 Command not implemented')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def self_test(args):
+    os.environ.update({'SMTP_HOST': '127.0.0.1', 'SMTP_STARTTLS': '0', 'SMTP_USERNAME': 'bot@example.com',
+                       'SMTP_PASSWORD': 'secret'})
+    os.chdir(tempfile.mkdtemp())
+
+    from bot_app.db_manager import DBManager
+    from bot_app.async_db import AsyncDBManager
+    from bot_app.email_outbox import EmailOutbox, SmtpSession
+
+    server = await FakeSmtpServer(fail_next=args.fail_next, reject=args.reject, drop_after=args.drop_after).start()
+    db_manager = DBManager('outbox.db')
+    db_manager.migrate()
+    async_db = AsyncDBManager(db_manager)
+
+    session = SmtpSession('127.0.0.1', server.port, 'bot@example.com', 'secret', starttls=False)
+    outbox = EmailOutbox(async_db, session=session, retry_delay=0.2, max_retry_delay=1)
+    await outbox.start()
+
+    started = time.perf_counter()
+    for number in range(args.emails):
+        await outbox.enqueue(number, f'user{number}@example.com', 'DarkSoulVoucher', 'Hello', b'%PDF-1.4 fake',
+                             f'e_voucher_{number}.pdf')
+    enqueued = time.perf_counter() - started
+
+    deadline = time.monotonic() + args.timeout
+    while len(server.messages) < args.emails and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if args.reject:
+        await asyncio.sleep(0.5)
+
+    await outbox.stop()
+    await server.stop()
+    rows = db_manager.create_connection().execute(
+        'SELECT status, COUNT(*), MAX(attempts) FROM email_outbox GROUP BY status').fetchall()
+    async_db.close()
+
+    print(f'enqueued {args.emails} e-mails in {enqueued * 1000:.1f} ms')
+    print(f'delivered {len(server.messages)} e-mails over {server.connections} SMTP connections')
+    for status, count, attempts in rows:
+        print(f'  {status:8} {count:4} (max attempts {attempts})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=None, help='only run the server on this port')
+    parser.add_argument('--emails', type=int, default=50)
+    parser.add_argument('--fail-next', type=int, default=0)
+    parser.add_argument('--reject', action='store_true')
+    parser.add_argument('--drop-after', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=20)
+    args = parser.parse_args()
+
+    if args.port is None:
+        asyncio.run(self_test(args))
+        return
+
+    async def serve():
+        server = await FakeSmtpServer(port=args.port, fail_next=args.fail_next, reject=args.reject,
+                                      drop_after=args.drop_after).start()
+        print(f'Fake SMTP server listening on 127.0.0.1:{server.port}')
+        while True:
+            count = len(server.messages)
+            await asyncio.sleep(1)
+            for sender, recipients, _ in server.messages[count:]:
+                print(f'{sender} -> {", ".join(recipients)}')
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
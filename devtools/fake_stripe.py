@@ -0,0 +1,155 @@
+"""
+Fake Stripe Webhook Sender
+
+Sends signed `checkout.session.completed` events, built like the ones of the Stripe API, to the webhook endpoint of
+the bot, so payments can be tested offline without a Stripe account. The events are signed with the same scheme as
+Stripe (`Stripe-Signature: t=<timestamp>,v1=<HMAC-SHA256 of "<timestamp>.<payload>">`).
+
+Usage:
+
+- Send to a running bot (started with `STRIPE_WEBHOOK_SECRET=whsec_test`):
+  `python devtools/fake_stripe.py --url http://127.0.0.1:8081/stripe/webhook --secret whsec_test --code ABCDE`
+  and press "Check Payment" in the chat of the user with the DarkSoulCode `ABCDE`.
+- Self test: `python devtools/fake_stripe.py --self-test` starts the webhook server with a temporary database, sends
+  valid, duplicated and wrongly signed events and an asynchronous payment whose events arrive out of order
+  (`async_payment_succeeded` before `completed`) while an idle client holds a connection, sends a body shorter
+  than its Content-Length, and redeems the payments.
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import socket
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def checkout_event(dark_soul_code, amount_total=30000, email='buyer@example.com', payment_status='paid',
+                   event_type='checkout.session.completed', session_id=None):
+    created = int(time.time())
+    return {
+        'id': f'evt_{uuid.uuid4().hex[:24]}',
+        'object': 'event',
+        'api_version': '2023-10-16',
+        'created': created,
+        'type': event_type,
+        'livemode': False,
+        'data': {
+            'object': {
+                'id': session_id or f'cs_test_{uuid.uuid4().hex}',
+                'object': 'checkout.session',
+                'amount_total': amount_total,
+                'currency': 'pln',
+                'created': created,
+                'payment_status': payment_status,
+                'status': 'complete',
+                'customer_details': {'email': email},
+                'custom_fields': [{'key': 'darksoulcode', 'type': 'text',
+                                   'label': {'custom': 'DarkSoulCode', 'type': 'custom'},
+                                   'text': {'value': dark_soul_code}}],
+            },
+        },
+    }
+
+
+def sign(payload, secret, timestamp=None):
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(secret.encode(), f'{timestamp}.'.encode() + payload, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+def send_short_body(port):
+    # Announces a bigger body than it sends, then stops writing.
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as connection:
+        connection.sendall(b'POST /stripe/webhook HTTP/1.1\r\nHost: localhost\r\nContent-Length: 1000\r\n\r\n{}')
+        connection.shutdown(socket.SHUT_WR)
+        return int(connection.recv(1024).split()[1])
+
+
+def send_event(url, secret, event):
+    payload = json.dumps(event).encode()
+    request = urllib.request.Request(url, data=payload, method='POST',
+                                     headers={'Content-Type': 'application/json',
+                                              'Stripe-Signature': sign(payload, secret)})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+async def self_test():
+    os.chdir(tempfile.mkdtemp())
+
+    from bot_app.db_manager import DBManager
+    from bot_app.stripe_payments import StripeWebhookServer, STRIPE_WEBHOOK_PATH
+
+    db_manager = DBManager('stripe.db')
+    db_manager.migrate()
+    server = StripeWebhookServer(db_manager, secret='whsec_test', host='127.0.0.1', port=0)
+    await server.start()
+    url = f'http://127.0.0.1:{server.port}{STRIPE_WEBHOOK_PATH}'
+
+    event = checkout_event('ABCDE', 30000)
+    # A client which connects and sends nothing must not block the deliveries of Stripe.
+    idle_connection = socket.create_connection(('127.0.0.1', server.port))
+    succeeded = 'checkout.session.async_payment_succeeded'
+    results = {
+        'valid event': await asyncio.to_thread(send_event, url, 'whsec_test', event),
+        'same event again': await asyncio.to_thread(send_event, url, 'whsec_test', event),
+        'wrong secret': await asyncio.to_thread(send_event, url, 'whsec_wrong', checkout_event('EVIL', 100000)),
+        'unpaid session': await asyncio.to_thread(send_event, url, 'whsec_test',
+                                                  checkout_event('UNPAID', 30000, payment_status='unpaid')),
+        # Stripe does not guarantee the order of the deliveries: the late 'unpaid' event must not undo the payment.
+        'succeeded first': await asyncio.to_thread(send_event, url, 'whsec_test',
+                                                   checkout_event('LATE', 30000, event_type=succeeded,
+                                                                  session_id='cs_test_late')),
+        'completed later': await asyncio.to_thread(send_event, url, 'whsec_test',
+                                                   checkout_event('LATE', 30000, payment_status='unpaid',
+                                                                  session_id='cs_test_late')),
+        'short body': await asyncio.to_thread(send_short_body, server.port),
+    }
+    idle_connection.close()
+    await server.stop()
+
+    for name, status in results.items():
+        print(f'{name:18} -> HTTP {status}')
+    print('payments:', db_manager.create_connection().execute('SELECT COUNT(*) FROM payments').fetchone()[0])
+    print('redeem ABCDE:      ', db_manager.redeem_payment(1, 'ABCDE', 'VOUCHER001'))
+    print('redeem ABCDE again:', db_manager.redeem_payment(1, 'ABCDE', 'VOUCHER002'))
+    print('redeem by other:   ', db_manager.redeem_payment(2, 'ABCDE', 'VOUCHER003'))
+    print('redeem EVIL:       ', db_manager.redeem_payment(1, 'EVIL', 'VOUCHER004'))
+    print('redeem UNPAID:     ', db_manager.redeem_payment(1, 'UNPAID', 'VOUCHER005'))
+    print('redeem LATE:       ', db_manager.redeem_payment(3, 'LATE', 'VOUCHER006'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8081/stripe/webhook')
+    parser.add_argument('--secret', default=os.getenv('STRIPE_WEBHOOK_SECRET', 'whsec_test'))
+    parser.add_argument('--code', default='ABCDE', help='DarkSoulCode entered in the checkout')
+    parser.add_argument('--amount', type=int, default=300, help='voucher value in PLN')
+    parser.add_argument('--email', default='buyer@example.com')
+    parser.add_argument('--unpaid', action='store_true')
+    parser.add_argument('--self-test', action='store_true')
+    args = parser.parse_args()
+
+    if args.self_test:
+        asyncio.run(self_test())
+        return
+
+    event = checkout_event(args.code, args.amount * 100, args.email, 'unpaid' if args.unpaid else 'paid')
+    print(f"{event['id']} -> HTTP {send_event(args.url, args.secret, event)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,61 +1,125 @@
-import os
-import dotenv
 import logging
 from typing import Final
 
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler, filters
+from telegram.ext import ContextTypes
 from telegram import Update
+from telegram.request import HTTPXRequest
 
+from bot_app.config import TOKEN, BOT_MODE, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, \
+    WEBHOOK_SECRET_TOKEN, BOT_API_BASE_URL, BOT_API_BASE_FILE_URL
 from bot_app.conversation_handler import add_voucher_command, cancel, question_1, question_2
 
 from bot_app.admin_commands import AdminCommands
 from bot_app.commands import MainMenuCommands
 from bot_app.data_handler import button_click
-from bot_app.db_manager import DBManager
-
-dotenv.load_dotenv()
-
-TOKEN: Final = os.getenv('TOKEN')
-BOT_USERNAME: Final = os.getenv("BOT_USERNAME")
+from bot_app.db_manager import db as db_manager
+from bot_app.async_db import async_db
+from bot_app.message_ledger import LedgerBot
+from bot_app.keyboards import keyboards
+from bot_app.pdf_render_service import pdf_renderer
+from bot_app.email_outbox import email_outbox
+from bot_app.stripe_payments import stripe_webhook, stripe_poller
+from bot_app.update_processor import ChatOrderedUpdateProcessor, CONCURRENT_UPDATES
+from bot_app.outbound_scheduler import outbound
+from bot_app.sqlite_persistence import persistence
+from bot_app.session_store import sessions
+from bot_app.metrics import metrics, metrics_server
+
+CONNECTION_POOL_SIZE: Final = 256
 
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 conv_handler = ConversationHandler(
-        entry_points=[CommandHandler('add', add_voucher_command)],
+        entry_points=[CommandHandler('add', metrics.instrument('/add', add_voucher_command))],
         states={
-            'question_1': [MessageHandler(filters.TEXT & ~filters.COMMAND, question_1)],
-            'question_2': [MessageHandler(filters.TEXT & ~filters.COMMAND, question_2)],
+            'question_1': [MessageHandler(filters.TEXT & ~filters.COMMAND,
+                                          metrics.instrument('add_question_1', question_1))],
+            'question_2': [MessageHandler(filters.TEXT & ~filters.COMMAND,
+                                          metrics.instrument('add_question_2', question_2))],
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', metrics.instrument('/cancel', cancel))],
+        name='add_voucher',
+        persistent=True,
     )
 
-db_manager = DBManager('tattoo_bot_telegram.db')
 admin = AdminCommands()
 main_commands = MainMenuCommands()
 
+
+async def post_init(application: Application):
+    await metrics_server.start(application)
+    await email_outbox.start(application)
+    await stripe_webhook.start(application)
+    await stripe_poller.start(application)
+
+
+async def post_shutdown(application: Application):
+    await stripe_poller.stop(application)
+    await stripe_webhook.stop(application)
+    await email_outbox.stop(application)
+    await sessions.stop(application)
+    await metrics_server.stop(application)
+
+
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
+    logger.error('Update %s caused an error', getattr(update, 'update_id', update), exc_info=context.error)
+
+
+def build_application(bot=None, concurrent_updates=CONCURRENT_UPDATES):
+    # The application builder only sizes the connection pool of bots it creates itself, a bot passed to it keeps
+    # the single connection of `Bot`, which would serialize all API calls of concurrently processed updates.
+    bot = bot or LedgerBot(TOKEN, base_url=BOT_API_BASE_URL, base_file_url=BOT_API_BASE_FILE_URL,
+                           request=HTTPXRequest(connection_pool_size=CONNECTION_POOL_SIZE),
+                           get_updates_request=HTTPXRequest(), rate_limiter=outbound)
+    builder = Application.builder().bot(bot).persistence(persistence).post_init(post_init).post_shutdown(post_shutdown)
+    if isinstance(concurrent_updates, int) and concurrent_updates > 0:
+        concurrent_updates = ChatOrderedUpdateProcessor(concurrent_updates)
+    if concurrent_updates:
+        builder = builder.concurrent_updates(concurrent_updates)
+    application = builder.build()
+
+    application.add_handler(CommandHandler('start', metrics.instrument('/start', main_commands.start_command)))
+    application.add_handler(CommandHandler('admin', metrics.instrument('/admin', admin.admin_command)))
+    application.add_handler(CallbackQueryHandler(metrics.instrument('button_click', button_click)))
+    application.add_handler(conv_handler)
+    application.add_error_handler(error_handler)
+    return application
+
+
 if __name__ == "__main__":
-    print('Start polling...')
-
-    conn = db_manager.create_connection()
-    if conn is not None:
-        db_manager.create_users_table()
-        db_manager.create_vouchers_table()
-        conn.close()
-        print('Tables was created successfully')
+    print(f'Start {BOT_MODE}...')
+
+    if BOT_MODE not in ('polling', 'webhook'):
+        raise SystemExit(f"Config error: BOT_MODE must be 'polling' or 'webhook', not {BOT_MODE!r}")
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+        raise SystemExit('Config error: WEBHOOK_URL (the public HTTPS URL of the bot) must be set when '
+                         'BOT_MODE=webhook')
+
+    schema_version = db_manager.migrate()
+    if schema_version is not None:
+        print(f'Database schema is up to date (version {schema_version})')
     else:
         print("Ошибка! Невозможно подключиться к базе данных.")
 
-    bot_app = Application.builder().token(TOKEN).build()
+    keyboards.build_all()
+    db_manager.pool.set_trace_callback(metrics.count_db_statement)
+    metrics.add_source(outbound.metric_lines)
 
-    bot_app.add_handler(CommandHandler('start', main_commands.start_command))
-    bot_app.add_handler(CommandHandler('admin', admin.admin_command))
-    bot_app.add_handler(CallbackQueryHandler(button_click))
-    bot_app.add_handler(conv_handler)
-    print('Polling...')
+    bot_app = build_application()
 
-    bot_app.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == 'webhook':
+        print('Webhook...')
+        bot_app.run_webhook(listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, url_path=WEBHOOK_PATH,
+                            webhook_url=f'{WEBHOOK_URL.rstrip("/")}/{WEBHOOK_PATH}', secret_token=WEBHOOK_SECRET_TOKEN,
+                            allowed_updates=Update.ALL_TYPES)
+    else:
+        print('Polling...')
+        bot_app.run_polling(allowed_updates=Update.ALL_TYPES)
+    pdf_renderer.close()
+    async_db.close()
 
 
 